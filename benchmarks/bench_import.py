@@ -0,0 +1,72 @@
+""" ***********************************
+* *[filename] bench_import.py
+* *[summary] Startup benchmark: wall clock time and peak memory (RSS)
+*               of importing modelling_utils in a fresh interpreter,
+*               and of the first call to the plotting functions
+* ***********************************
+Usage:
+    python benchmarks/bench_import.py [--repeat N] [--output results.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+__root__ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# each snippet runs in a fresh interpreter and prints its own measurements as JSON
+__snippets__ = {
+    "import": "import modelling_utils",
+    "import_and_plot": (
+        "import numpy as np\n"
+        "import matplotlib\n"
+        "matplotlib.use('Agg')\n"
+        "import modelling_utils\n"
+        "modelling_utils.plot_function(np.arange(10.0), np.arange(10.0))"
+    ),
+}
+
+__probe__ = """
+import json, resource, sys, time
+start = time.perf_counter()
+exec(compile({snippet!r}, "<benchmark>", "exec"))
+elapsed = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+# ru_maxrss is in bytes on macOS and in kilobytes on Linux
+rss_mb = rss / (1 << 20) if sys.platform == "darwin" else rss / (1 << 10)
+heavy = [m for m in ("matplotlib", "seaborn", "mpl_toolkits.mplot3d", "pandas") if m in sys.modules]
+print(json.dumps({{"seconds": elapsed, "max_rss_mb": rss_mb, "loaded": heavy}}))
+"""
+
+def run(snippet: str, repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", __probe__.format(snippet=snippet)],
+            cwd=__root__, capture_output=True, text=True, check=True,
+        )
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    seconds = sorted(r["seconds"] for r in runs)
+    return {
+        "repeat": repeat,
+        "min_seconds": seconds[0],
+        "median_seconds": seconds[len(seconds)//2],
+        "max_rss_mb": max(r["max_rss_mb"] for r in runs),
+        "loaded_modules": runs[-1]["loaded"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+    results = {name: run(snippet, args.repeat) for name, snippet in __snippets__.items()}
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text)
+    print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+""" ***********************************
+* *[filename] generators.py
+* *[summary] Synthetic Cadence LUTs and device specification files
+*               used by the benchmark suite
+* ***********************************
+"""
+import os
+import numpy as np
+import pandas as pd
+import toml
+
+__lut_params__ = ["id", "gm", "gds", "gmbs", "gmoverid", "cgs", "cgd", "cgb", "csb", "cdb", "ft", "self_gain", "vdsat", "region"]
+
+def lut_name(vsb: str="0", w: str="2-3-u", l: str="30-n") -> str:
+    return f"vsb-{vsb}_w-{w}_l-{l}_sweep-vgs-vds"
+
+def lut_frame(rows: int=25, sweeps: int=13, params: int=len(__lut_params__), seed: int=0) -> pd.DataFrame:
+    """_summary_
+    Synthetic Cadence LUT: one x-axis (vgs) column, and one column per parameter and vds value,
+    e.g. "M0:gm vds 0.6 ", with 1 + sweeps*params columns in total
+    """
+    rng = np.random.default_rng(seed)
+    names = [__lut_params__[i % len(__lut_params__)] + (f"{i // len(__lut_params__)}" if i >= len(__lut_params__) else "") for i in range(params)]
+    vds = np.round(np.linspace(0, 1.2, sweeps), 6)
+    columns = {"vgs ": np.round(np.linspace(0, 1.2, rows), 6)}
+    for name in names:
+        for v in vds:
+            columns[f"M0:{name} vds {v:g} "] = rng.random(rows)
+    return pd.DataFrame(columns)
+
+def write_lut(folder: str, rows: int=25, sweeps: int=13, params: int=len(__lut_params__), name: str=None, seed: int=0) -> str:
+    path = os.path.join(folder, (name if bool(name) else lut_name()) + ".csv")
+    lut_frame(rows, sweeps, params, seed).to_csv(path, index=False)
+    return path
+
+def write_lut_corpus(folder: str, lengths: int=3, vsbs: int=3, rows: int=25, sweeps: int=13, device: str="ncell") -> str:
+    """_summary_
+    Writes one LUT per (l, vsb) corner into folder/device
+    """
+    root = os.path.join(folder, device)
+    os.makedirs(root, exist_ok=True)
+    for i in range(lengths):
+        for j in range(vsbs):
+            write_lut(root, rows, sweeps, name=lut_name(vsb=f"0-{j}" if j > 0 else "0", l=f"{30*(i+1)}-n"), seed=i*vsbs+j)
+    return folder
+
+def specs(devices: int=100, seed: int=0) -> dict:
+    """_summary_
+    Synthetic specification dictionary, as parsed from a TOML file
+    """
+    rng = np.random.default_rng(seed)
+    names = [f"m{i}" for i in range(devices)]
+    control = {"devices": names}
+    for i, name in enumerate(names):
+        if i % 2 == 0:
+            control[name] = {"type": "nch", "gmoverid": float(rng.uniform(5, 25)), "l": "30 n", "vds": "150 m", "id": "1 m", "vsb": 0}
+        else:
+            control[name] = {"type": "pch", "gmoverid": float(rng.uniform(5, 25)), "l": "60 n", "vsd": "150 m", "id": "500 u", "vbs": 0}
+    return {
+        "control": control,
+        "spit": {"vars": {name: ["vgs", "w", "ft"] for name in names[:min(devices, 10)]}},
+    }
+
+def write_specs(folder: str, devices: int=100, seed: int=0) -> str:
+    path = os.path.join(folder, f"specs_{devices}.toml")
+    with open(path, "w") as file:
+        toml.dump(specs(devices, seed), file)
+    return path
@@ -0,0 +1,124 @@
+""" ***********************************
+* *[filename] run.py
+* *[summary] Runs the benchmark suite and writes the results to JSON,
+*               or compares two result files
+* ***********************************
+Usage:
+    python benchmarks/run.py [--filter ReadLut] [--repeat 5] [--output results.json]
+    python benchmarks/run.py --compare old.json new.json [--threshold 1.1]
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+__here__ = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(__here__))
+sys.path.insert(0, __here__)
+
+def _autorange(func, min_seconds: float=0.2) -> int:
+    """_summary_
+    Number of calls so that a timing sample lasts at least min_seconds
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        if time.perf_counter() - start >= min_seconds or number >= 1 << 20:
+            return number
+        number *= 2
+
+def run(filter: str=None, repeat: int=5) -> dict:
+    import numpy
+    import pandas
+    import suite
+    import modelling_utils
+    results = {}
+    for bench in suite.__benchmarks__:
+        if bool(filter) and filter not in bench.__name__:
+            continue
+        names = list(bench.params.keys())
+        for values in itertools.product(*bench.params.values()):
+            params = dict(zip(names, values))
+            key = f"{bench.__name__}[{','.join(f'{k}={v}' for k, v in params.items())}]"
+            with tempfile.TemporaryDirectory() as tmp:
+                instance = bench()
+                instance.setup(tmp, **params)
+                number = _autorange(instance.time)
+                samples = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    for _ in range(number):
+                        instance.time()
+                    samples.append((time.perf_counter() - start)/number)
+            samples.sort()
+            results[key] = {
+                "min": samples[0],
+                "median": samples[len(samples)//2],
+                "mean": sum(samples)/len(samples),
+                "repeat": repeat,
+                "number": number,
+            }
+            line = f"{key:<55} {samples[0]*1e3:12.4f} ms"
+            # benchmarks with a "per" attribute also report the time per item of that parameter
+            per = getattr(bench, "per", None)
+            if bool(per):
+                results[key]["min_per_item"] = samples[0]/params[per]
+                line += f" {samples[0]/params[per]*1e9:10.1f} ns/{per[:-1] if per.endswith('s') else per}"
+            print(line, flush=True)
+    return {
+        "meta": {
+            "version": modelling_utils.__version__,
+            "python": platform.python_version(),
+            "numpy": numpy.__version__,
+            "pandas": pandas.__version__,
+            "platform": platform.platform(),
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        },
+        "results": results,
+    }
+
+def compare(old: str, new: str, threshold: float=1.1) -> int:
+    """_summary_
+    Prints the ratio new/old of the minimum time of each benchmark
+    and returns the number of regressions above the threshold
+    """
+    with open(old) as file:
+        old_results = json.load(file)["results"]
+    with open(new) as file:
+        new_results = json.load(file)["results"]
+    regressions = 0
+    for key in sorted(set(old_results) & set(new_results)):
+        ratio = new_results[key]["min"]/old_results[key]["min"]
+        flag = ""
+        if ratio > threshold:
+            flag = "REGRESSION"
+            regressions += 1
+        elif ratio < 1/threshold:
+            flag = "improvement"
+        print(f"{key:<55} {old_results[key]['min']*1e3:12.4f} ms {new_results[key]['min']*1e3:12.4f} ms {ratio:8.3f}x {flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", type=str, default=None, help="only run the benchmarks whose name contains this string")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", type=str, default=None)
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), default=None)
+    parser.add_argument("--threshold", type=float, default=1.1)
+    args = parser.parse_args()
+    if args.compare is not None:
+        sys.exit(1 if compare(*args.compare, threshold=args.threshold) > 0 else 0)
+    results = run(filter=args.filter, repeat=args.repeat)
+    if bool(args.output):
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+if __name__ == "__main__":
+    main()
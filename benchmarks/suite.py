@@ -0,0 +1,125 @@
+""" ***********************************
+* *[filename] suite.py
+* *[summary] Benchmark suite of modelling_utils. Each benchmark is a class
+*               (asv style) with a dictionary of parameters, a setup method
+*               and a time method, which is the timed operation.
+* ***********************************
+"""
+import os
+import numpy as np
+
+import generators
+from modelling_utils import(
+    read_lut,
+    read_data,
+    read_specs,
+    stof,
+    stof_array,
+    plot_function,
+    Devices,
+    MosCell,
+)
+
+class ReadLut:
+    params = {"sweeps": [13, 130, 700], "rows": [25, 250]}
+    def setup(self, tmp: str, sweeps: int, rows: int):
+        self.path = generators.write_lut(tmp, rows=rows, sweeps=sweeps)
+    def time(self):
+        read_lut(self.path, compiled=False)
+
+class ReadData:
+    params = {"sweeps": [13, 130, 700], "rows": [25, 250]}
+    def setup(self, tmp: str, sweeps: int, rows: int):
+        self.path = generators.write_lut(tmp, rows=rows, sweeps=sweeps)
+    def time(self):
+        read_data(self.path)
+
+class ReadSpecs:
+    params = {"devices": [10, 100, 1000]}
+    def setup(self, tmp: str, devices: int):
+        self.path = generators.write_specs(tmp, devices=devices)
+    def time(self):
+        read_specs(self.path)
+
+class DevicesParseData:
+    params = {"devices": [10, 100, 1000]}
+    def setup(self, tmp: str, devices: int):
+        self.data = generators.specs(devices)
+    def time(self):
+        Devices().parse_data(self.data)
+
+class DevicesAdd:
+    # reports the time per device. It grows about 4x from 10^3 to 10^6 devices
+    # (~0.2 to ~0.8 us): the name dictionaries outgrow the CPU caches, so the
+    # scaling is not linear at the top of the range. The index holds no
+    # per-device objects, so garbage collection no longer adds to it
+    params = {"devices": [1000, 10000, 100000, 1000000], "bulk": [False, True]}
+    per = "devices"
+    def setup(self, tmp: str, devices: int, bulk: bool):
+        self.cells = [MosCell(name=f"m{i}") for i in range(devices)]
+        self.bulk = bulk
+    def time(self):
+        devices = Devices()
+        if self.bulk:
+            devices.add_many(self.cells)
+        else:
+            for cell in self.cells:
+                devices.add(cell)
+
+class DevicesDataFrame:
+    params = {"devices": [10, 100, 1000]}
+    def setup(self, tmp: str, devices: int):
+        self.devices = Devices()
+        self.devices.parse_data(generators.specs(devices))
+    def time(self):
+        self.devices.__data_frame__(dev_type="cell")
+
+class DevicesStr:
+    params = {"devices": [10, 100, 1000]}
+    def setup(self, tmp: str, devices: int):
+        self.devices = Devices()
+        self.devices.parse_data(generators.specs(devices))
+    def time(self):
+        str(self.devices)
+
+class Stof:
+    params = {"values": [1000, 100000]}
+    def setup(self, tmp: str, values: int):
+        rng = np.random.default_rng(0)
+        self.values = [f"{v:.4g} {s}" for v, s in zip(rng.random(values)*1000, rng.choice(list("munpfk"), values))]
+    def time(self):
+        stof.cache_clear()
+        for v in self.values:
+            stof(v)
+
+class StofArray:
+    params = {"values": [1000, 100000]}
+    def setup(self, tmp: str, values: int):
+        rng = np.random.default_rng(0)
+        self.values = np.array([f"{v:.4g} {s}" for v, s in zip(rng.random(values)*1000, rng.choice(list("munpfk"), values))])
+    def time(self):
+        stof_array(self.values)
+
+class PlotFunction:
+    params = {"points": [100, 100000], "curves": [1, 5]}
+    def setup(self, tmp: str, points: int, curves: int):
+        import matplotlib
+        matplotlib.use("Agg")
+        self.x = np.linspace(0, 2*np.pi, points)
+        self.y = [np.cos(self.x*(i+1)) for i in range(curves)] if curves > 1 else np.cos(self.x)
+        self.filename = os.path.join(tmp, "plot.png")
+    def time(self):
+        plot_function(self.x, self.y, filename=self.filename)
+
+__benchmarks__ = [
+    ReadLut,
+    ReadData,
+    ReadSpecs,
+    DevicesParseData,
+    DevicesAdd,
+    DevicesDataFrame,
+    DevicesStr,
+    Stof,
+    StofArray,
+    PlotFunction,
+]
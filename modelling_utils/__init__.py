@@ -2,10 +2,23 @@ __version__ = '0.2.11'
 __author__ = "Diogo André"
 __date__ = "2022-05-05"
 __annotations__ = "Utility functions and data structure for Analog Integrated Circuit Modelling"
+from .profiling import *
 from .utils import *
+from .figures import *
 from .read import *
 from .write import *
 from .data import *
+from .lut import *
+from .sizing import *
+from .montecarlo import *
+from .design_space import *
+
+def __getattr__(name: str):
+    # plotting modules (plt, mpl, sns, ...) are loaded on first access
+    from . import utils
+    if name in utils.__lazy_modules__:
+        return getattr(utils, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def verbose_info():
     print(f"{__name__}")
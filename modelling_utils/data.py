@@ -9,13 +9,18 @@
 from collections import defaultdict
 from re import S
 import numpy as np
-from pandas import DataFrame
+from pandas import DataFrame, Categorical
 from enum import Enum
+import hashlib
 import os
 from .utils import(
     Scale,
     Units,
-    stof
+    stof,
+    stof_array,
+)
+from .profiling import(
+    profiled,
 )
 
 
@@ -100,6 +105,81 @@ class TomlControlType(Enum):
     NMOS="nch"
     PMOS="pch"
     
+class _ControlVar:
+    """_summary_
+    Entry of the dispatch table of the [control] section keywords:
+    target variable, accepted types, NMOS/PMOS constraint and the
+    mirrored (negated) or reciprocal variable filled along with it
+    Args:
+        field       (str)           : MosCell variable set by the keyword
+        types       (tuple)         : accepted (exact) types of the value
+        message     (str)           : error message of a value of another type
+        mos_type    (str, optional) : "nch" or "pch" if the keyword is only valid for that type. Defaults to None.
+        mirror      (str, optional) : variable set to the negated value. Defaults to None.
+        inverse     (str, optional) : variable set to the reciprocal value. Defaults to None.
+        choices     (list, optional): accepted values. Defaults to None.
+        numeric     (bool, optional): the value is a quantity, strings are converted with stof. Defaults to True.
+    """
+    __slots__=["field", "types", "message", "mos_type", "constraint", "mirror", "inverse", "inverse_message", "choices", "numeric"]
+    def __init__(self, field: str, types: tuple, message: str, mos_type: str=None, mirror: str=None, inverse: str=None, choices: list=None, numeric: bool=True):
+        self.field = field
+        self.types = types
+        self.message = message
+        self.mos_type = mos_type
+        self.constraint = f"{field.upper()} value to be specified is only valid for {TomlControlType(mos_type).name} devices" if mos_type is not None else None
+        self.mirror = mirror
+        self.inverse = inverse
+        self.inverse_message = f"{field.upper()} must not be zero, {inverse.upper()} = 1/{field.upper()} is undefined" if inverse is not None else None
+        self.choices = choices
+        self.numeric = numeric
+
+    def check(self, mos_type: str, val):
+        """_summary_
+        Validates a value of the keyword for a device of the given MOS type
+        Raises:
+            ValueError: invalid value, or keyword not valid for the MOS type
+        Returns:
+            the (unconverted) value
+        """
+        if self.mos_type is not None and mos_type != self.mos_type:
+            raise ValueError(self.constraint)
+        if type(val) not in self.types:
+            raise ValueError(self.message)
+        if self.choices is not None and val not in self.choices:
+            raise ValueError(f"Device type must be \"{self.choices[0]}\" or \"{self.choices[1]}\"")
+        return val
+
+    def assign(self, cell, val) -> None:
+        setattr(cell, self.field, val)
+        if self.mirror is not None:
+            setattr(cell, self.mirror, -val)
+        if self.inverse is not None:
+            if val == 0:
+                raise ZeroDivisionError(self.inverse_message)
+            setattr(cell, self.inverse, 1/val)
+
+def _control_table() -> dict:
+    nch, pch = TomlControlType.NMOS.value, TomlControlType.PMOS.value
+    number = (float, str, int)
+    name = _ControlVar("name", (str,), "Device name must be a string", numeric=False)
+    return {
+        TomlControlKeywords.DEVICE.value: name,
+        TomlControlKeywords.VARACTOR.value: name,
+        TomlControlKeywords.SWITCH.value: name,
+        TomlControlKeywords.TYPE.value: _ControlVar("type", (str,), "Device type must be a string", choices=[nch, pch], numeric=False),
+        TomlControlKeywords.CVAR.value: _ControlVar("cvar", number, "Varactor Cap. CVAR must be parsed as a float, integer or string"),
+        TomlControlKeywords.RDS.value: _ControlVar("rds", number, "Switch On Resistance RDS must be parsed as a float, integer or string", inverse="gds"),
+        TomlControlKeywords.VGS.value: _ControlVar("vgs", number, "VGS value must parsed as a float, integer or string", mos_type=nch, mirror="vsg"),
+        TomlControlKeywords.VSG.value: _ControlVar("vsg", number, "VSG value must parsed as a float, integer or string", mos_type=pch, mirror="vgs"),
+        TomlControlKeywords.VDS.value: _ControlVar("vds", number, "VDS value must parsed as a float, integer or string", mos_type=nch, mirror="vsd"),
+        TomlControlKeywords.VSD.value: _ControlVar("vsd", number, "VSD value must parsed as a float, integer or string", mos_type=pch, mirror="vds"),
+        TomlControlKeywords.VSB.value: _ControlVar("vsb", number, "Vsb value must parsed as a float, integer or string", mos_type=nch, mirror="vbs"),
+        TomlControlKeywords.VBS.value: _ControlVar("vbs", number, "VBS value must parsed as a float, integer or string", mos_type=pch, mirror="vsb"),
+        TomlControlKeywords.GMOVERID.value: _ControlVar("gmoverid", number, "Gm/Id value must parsed as a float, integer or string"),
+        TomlControlKeywords.LENGTH.value: _ControlVar("l", (float, str), "Channel Length (L) value must parsed as a float or string"),
+        TomlControlKeywords.ID.value: _ControlVar("id", (float, str), "Drive Current (Id) value must parsed as a float or string"),
+    }
+
 class MosCell:
     """_summary_
     Object implementing the CMOS device
@@ -169,6 +249,8 @@ class MosCell:
         "region":"",
         "vdsat":Units.VOLTAGE.value,
     }
+    # [control] section keyword -> _ControlVar
+    __CONTROL__=_control_table()
     def __init__(
         self,
         name:str="m0",
@@ -219,7 +301,7 @@ class MosCell:
         
         
     def __str__(self)->str:
-        vars = [var for var in dir(self) if not var.startswith('__')]
+        vars = sorted(MosCell.__slots__)
         vals = [getattr(self, var) for var in vars]
         obj={key:val for (key,val) in zip(vars,vals)}
         result=""
@@ -231,134 +313,432 @@ class MosCell:
         return result
 
     def __parse_data__(self, key:str, val)->None:
-        if key == TomlControlKeywords.DEVICE.value or key == TomlControlKeywords.VARACTOR.value or key == TomlControlKeywords.SWITCH:
-            if type(val) != str:
-                raise ValueError("Device name must be a string")
-            self.name = val
-        elif key == TomlControlKeywords.TYPE.value:
-            if type(val) != str:
-                raise ValueError("Device type must be a string")
-            if val not in [TomlControlType.NMOS.value, TomlControlType.PMOS.value]:
-                raise ValueError(f"Device type must be \"{TomlControlType.NMOS.value}\" or \"{TomlControlType.PMOS.value}\"")
-            self.type = val
-        elif key == TomlControlKeywords.CVAR.value:
-            if type(val) not in [float, str, int]:
-                raise ValueError("Varactor Cap. CVAR must be parsed as a float, integer or string")
-            if type(val) == str:
-                self.cvar = stof(val)
-            else:
-                self.cvar = float(val)
-        elif key == TomlControlKeywords.RDS.value:
-            if type(val) not in [float, str, int]:
-                raise ValueError("Switch On Resistance RDS must be parsed as a float, integer or string")
-            if type(val) == str:
-                self.rds = stof(val)
-                self.gds = 1/self.rds
-            else:
-                self.rds = float(val)
-                self.gds = 1/self.rds
-        elif key == TomlControlKeywords.VGS.value:
-            if self.type != TomlControlType.NMOS.value:
-                raise ValueError("VGS value to be specified is only valid for NMOS devices")
-            if type(val) not in [float, str, int]:
-                raise ValueError("VGS value must parsed as a float, integer or string")
-            if type(val) == str:
-                self.vgs = stof(val)
-                self.vsg = -self.vgs
-            else:
-                self.vgs = float(val)
-                self.vsg = -self.vgs
-        elif key == TomlControlKeywords.VSG.value:
-            if self.type != TomlControlType.PMOS.value:
-                raise ValueError("VSG value to be specified is only valid for PMOS devices")
-            if type(val) not in [float, str, int]:
-                raise ValueError("VSG value must parsed as a float, integer or string")
-            if type(val) == str:
-                self.vsg = stof(val)
-                self.vgs = -self.vsg
-            else:
-                self.vsg = float(val)
-                self.vgs = -self.vsg
-        elif key == TomlControlKeywords.VDS.value:
-            if self.type != TomlControlType.NMOS.value:
-                raise ValueError("VDS value to be specified is only valid for NMOS devices")
-            if type(val) not in [float, str, int]:
-                raise ValueError("VDS value must parsed as a float, integer or string")
-            if type(val) == str:
-                self.vds = stof(val)
-                self.vsd = -self.vds
-            else:
-                self.vds = float(val)
-                self.vsd = -self.vds
-        elif key == TomlControlKeywords.VSD.value:
-            if self.type != TomlControlType.PMOS.value:
-                raise ValueError("VSD value to be specified is only valid for PMOS devices")
-            if type(val) not in [float, str, int]:
-                raise ValueError("VSD value must parsed as a float, integer or string")
-            if type(val) == str:
-                self.vsd = stof(val)
-                self.vds = -self.vsd
-            else:
-                self.vsd = float(val)
-                self.vds = -self.vsd
-        elif key == TomlControlKeywords.VSB.value:
-            if self.type != TomlControlType.NMOS.value:
-                raise ValueError("VSB value to be specified is only valid for NMOS devices")
-            if type(val) not in [float, str, int]:
-                raise ValueError("Vsb value must parsed as a float, integer or string")
-            if type(val) == str:
-                self.vsb = stof(val)
-                self.vbs = -self.vsb
-            else:
-                self.vsb = float(val)
-                self.vbs = -self.vsb
-        elif key == TomlControlKeywords.VBS.value:
-            if self.type != TomlControlType.PMOS.value:
-                raise ValueError("VBS value to be specified is only valid for PMOS devices")
-            if type(val) not in [float, str, int]:
-                raise ValueError("VBS value must parsed as a float, integer or string")
-            if type(val) == str:
-                self.vbs = stof(val)
-                self.vsb = -self.vbs
-            else:
-                self.vbs = float(val)
-                self.vsb = -self.vsb
-        elif key == TomlControlKeywords.GMOVERID.value:
-            if type(val) not in [float, str, int]:
-                raise ValueError("Gm/Id value must parsed as a float, integer or string")
-            if type(val) == str:
-                self.gmoverid = stof(val)
-            else:
-                self.gmoverid = float(val)
-        elif key == TomlControlKeywords.LENGTH.value:
-            if type(val) not in [float, str]:
-                raise ValueError("Channel Length (L) value must parsed as a float or string")
-            if type(val) == str:
-                self.l = stof(val)
-            else:
-                self.l = val
-        elif key == TomlControlKeywords.ID.value:
-            if type(val) not in [float, str]:
-                raise ValueError("Drive Current (Id) value must parsed as a float or string")
-            if type(val) == str:
-                self.id = stof(val)
-            else:
-                self.id = val
-        else:
+        control = MosCell.__CONTROL__.get(key)
+        if control is None:
             raise ValueError(f"{key} is not a valid control variable for a CMOS device")
-                
+        val = control.check(self.type, val)
+        if control.numeric:
+            val = stof(val) if type(val) == str else float(val)
+        control.assign(self, val)
+
+    @classmethod
+    def from_dict(cls, data: dict, name: str=None):
+        """_summary_
+        Builds a device from a dictionary of control variables
+        Args:
+            data (dict)             : control variable -> value, parsed in order (as in the [control] section)
+            name (str, optional)    : name of the device. Defaults to "m0".
+        Raises:
+            ValueError: invalid control variable or value
+            ZeroDivisionError: zero value of a variable with a reciprocal (rds)
+        Returns:
+            MosCell: the parsed device
+        """
+        cell = cls() if name is None else cls(name=name)
+        for key, val in data.items():
+            cell.__parse_data__(key, val)
+        return cell
+
+    @classmethod
+    def from_records(cls, records: list, names: list=None, dev_type: str="cell"):
+        """_summary_
+        Builds a columnar table of devices from a batch of control variable
+        dictionaries. All the records are validated in a single pass, with the
+        same errors as MosCell.__parse_data__, and each variable is then
+        converted and stored as a whole column
+        Args:
+            records     (list)          : dictionaries of control variables, one per device
+            names       (list, optional): names of the devices, unless given by a "device" key. Defaults to m0, m1, ...
+            dev_type    (str, optional) : "cell", "varactor" or "switch". Defaults to "cell".
+        Raises:
+            ValueError: invalid control variable or value
+            ZeroDivisionError: zero value of a variable with a reciprocal (rds)
+        Returns:
+            DeviceTable: the parsed devices
+        """
+        records = list(records)
+        n = len(records)
+        if names is not None and len(names) != n:
+            raise ValueError("There must be one name per record")
+        names = list(names) if names is not None else [f"m{i}" for i in range(n)]
+        types = [__cell_defaults__["type"]]*n
+        columns = {}
+        given = {}
+        strings = defaultdict(list)
+        for i, record in enumerate(records):
+            for key, val in record.items():
+                control = MosCell.__CONTROL__.get(key)
+                if control is None:
+                    raise ValueError(f"{key} is not a valid control variable for a CMOS device")
+                val = control.check(types[i], val)
+                if not control.numeric:
+                    (names if control.field == "name" else types)[i] = val
+                    continue
+                column = columns.get(control.field)
+                if column is None:
+                    default = __cell_defaults__[control.field]
+                    column = columns[control.field] = np.full(n, np.nan if default is None else default)
+                    given[control.field] = np.zeros(n, dtype=bool)
+                given[control.field][i] = True
+                if type(val) == str:
+                    strings[control.field].append((i, val))
+                else:
+                    column[i] = val
+        for field, values in strings.items():
+            rows = [i for i, _ in values]
+            try:
+                columns[field][rows] = stof_array([val for _, val in values])
+            except ValueError:
+                # raise the error of the first invalid value
+                columns[field][rows] = [stof(val) for _, val in values]
+        for field, column in list(columns.items()):
+            control = MosCell.__CONTROL__[field]
+            mask = given[field]
+            if control.inverse is not None and np.any(mask & (column == 0)):
+                raise ZeroDivisionError(control.inverse_message)
+            # mirrored (vgs/vsg, vds/vsd, vsb/vbs) and reciprocal (rds/gds) variables of the given values
+            for related, operation in [(control.mirror, np.negative), (control.inverse, np.reciprocal)]:
+                if related is None:
+                    continue
+                # unset (NaN) values of the column are discarded below
+                with np.errstate(divide="ignore"):
+                    values = operation(column)
+                if related not in columns:
+                    columns[related] = np.full(n, np.nan if __cell_defaults__[related] is None else __cell_defaults__[related])
+                columns[related] = np.where(mask, values, columns[related])
+        table = DeviceTable(capacity=n)
+        table.extend(n, dev_type=dev_type, name=names, type=types, **columns)
+        return table
+
         
+class DeviceView:
+    """_summary_
+    MosCell-like view over a single row of a DeviceTable.
+    Reading or writing an attribute reads or writes the table columns,
+    unset (NaN) variables are returned as None, as in MosCell
+    Args:
+        table   (DeviceTable)   : table holding the device
+        row     (int)           : row of the device in the table
+    """
+    __slots__=["_table", "_row"]
+    def __init__(self, table, row: int):
+        object.__setattr__(self, "_table", table)
+        object.__setattr__(self, "_row", row)
+
+    def __getattr__(self, var: str):
+        if var not in DeviceTable.__COLUMNS__:
+            raise AttributeError(f"{var} is not a device variable")
+        return self._table.get(self._row, var)
+
+    def __setattr__(self, var: str, val) -> None:
+        if var not in DeviceTable.__COLUMNS__:
+            raise AttributeError(f"{var} is not a device variable")
+        self._table.set(self._row, var, val)
+
+    def __str__(self) -> str:
+        return str(self.to_cell())
+
+    def to_cell(self) -> MosCell:
+        """_summary_
+        Copies the row into a new MosCell object
+        """
+        cell = MosCell()
+        for var in MosCell.__slots__:
+            setattr(cell, var, getattr(self, var))
+        return cell
+
+class DeviceTable:
+    """_summary_
+    Columnar (struct of arrays) store of CMOS devices, holding
+    one typed array per MosCell variable and categorical
+    name, type (nch/pch) and kind (cell/varactor/switch) columns.
+    Rows are appended in amortized O(1) time and can be accessed
+    through MosCell-like DeviceView objects
+    Args:
+        capacity (int, optional): number of rows to preallocate. Defaults to 16.
+    """
+    __KINDS__ = ["cell", "varactor", "switch"]
+    __CATEGORICAL__ = ["name", "type", "kind"]
+    __NUMERIC__ = [var for var in MosCell.__slots__ if var not in ["name", "type"]]
+    __COLUMNS__ = __CATEGORICAL__ + __NUMERIC__
+    # mirrored control variables, filled from each other when only one is given
+    __MIRRORS__ = {"vgs": "vsg", "vsg": "vgs", "vds": "vsd", "vsd": "vds", "vsb": "vbs", "vbs": "vsb"}
+    __slots__=["_size", "_capacity", "_numeric", "_codes", "_categories", "_lookup"]
+    def __init__(self, capacity: int=16):
+        self._size = 0
+        self._capacity = max(int(capacity), 1)
+        self._numeric = {var: np.full(self._capacity, np.nan) for var in DeviceTable.__NUMERIC__}
+        self._codes = {var: np.zeros(self._capacity, dtype=np.int32) for var in DeviceTable.__CATEGORICAL__}
+        self._categories = {var: [] for var in DeviceTable.__CATEGORICAL__}
+        self._lookup = {var: {} for var in DeviceTable.__CATEGORICAL__}
+        for kind in DeviceTable.__KINDS__:
+            self._encode("kind", kind)
+        for mos_type in TomlControlType:
+            self._encode("type", mos_type.value)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, row: int) -> DeviceView:
+        if row < 0:
+            row += self._size
+        if not 0 <= row < self._size:
+            raise IndexError(f"Row {row} out of range")
+        return DeviceView(self, row)
+
+    def __iter__(self):
+        for row in range(self._size):
+            yield DeviceView(self, row)
+
+    def __str__(self) -> str:
+        return str(self.to_frame())
+
+    def _encode(self, var: str, val: str) -> int:
+        code = self._lookup[var].get(val)
+        if code is None:
+            code = len(self._categories[var])
+            self._categories[var].append(val)
+            self._lookup[var][val] = code
+        return code
+
+    def _reserve(self, size: int) -> None:
+        """_summary_
+        Grows the columns geometrically until they can hold size rows
+        """
+        if size <= self._capacity:
+            return
+        capacity = self._capacity
+        while capacity < size:
+            capacity *= 2
+        for var, column in self._numeric.items():
+            grown = np.full(capacity, np.nan)
+            grown[:self._size] = column[:self._size]
+            self._numeric[var] = grown
+        for var, column in self._codes.items():
+            grown = np.zeros(capacity, dtype=np.int32)
+            grown[:self._size] = column[:self._size]
+            self._codes[var] = grown
+        self._capacity = capacity
+
+    def get(self, row: int, var: str):
+        if var in self._codes:
+            return self._categories[var][self._codes[var][row]]
+        val = self._numeric[var][row]
+        return None if np.isnan(val) else float(val)
+
+    def set(self, row: int, var: str, val) -> None:
+        if var in self._codes:
+            self._codes[var][row] = self._encode(var, val)
+        else:
+            self._numeric[var][row] = np.nan if val is None else val
+
+    def append(self, device: MosCell=None, dev_type: str="cell", **values) -> int:
+        """_summary_
+        Appends a single device to the table, either copied from a MosCell
+        or built from keyword variables (the missing ones take the MosCell defaults)
+        Args:
+            device      (MosCell, optional) : device to copy. Defaults to None.
+            dev_type    (str, optional)     : "cell", "varactor" or "switch". Defaults to "cell".
+        Returns:
+            int: row of the appended device
+        """
+        if device is not None:
+            values = {var: getattr(device, var) for var in MosCell.__slots__}
+        unknown = [var for var in values.keys() if var not in DeviceTable.__COLUMNS__]
+        if len(unknown) > 0:
+            raise ValueError(f"{unknown} are not valid device variables")
+        values.setdefault("kind", dev_type)
+        if values["kind"] not in DeviceTable.__KINDS__:
+            raise ValueError(f"Unknown device type: {values['kind']}")
+        for var, mirror in DeviceTable.__MIRRORS__.items():
+            if values.get(var) is not None and mirror not in values:
+                values[mirror] = -values[var]
+        row = self._size
+        self._reserve(row + 1)
+        for var in DeviceTable.__NUMERIC__:
+            val = values.get(var, __cell_defaults__[var])
+            self._numeric[var][row] = np.nan if val is None else val
+        for var in DeviceTable.__CATEGORICAL__:
+            self._codes[var][row] = self._encode(var, values.get(var, __cell_defaults__[var]))
+        self._size += 1
+        return row
+
+    def extend(self, n: int=None, dev_type: str="cell", **columns) -> slice:
+        """_summary_
+        Appends a batch of devices to the table from whole columns of values.
+        Scalars are broadcasted, missing variables take the MosCell defaults
+        and mirrored control variables (vgs/vsg, vds/vsd, vsb/vbs) are filled from each other
+        Args:
+            n           (int, optional) : number of devices. Defaults to the length of the given columns.
+            dev_type    (str, optional) : "cell", "varactor" or "switch", or an array of them. Defaults to "cell".
+            **columns                   : MosCell variable name -> value or array of values
+        Raises:
+            ValueError: unknown variable or device kind
+        Returns:
+            slice: rows of the appended devices
+        """
+        unknown = [var for var in columns.keys() if var not in DeviceTable.__COLUMNS__]
+        if len(unknown) > 0:
+            raise ValueError(f"{unknown} are not valid device variables")
+        if n is None:
+            lengths = [len(val) for val in columns.values() if np.ndim(val) > 0]
+            n = max(lengths) if len(lengths) > 0 else 1
+        columns = dict(columns)
+        if "kind" not in columns:
+            columns["kind"] = dev_type
+        kinds = np.unique(np.asarray(columns["kind"]))
+        if any([kind not in DeviceTable.__KINDS__ for kind in kinds]):
+            raise ValueError(f"Unknown device type: {[kind for kind in kinds if kind not in DeviceTable.__KINDS__]}")
+        for var, mirror in DeviceTable.__MIRRORS__.items():
+            if var in columns and mirror not in columns and columns[var] is not None:
+                columns[mirror] = -np.asarray(columns[var], dtype=float)
+        start = self._size
+        self._reserve(start + n)
+        rows = slice(start, start + n)
+        for var in DeviceTable.__NUMERIC__:
+            val = columns.get(var, __cell_defaults__[var])
+            # None (unset variable) is converted to NaN
+            self._numeric[var][rows] = np.nan if val is None else np.asarray(val, dtype=float)
+        for var in DeviceTable.__CATEGORICAL__:
+            val = columns.get(var, __cell_defaults__[var])
+            if np.ndim(val) == 0:
+                self._codes[var][rows] = self._encode(var, val)
+            else:
+                categories, inverse = np.unique(np.asarray(val, dtype=object).astype(str), return_inverse=True)
+                codes = np.array([self._encode(var, category) for category in categories], dtype=np.int32)
+                self._codes[var][rows] = codes[inverse.ravel()]
+        self._size += n
+        return rows
+
+    def column(self, var: str) -> np.ndarray:
+        """_summary_
+        Returns a (zero-copy) view of a numeric column, or the decoded values of a categorical column
+        """
+        if var in self._codes:
+            return np.asarray(self._categories[var], dtype=object)[self._codes[var][:self._size]]
+        if var not in self._numeric:
+            raise KeyError(f"{var} is not a device variable")
+        return self._numeric[var][:self._size]
+
+    def mask(self, dev_type: str=None, mos_type: str=None) -> np.ndarray:
+        """_summary_
+        Boolean mask of the rows of a given device kind and/or MOS type
+        """
+        mask = np.ones(self._size, dtype=bool)
+        for var, val in [("kind", dev_type), ("type", mos_type)]:
+            if val is not None:
+                mask &= self._codes[var][:self._size] == self._lookup[var].get(val, -1)
+        return mask
+
+    def to_frame(self) -> DataFrame:
+        """_summary_
+        Exports the table to a Pandas DataFrame without copying the numeric columns
+        """
+        data = {var: Categorical.from_codes(self._codes[var][:self._size], categories=self._categories[var]) for var in DeviceTable.__CATEGORICAL__}
+        for var in DeviceTable.__NUMERIC__:
+            data[var] = self._numeric[var][:self._size]
+        return DataFrame(data, copy=False)
+
+    @classmethod
+    def from_devices(cls, devices):
+        """_summary_
+        Builds a table from the cells, varactors and switches of a Devices object
+        """
+        table = cls(capacity=len(devices.devices) + len(devices.varactors) + len(devices.switches))
+        for dev_type, container in [("cell", devices.devices), ("varactor", devices.varactors), ("switch", devices.switches)]:
+            if len(container) == 0:
+                continue
+            cells = list(container.values())
+            table.extend(len(cells), dev_type=dev_type, **{var: [getattr(cell, var) for cell in cells] for var in MosCell.__slots__})
+        return table
+
+    def to_devices(self):
+        """_summary_
+        Copies the table rows into a new Devices object
+        """
+        devices = Devices()
+        for view in self:
+            devices.add(view.to_cell(), dev_type=view.kind)
+        return devices
+
+# variables that can be exported for each device ([spit] vars, "all" selects every one)
+__spit_vars__ = [var for var in MosCell.__slots__ if var not in ["name", "type"]]
+
+__default_cell__ = MosCell()
+__cell_defaults__ = {var: getattr(__default_cell__, var) for var in MosCell.__slots__}
+__cell_defaults__["kind"] = "cell"
+
+def _entry_hash(dev_type: str, entry: dict) -> str:
+    """_summary_
+    Digest of a [control] entry, in parsing order (the type must precede
+    the type dependent variables)
+    """
+    return hashlib.blake2b(repr((dev_type, list(entry.items()))).encode(), digest_size=16).hexdigest()
+
+class _DeviceDict(dict):
+    """_summary_
+    Dictionary of the devices of one kind, keeping the
+    unified name index of the Devices object up to date
+    """
+    __slots__=["_index", "_kind"]
+    def __init__(self, index: dict, kind: str):
+        super().__init__()
+        self._index = index
+        self._kind = kind
+
+    def __setitem__(self, name, device) -> None:
+        super().__setitem__(name, device)
+        self._index[name] = self._kind
+
+    def __delitem__(self, name) -> None:
+        super().__delitem__(name)
+        self._index.pop(name, None)
+
+    def pop(self, name, *default):
+        if name in self:
+            self._index.pop(name, None)
+        return super().pop(name, *default)
+
+    def popitem(self):
+        name, device = super().popitem()
+        self._index.pop(name, None)
+        return name, device
+
+    def setdefault(self, name, device=None):
+        if name not in self:
+            self[name] = device
+        return self[name]
+
+    def update(self, *args, **kwargs) -> None:
+        for name, device in dict(*args, **kwargs).items():
+            self[name] = device
+
+    def clear(self) -> None:
+        for name in self.keys():
+            self._index.pop(name, None)
+        super().clear()
+
+    def __reduce__(self):
+        # the index is shared with the other dictionaries (pickle memo)
+        return (self.__class__, (self._index, self._kind), None, None, iter(self.items()))
+
 class Devices:
     """_summary_
     A class object ot save all the devices to which
     the gm/id sizing process will be applied, and the output
-    specifications of each device
+    specifications of each device. Devices of every kind are also
+    indexed by name in index (name -> kind, see lookup)
     """
-    __slots__=["devices", "varactors", "switches", "spits", "plot", "output_dir"]
+    __slots__=["devices", "varactors", "switches", "index", "spits", "plot", "output_dir", "hashes", "dirty", "removed"]
     def __init__(self):
-        self.devices={}
-        self.varactors={}
-        self.switches={}
+        self.index={}
+        # hash of the [control] entry of each parsed device
+        self.hashes={}
+        self.dirty=[]
+        self.removed=[]
+        self.devices=_DeviceDict(self.index, "cell")
+        self.varactors=_DeviceDict(self.index, "varactor")
+        self.switches=_DeviceDict(self.index, "switch")
         self.spits=defaultdict(list)
         self.plot=False
         self.output_dir=None
@@ -369,7 +749,7 @@ class Devices:
         Returns:
             DataFrame: _description_
         """
-        vars = [var for var in dir(MosCell) if not var.startswith('__')]
+        vars = sorted(MosCell.__slots__)
         columns = [var+"["+MosCell.__UNITS__[var]+"]" for var in vars]
         data = {k:[] for k in columns}
         index = None
@@ -425,22 +805,93 @@ class Devices:
             KeyError: _description_
             ValueError: _description_
         """
-        if device.name in list(self.devices.keys()) + list(self.varactors.keys()) + list(self.switches.keys()):
+        if device.name in self.index:
             raise KeyError(f"A device with the name \"{device.name}\" was already parsed.")
+        self._container(dev_type)[device.name] = device
+
+    def _container(self, dev_type: str) -> dict:
         if dev_type == "varactor":
-            self.varactors[device.name] = device
+            return self.varactors
         elif dev_type == "cell":
-            self.devices[device.name] = device
+            return self.devices
         elif dev_type == "switch":
-            self.switches[device.name] = device
-        else:
-            raise ValueError(f"Unknown device type: {dev_type}")
+            return self.switches
+        raise ValueError(f"Unknown device type: {dev_type}")
+
+    def add_many(self, devices, dev_type = "cell") -> None:
+        """_summary_
+        Adds a batch of devices of the same type. The whole batch is
+        checked before any device is added
+        Args:
+            devices (iterable): devices to add
+            dev_type (str, optional): Device type identifier. Defaults to "cell".
+
+        Raises:
+            KeyError: a device name was already parsed or is repeated in the batch
+            ValueError: unknown device type
+        """
+        container = self._container(dev_type)
+        devices = list(devices)
+        names = [device.name for device in devices]
+        # the index only holds the kind of each device: no object is allocated
+        # per device, so a large batch does not trigger garbage collections
+        kinds = dict.fromkeys(names, dev_type)
+        if len(kinds) != len(names) or not self.index.keys().isdisjoint(kinds):
+            seen = set()
+            for name in names:
+                if name in self.index or name in seen:
+                    raise KeyError(f"A device with the name \"{name}\" was already parsed.")
+                seen.add(name)
+        dict.update(container, zip(names, devices))
+        self.index.update(kinds)
 
-    def parse_data(self, data:dict) -> None:
+    def __contains__(self, name: str) -> bool:
+        return name in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def lookup(self, name: str) -> tuple:
         """_summary_
-        Parses the data dictionary and adds the devices to the Devices object
+        Finds a device of any kind by name
         Args:
-            data (dict): Dictionary containing the data to be parsed
+            name (str): device name
+        Raises:
+            KeyError: unknown device name
+        Returns:
+            tuple: (kind, device), kind being "cell", "varactor" or "switch"
+        """
+        kind = self.index.get(name)
+        if kind is None:
+            raise KeyError(f"{name} is an unrecognized device name")
+        return kind, dict.__getitem__(self._container(kind), name)
+
+    def _parse_entry(self, name: str, entry: dict, dev_type: str, previous=None) -> None:
+        """_summary_
+        Builds and adds the device of a [control] entry, or reuses the device
+        of the previous parse if the entry did not change
+        """
+        digest = _entry_hash(dev_type, entry)
+        device = None
+        if previous is not None and previous.hashes.get(name) == digest:
+            device = previous.lookup(name)[1]
+        if device is None:
+            device = MosCell.from_dict(entry, name=name)
+            self.dirty.append(name)
+        self.add(device, dev_type=dev_type)
+        self.hashes[name] = digest
+
+    @profiled
+    def parse_data(self, data:dict, previous=None) -> None:
+        """_summary_
+        Parses the data dictionary and adds the devices to the Devices object.
+        Each [control] entry is hashed: when the devices of a previous parse are given,
+        the devices whose entries did not change are reused as they are (keeping
+        their computed outputs) and only the other ones are rebuilt. The rebuilt
+        or new devices are listed in dirty and the dropped ones in removed
+        Args:
+            data        (dict)              : Dictionary containing the data to be parsed
+            previous    (Devices, optional) : devices of a previous parse of the same specifications. Defaults to None.
         """
         for sec in data.keys():
             if sec == TomlSections.CONTROL.value:
@@ -448,49 +899,24 @@ class Devices:
                 key,token = list(data[sec].items())[0]
                 if key == TomlControlKeywords.DEVICE.value:
                     # create a new device
-                    device = MosCell(name=token)
-                    for key,token in list(data[sec].items())[1:]:
-                        device.__parse_data__(key, token)
-                    self.add(device, dev_type="cell")
+                    self._parse_entry(token, dict(list(data[sec].items())[1:]), "cell", previous)
                 elif key == TomlControlKeywords.VARACTOR.value:
                     # create a new varactor
-                    varactor = MosCell(name=token)
-                    for key,token in list(data[sec].items())[1:]:
-                        varactor.__parse_data__(key, token)
-                    self.add(varactor, dev_type="varactor")
+                    self._parse_entry(token, dict(list(data[sec].items())[1:]), "varactor", previous)
                 elif key == TomlControlKeywords.SWITCH.value:
                     # create a new switch
-                    switch = MosCell(name=token)
+                    self._parse_entry(token, dict(list(data[sec].items())[1:]), "switch", previous)
+                elif key in [TomlControlKeywords.DEVICES.value, TomlControlKeywords.VARACTORS.value, TomlControlKeywords.SWITCHES.value]:
+                    dev_type = {
+                        TomlControlKeywords.DEVICES.value: "cell",
+                        TomlControlKeywords.VARACTORS.value: "varactor",
+                        TomlControlKeywords.SWITCHES.value: "switch",
+                    }[key]
+                    names = [n for n in token]
                     for key,token in list(data[sec].items())[1:]:
-                        switch.__parse_data__(key, token)
-                    self.add(switch, dev_type="switch")
-                elif key == TomlControlKeywords.DEVICES.value:
-                    devices_names = [n for n in token]
-                    for key,token in list(data[sec].items())[1:]:
-                        if key not in devices_names:
-                            raise ValueError(f"{key} is an unrecognized device name")
-                        device = MosCell(name=key)
-                        for subkey, subtoken in token.items():
-                            device.__parse_data__(subkey, subtoken)
-                        self.add(device)
-                elif key == TomlControlKeywords.VARACTORS.value:
-                    varactors_names = [n for n in token]
-                    for key,token in list(data[sec].items())[1:]:
-                        if key not in varactors_names:
+                        if key not in names:
                             raise ValueError(f"{key} is an unrecognized device name")
-                        varactor = MosCell(name=key)
-                        for subkey, subtoken in token.items():
-                            varactor.__parse_data__(subkey, subtoken)
-                        self.add(varactor, dev_type="varactor")
-                elif key == TomlControlKeywords.SWITCHES.value:
-                    switches_names = [n for n in token]
-                    for key,token in list(data[sec].items())[1:]:
-                        if key not in switches_names:
-                            raise ValueError(f"{key} is an unrecognized device name")
-                        switch = MosCell(name=key)
-                        for subkey, subtoken in token.items():
-                            switch.__parse_data__(subkey, subtoken)
-                        self.add(switch, dev_type="switch")
+                        self._parse_entry(key, token, dev_type, previous)
                 else:
                     raise ValueError(f"{key} is not a valid key for the first argument of {TomlSections.CONTROL.name} section. First argument must be {TomlControlKeywords.DEVICE.name} or {TomlControlKeywords.DEVICES.name}.")
             elif sec == TomlSections.SPIT.value:
@@ -509,18 +935,21 @@ class Devices:
                         else:
                             self.plot = token
                     elif key == TomlSpitKeywords.VARS.value:
-                        acceptable_vars = ['all']
-                        [acceptable_vars.append(v) for v in dir(MosCell) if not v.startswith('__')]
+                        acceptable_vars = set(['all'] + MosCell.__slots__)
                         for subkey, subtoken in token.items():
                             
-                            if subkey not in list(self.devices.keys()) + list(self.varactors.keys()) + list(self.switches.keys()):
+                            if subkey not in self.index:
                                 raise ValueError(f"{subkey} is an unrecognized device name. Recognized devices are {list(self.devices.keys()) + list(self.varactors.keys()) + list(self.switches.keys())}")
                             for var in subtoken:    
                                 if var not in acceptable_vars:
                                     raise ValueError(f"{var} is an unrecognized variable name")
-                                if var != 'all':
-                                    self.spits[subkey].append(var)
+                                spit = self.spits[subkey]
+                                for output in (__spit_vars__ if var == 'all' else [var]):
+                                    if output not in spit:
+                                        spit.append(output)
             else:
                 raise ValueError(f"{sec} is not a valid section name")
         if len(self.devices) == 0 and len(self.varactors) == 0 and len(self.switches) == 0:
-            raise ValueError("No devices were detected in the TOML setup file")
\ No newline at end of file
+            raise ValueError("No devices were detected in the TOML setup file")
+        if previous is not None:
+            self.removed = [name for name in previous.hashes.keys() if name not in self.hashes]
\ No newline at end of file
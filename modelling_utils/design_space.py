@@ -0,0 +1,157 @@
+""" ***********************************
+* *[author] Diogo André (git-hub : das-dias)
+* *[date] 2022-05-05
+* *[filename] design_space.py
+* *[summary] Design space exploration of a cell: the Cartesian product of its
+*               control variables is solved against the LUT in chunks, into a
+*               columnar table, optionally reduced to its Pareto front
+* ***********************************
+"""
+from loguru import logger
+import numpy as np
+import pandas as pd
+
+from .data import(
+    MosCell,
+)
+from .sizing import(
+    solve_cells,
+    _resolve_lut,
+    _gate_axis,
+    _mirror,
+    __cell_outputs__,
+)
+from .profiling import(
+    profiled,
+)
+
+# control variables of a cell that can be swept
+__sweep_vars__ = ["gmoverid", "id", "l", "vds", "vsd", "vsb", "vbs"]
+# default Pareto objectives: fast, high gain and small devices
+__pareto_objectives__ = {"ft": "max", "self_gain": "max", "w": "min"}
+
+def pareto_front(columns: dict, objectives: dict=None) -> np.ndarray:
+    """_summary_
+    Indices of the non-dominated points of a columnar table
+    Args:
+        columns     (dict / pd.DataFrame)   : variable name -> np.ndarray
+        objectives  (dict, optional)        : variable name -> "max" or "min".
+                                            Defaults to {"ft": "max", "self_gain": "max", "w": "min"}.
+    Raises:
+        ValueError: unknown objective direction
+    Returns:
+        np.ndarray: sorted indices of the Pareto optimal points, points with NaN objectives are excluded
+    """
+    objectives = objectives if bool(objectives) else __pareto_objectives__
+    if any([direction not in ["max", "min"] for direction in objectives.values()]):
+        raise ValueError("Pareto objectives must be either \"max\" or \"min\"")
+    # every objective is oriented to be maximized
+    points = np.stack([
+        np.asarray(columns[var], dtype=float)*(1.0 if direction == "max" else -1.0)
+        for var, direction in objectives.items()
+    ], axis=1)
+    candidates = np.flatnonzero(np.isfinite(points).all(axis=1))
+    points = points[candidates]
+    # the point of highest normalized score is never dominated
+    low, high = points.min(axis=0, initial=np.inf), points.max(axis=0, initial=-np.inf)
+    span = np.where(high > low, high - low, 1.0)
+    score = ((points - low)/span).sum(axis=1)
+    front = []
+    while len(candidates) > 0:
+        best = np.argmax(score)
+        p = points[best]
+        dominated = np.all(points <= p, axis=1) & np.any(points < p, axis=1)
+        dominated[best] = True
+        front.append(candidates[best])
+        candidates, points, score = candidates[~dominated], points[~dominated], score[~dominated]
+    return np.sort(np.asarray(front, dtype=np.intp))
+
+@profiled
+def sweep(
+    template: MosCell,
+    lut,
+    outputs: list=None,
+    chunk_size: int=65536,
+    pareto=False,
+    **sweeps
+    ) -> pd.DataFrame:
+    """_summary_
+    Solves every point of the Cartesian product of the swept control variables
+    of a cell (see sizing.solve_cells). The points are enumerated and solved
+    chunk by chunk, so only the results table is stored in memory, or only
+    the Pareto front when pareto is set
+    Args:
+        template    (MosCell)           : cell giving the MOS type and the values of the control variables not swept
+        lut         (Lut / dict)        : gridded LUT, or a dictionary of LUTs (see sizing.size)
+        outputs     (list, optional)    : output variables to keep. Defaults to the gate voltage,
+                                        w, gm, gds, ft, self_gain, vdsat and cgg.
+        chunk_size  (int, optional)     : number of points solved at once. Defaults to 65536.
+        pareto      (bool / dict, optional): keep only the Pareto front, updated as chunks are solved.
+                                        True for the (ft, self_gain, w) objectives, or a dictionary
+                                        of variable name -> "max" / "min". Defaults to False.
+        **sweeps                        : swept control variable (gmoverid, id, l, vds, vsb, ...) -> values
+    Raises:
+        ValueError: no or unknown swept variables
+    Returns:
+        pd.DataFrame: one row per point, with the swept variables and the outputs,
+                    NaN outputs where the point is out of the LUT range
+    """
+    unknown = [var for var in sweeps.keys() if var not in __sweep_vars__]
+    if len(unknown) > 0:
+        raise ValueError(f"{unknown} can not be swept, use one of {__sweep_vars__}")
+    if len(sweeps) == 0:
+        raise ValueError("No control variable to sweep")
+    group_lut = _resolve_lut(lut, "cell", template.type)
+    gate = _gate_axis(group_lut)
+    axes = [axis for axis in group_lut.axes.keys() if axis != gate]
+    for var in sweeps.keys():
+        if var not in ["gmoverid", "id"] + axes and _mirror(var) not in axes and var not in group_lut.constants:
+            raise ValueError(f"{var} is not an axis of the LUT. LUT axes are {list(group_lut.axes.keys())}")
+    outputs = list(outputs) if outputs is not None else list(__cell_outputs__)
+    objectives = (pareto if isinstance(pareto, dict) else __pareto_objectives__) if bool(pareto) else None
+    if objectives is not None:
+        outputs += [var for var in objectives.keys() if var not in outputs and var not in sweeps]
+    names = list(sweeps.keys())
+    values = [np.atleast_1d(np.asarray(sweeps[var], dtype=float)) for var in names]
+    shape = tuple(len(v) for v in values)
+    npoints = int(np.prod(shape))
+    columns = {}
+    front = {}
+    for start in range(0, npoints, chunk_size):
+        index = np.arange(start, min(start + chunk_size, npoints))
+        point = {var: v[i] for var, v, i in zip(names, values, np.unravel_index(index, shape))}
+        args = {}
+        for var in ["gmoverid", "id"] + axes:
+            if var in point:
+                args[var] = point[var]
+            elif _mirror(var) in point:
+                args[var] = -point[_mirror(var)]
+            else:
+                args[var] = np.full(len(index), float(getattr(template, var)))
+        # swept LUT constants: only the points at the characterized value are solved
+        args.update({var: point[var] for var in group_lut.constants.keys() if var in point})
+        solved = solve_cells(group_lut, **args)
+        for var in list(solved.keys()):
+            mirror = _mirror(var)
+            if mirror is not None and mirror not in solved:
+                solved[mirror] = -solved[var]
+        chunk = dict(point)
+        for var in outputs:
+            if var in solved and var not in chunk:
+                chunk[var] = np.broadcast_to(solved[var], index.shape)
+        if objectives is None:
+            for var, v in chunk.items():
+                if var not in columns:
+                    columns[var] = np.empty(npoints)
+                columns[var][index] = v
+            continue
+        # merge the chunk into the current Pareto front
+        merged = {var: np.concatenate([front[var], v]) if var in front else v for var, v in chunk.items()}
+        front = {var: v[pareto_front(merged, objectives)] for var, v in merged.items()}
+    df = pd.DataFrame(front if objectives is not None else columns, copy=False)
+    if "w" in df.columns:
+        logger.info(
+            f"Swept {npoints} {template.type} cell points"
+            + (f", {len(df)} on the Pareto front" if objectives is not None else f", {int(df['w'].isna().sum())} out of the LUT range")
+        )
+    return df
@@ -0,0 +1,242 @@
+""" ***********************************
+* *[author] Diogo André (git-hub : das-dias)
+* *[date] 2022-05-05
+* *[filename] figures.py
+* *[summary] Object oriented plotting on explicit matplotlib Figure objects,
+*               without the pyplot state machine. A figure and its artists are
+*               built once and updated in place (set_data) between saves, and
+*               each figure owns its Agg canvas, so figures can be rendered
+*               from worker threads (one figure per thread)
+* ***********************************
+"""
+import os
+import numpy as np
+from .utils import(
+    __figs_path__,
+    decimate,
+)
+from .profiling import(
+    profiled,
+)
+
+# style of utils._set_2D_style, applied to the artists of each figure
+# instead of to the global matplotlib rc parameters
+__2D_style__ = {
+    "color": ['r', 'b', 'g', 'k', 'm'],
+    "linestyle": ['-', '--', '-.', '-', "--"],
+    "marker": ["o", "D", "v", ">", "s"],
+    "linewidth": 3,
+    "markeredgewidth": 4,
+    "titlesize": 16,
+    "labelsize": 14,
+    "ticksize": 12,
+    "legendsize": 11,
+    "family": "serif",
+    "gridcolor": ".8",
+}
+
+def _figure(figsize: tuple=None, dpi: float=None):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    figure = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(figure)
+    return figure
+
+def _style_axis(axis, title: str=None, xlabel: str=None, ylabel: str=None) -> None:
+    from cycler import cycler
+    axis.set_prop_cycle(
+        cycler(color=__2D_style__["color"]) +
+        cycler(linestyle=__2D_style__["linestyle"]) +
+        cycler(marker=__2D_style__["marker"])
+    )
+    axis.set_facecolor("white")
+    axis.grid(True, color=__2D_style__["gridcolor"])
+    axis.set_axisbelow(True)
+    for spine in axis.spines.values():
+        spine.set_color(__2D_style__["gridcolor"])
+    axis.tick_params(labelsize=__2D_style__["ticksize"], length=0)
+    for label in axis.get_xticklabels() + axis.get_yticklabels():
+        label.set_family(__2D_style__["family"])
+    axis.set_title(title if bool(title) else "", fontsize=__2D_style__["titlesize"], family=__2D_style__["family"])
+    axis.set_xlabel(xlabel if bool(xlabel) else "", fontsize=__2D_style__["labelsize"], family=__2D_style__["family"])
+    axis.set_ylabel(ylabel if bool(ylabel) else "", fontsize=__2D_style__["labelsize"], family=__2D_style__["family"])
+
+def _figure_path(filename: str) -> str:
+    if os.path.isabs(filename):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        return filename
+    os.makedirs(__figs_path__, exist_ok=True)
+    return os.path.join(__figs_path__, filename)
+
+class LinePlot:
+    """_summary_
+    Reusable 2D line plot. The figure and axes are built once, the lines
+    on the first update, and successive updates only replace the line data
+    Args:
+        xlabel  (str, optional)     : abciss axis title. Defaults to None.
+        ylabel  (str, optional)     : ordinate axis title. Defaults to None.
+        title   (str, optional)     : title of the plot. Defaults to None.
+        figsize (tuple, optional)   : figure size in inches. Defaults to matplotlib's default.
+        dpi     (float, optional)   : figure resolution. Defaults to matplotlib's default.
+    """
+    __slots__=["figure", "axis", "lines", "labels", "_legend"]
+    def __init__(self, xlabel: str=None, ylabel: str=None, title: str=None, figsize: tuple=None, dpi: float=None):
+        self.figure = _figure(figsize, dpi)
+        self.axis = self.figure.add_subplot()
+        _style_axis(self.axis, title=title, xlabel=xlabel, ylabel=ylabel)
+        self.lines = []
+        self.labels = []
+        self._legend = None
+
+    def set_title(self, title: str) -> None:
+        self.axis.set_title(title if bool(title) else "", fontsize=__2D_style__["titlesize"], family=__2D_style__["family"])
+
+    @profiled(name="LinePlot.update")
+    def update(self, x, y, labels: list=[], xlim: tuple=None, ylim: tuple=None, max_points: int=None, method: str="minmax"):
+        """_summary_
+        Replaces the plotted curves. Existing lines are updated in place,
+        lines are only created (or removed) when the number of curves changes
+        Args:
+            x       (np.ndarray / list) : x values, shared by all curves or one per curve
+            y       (np.ndarray / list) : y values, one curve or a list of curves
+            labels  (list, optional)    : labels of the curves. Defaults to [].
+            xlim    (tuple, optional)   : x axis limits. Defaults to the range of x.
+            ylim    (tuple, optional)   : y axis limits. Defaults to autoscaling.
+            max_points (int, optional)  : maximum number of points per curve (see utils.decimate). Defaults to None.
+            method  (str, optional)     : downsampling method, "minmax" or "lttb". Defaults to "minmax".
+        Raises:
+            TypeError: labels are not strings
+            ValueError: labels, x and y do not match
+        Returns:
+            LinePlot: self
+        """
+        if not all([isinstance(label, str) for label in labels]):
+            raise TypeError("Labels should be strings")
+        ys = [y] if isinstance(y, np.ndarray) else list(y)
+        xs = list(x) if isinstance(x, list) else [x]*len(ys)
+        if len(xs) != len(ys):
+            raise ValueError("x and y should have the same number of curves")
+        if len(labels) not in [len(ys), 0]:
+            raise ValueError("Labels and y values should have the same length or no labels at all")
+        if bool(max_points):
+            curves = [decimate(x_vec, y_vec, max_points, method) for x_vec, y_vec in zip(xs, ys)]
+            xs, ys = [x_vec for x_vec, _ in curves], [y_vec for _, y_vec in curves]
+        while len(self.lines) > len(ys):
+            self.lines.pop().remove()
+        for i, (x_vec, y_vec) in enumerate(zip(xs, ys)):
+            if i < len(self.lines):
+                self.lines[i].set_data(x_vec, y_vec)
+            else:
+                line, = self.axis.plot(x_vec, y_vec, linewidth=__2D_style__["linewidth"], markeredgewidth=__2D_style__["markeredgewidth"])
+                self.lines.append(line)
+        labels = list(labels)
+        if labels != self.labels:
+            for line, label in zip(self.lines, labels if len(labels) > 0 else [None]*len(self.lines)):
+                line.set_label(label)
+            if self._legend is not None:
+                self._legend.remove()
+                self._legend = None
+            if len(labels) > 0:
+                self._legend = self.axis.legend(prop={"size": __2D_style__["legendsize"], "family": __2D_style__["family"]})
+            self.labels = labels
+        if not bool(xlim):
+            xlim = (min([x_vec[0] for x_vec in xs]), max([x_vec[-1] for x_vec in xs]))
+        self.axis.set_xlim(xlim[0], xlim[1])
+        if bool(ylim):
+            self.axis.set_ylim(ylim[0], ylim[1])
+        else:
+            self.axis.relim()
+            self.axis.autoscale_view(scalex=False)
+        return self
+
+    def render(self) -> np.ndarray:
+        """_summary_
+        Draws the figure on its canvas
+        Returns:
+            np.ndarray: RGBA image of the figure (height x width x 4)
+        """
+        self.figure.canvas.draw()
+        return np.asarray(self.figure.canvas.buffer_rgba())
+
+    @profiled(name="LinePlot.save")
+    def save(self, filename: str) -> str:
+        """_summary_
+        Saves the figure
+        Args:
+            filename (str): name of the file (saved in the figures folder) or absolute path
+        Returns:
+            str: path of the written file
+        """
+        path = _figure_path(filename)
+        self.figure.savefig(path)
+        return path
+
+class Plot3D:
+    """_summary_
+    Reusable 3D plot. Lines are updated in place, surfaces, wireframes
+    and scatter plots replace their artist on each update
+    Args:
+        xlabel  (str, optional)     : x axis title. Defaults to None.
+        ylabel  (str, optional)     : y axis title. Defaults to None.
+        zlabel  (str, optional)     : z axis title. Defaults to None.
+        title   (str, optional)     : title of the plot. Defaults to None.
+        type    (str, optional)     : "line", "scatter", "surface" or "wireframe". Defaults to "line".
+        figsize (tuple, optional)   : figure size in inches. Defaults to matplotlib's default.
+        dpi     (float, optional)   : figure resolution. Defaults to matplotlib's default.
+    Raises:
+        ValueError: unsupported plot type
+    """
+    __types__ = ["line", "scatter", "surface", "wireframe"]
+    __slots__=["figure", "axis", "type", "artist"]
+    def __init__(self, xlabel: str=None, ylabel: str=None, zlabel: str=None, title: str=None, type: str=None, figsize: tuple=None, dpi: float=None):
+        type = type.lower() if bool(type) else "line"
+        if type not in self.__types__:
+            raise ValueError(f"Unsupported plot type: {type}")
+        from mpl_toolkits import mplot3d # registers the 3d projection
+        self.figure = _figure(figsize, dpi)
+        self.axis = self.figure.add_subplot(projection="3d")
+        self.type = type
+        self.artist = None
+        if bool(title):
+            self.axis.set_title(title)
+        if bool(xlabel):
+            self.axis.set_xlabel(xlabel)
+        if bool(ylabel):
+            self.axis.set_ylabel(ylabel)
+        if bool(zlabel):
+            self.axis.set_zlabel(zlabel)
+
+    @profiled(name="Plot3D.update")
+    def update(self, x: np.ndarray, y: np.ndarray, z: np.ndarray):
+        """_summary_
+        Replaces the plotted data
+        Returns:
+            Plot3D: self
+        """
+        if not all([isinstance(v, np.ndarray) for v in [x,y,z]]):
+            raise TypeError("All vectors must be of type numpy.ndarray")
+        if self.type == "line" and self.artist is not None:
+            self.artist.set_data_3d(x, y, z)
+            self.axis.auto_scale_xyz(x, y, z, had_data=False)
+            return self
+        if self.artist is not None:
+            self.artist.remove()
+        if self.type == "line":
+            self.artist, = self.axis.plot3D(x, y, z)
+        elif self.type == "scatter":
+            self.artist = self.axis.scatter(x, y, z, c=x+y)
+        elif self.type == "surface":
+            self.artist = self.axis.plot_surface(x, y, z, cmap="seismic", edgecolor="grey")
+        else:
+            self.artist = self.axis.plot_wireframe(x, y, z, color='blue')
+        return self
+
+    def render(self) -> np.ndarray:
+        self.figure.canvas.draw()
+        return np.asarray(self.figure.canvas.buffer_rgba())
+
+    @profiled(name="Plot3D.save")
+    def save(self, filename: str) -> str:
+        path = _figure_path(filename)
+        self.figure.savefig(path)
+        return path
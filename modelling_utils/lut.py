@@ -0,0 +1,557 @@
+""" ***********************************
+* *[author] Diogo André (git-hub : das-dias)
+* *[date] 2022-05-05
+* *[filename] lut.py
+* *[summary] Gridded Look Up Table object, storing each device parameter
+*               as a dense array over the regular sweep axes of the LUT,
+*               with fast vectorized interpolation
+* ***********************************
+"""
+import itertools
+import json
+import os
+import shutil
+import tempfile
+from loguru import logger
+import numpy as np
+import pandas as pd
+
+from .read import(
+    read_lut,
+    _file_key,
+    __lut_axes__,
+)
+from .profiling import(
+    profiled,
+)
+
+# format of the persisted inverse indices (see InverseIndex.save)
+__inverse_index_version__ = 1
+__inverse_index_arrays__ = ["curves", "direction", "start", "keys"]
+
+class Lut:
+    """_summary_
+    Object implementing a N-dimensional gridded Look Up Table.
+    Each device parameter (gm, gds, id, cgs, vdsat, ...) is stored
+    as a dense array over the regular axes of the LUT
+    (l x vsb x vds x vgs for NMOS, l x vbs x vsd x vsg for PMOS)
+    Args:
+        axes        (dict): ordered axis name -> strictly increasing axis values
+        params      (dict): parameter name -> array of shape (len(axis) for axis in axes)
+        constants   (dict): variables holding a single value in the whole LUT (e.g. w)
+        source      (str) : path of the file the LUT was read from, if any
+    """
+    # known axes of a LUT, in the order they are stacked in the dense arrays
+    __AXES__ = __lut_axes__
+    __slots__ = ["axes", "params", "constants", "source", "_indices"]
+    def __init__(self, axes: dict, params: dict, constants: dict = None, source: str = None):
+        self.axes = {name: np.asarray(values, dtype=float) for name, values in axes.items()}
+        shape = self.shape
+        for name, values in self.axes.items():
+            if values.ndim != 1 or len(values) < 2 or np.any(np.diff(values) <= 0):
+                raise ValueError(f"Axis {name} must be a strictly increasing vector with at least two values")
+        self.params = {}
+        for name, values in params.items():
+            values = np.asarray(values)
+            if values.shape != shape:
+                raise ValueError(f"Parameter {name} has shape {values.shape}, but the LUT axes have shape {shape}")
+            self.params[name] = values
+        self.constants = dict(constants) if bool(constants) else {}
+        self.source = os.path.abspath(source) if bool(source) else None
+        # inverse indices, built on demand (see inverse_index)
+        self._indices = {}
+
+    @property
+    def shape(self) -> tuple:
+        return tuple(len(values) for values in self.axes.values())
+
+    def __getitem__(self, param: str) -> np.ndarray:
+        return self.params[param]
+
+    def __contains__(self, param: str) -> bool:
+        return param in self.params
+
+    def __str__(self) -> str:
+        axes = ", ".join([f"{name}[{len(values)}]: {values[0]:g}..{values[-1]:g}" for name, values in self.axes.items()])
+        constants = ", ".join([f"{name}={value:g}" for name, value in self.constants.items()])
+        return f"Lut(axes=({axes}), constants=({constants}), params={list(self.params.keys())})"
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, axes: list = None):
+        """_summary_
+        Builds a gridded LUT from a long format data frame, as returned by read_lut
+        Args:
+            df      (pd.DataFrame)  : unfolded LUT
+            axes    (list, optional): names of the axis columns. Defaults to the known
+                                    LUT axes found in the data frame columns.
+        Raises:
+            ValueError: the data frame does not describe a regular grid
+
+        Returns:
+            Lut: the gridded LUT
+        """
+        axes = axes if bool(axes) else [name for name in cls.__AXES__ if name in df.columns]
+        missing = [name for name in axes if name not in df.columns]
+        if len(missing) > 0:
+            raise ValueError(f"Axis {missing} not found in the LUT columns")
+        grid_axes = {}
+        constants = {}
+        indices = []
+        for name in axes:
+            values, index = np.unique(df[name].to_numpy(dtype=float), return_inverse=True)
+            if len(values) == 1:
+                constants[name] = float(values[0])
+            else:
+                grid_axes[name] = values
+                indices.append(index.ravel())
+        shape = tuple(len(values) for values in grid_axes.values())
+        flat = np.ravel_multi_index(indices, shape) if len(indices) > 0 else np.zeros(len(df), dtype=int)
+        if len(np.unique(flat)) != len(flat):
+            raise ValueError("The LUT has repeated points in its axes grid")
+        params = {}
+        for name in df.columns:
+            if name in axes:
+                continue
+            values = np.full(int(np.prod(shape)), np.nan)
+            values[flat] = df[name].to_numpy(dtype=float)
+            params[name] = values.reshape(shape)
+        return cls(grid_axes, params, constants)
+
+    @classmethod
+    def from_csv(cls, path: str, axes: list = None):
+        """_summary_
+        Reads a Cadence LUT exported to CSV directly into a gridded LUT
+        Args:
+            path    (str)           : path to read the file from
+            axes    (list, optional): names of the axis columns
+        Returns:
+            Lut: the gridded LUT
+        """
+        lut = cls.from_frame(read_lut(path), axes=axes)
+        lut.source = os.path.abspath(path)
+        return lut
+
+    def _coords(self, coords: dict) -> tuple:
+        """_summary_
+        Validates and broadcasts the query coordinates against the LUT axes
+        """
+        unknown = [name for name in coords.keys() if name not in self.axes and name not in self.constants]
+        if len(unknown) > 0:
+            raise ValueError(f"{unknown} are not axes of the LUT. LUT axes are {list(self.axes.keys())}")
+        missing = [name for name in self.axes.keys() if name not in coords]
+        if len(missing) > 0:
+            raise ValueError(f"Missing coordinates for the LUT axes {missing}")
+        points = np.broadcast_arrays(*[np.asarray(coords[name], dtype=float) for name in self.axes.keys()], self.characterized(**coords))
+        return points[-1].shape, [p.ravel() for p in points[:-1]], points[-1].ravel()
+
+    def characterized(self, **coords) -> np.ndarray:
+        """_summary_
+        Checks the query coordinates given for the LUT constants (e.g. l on a LUT
+        characterized for a single length) against their characterized values
+        Args:
+            **coords    (float / np.ndarray): query coordinates, the ones of the LUT axes are ignored
+        Returns:
+            np.ndarray: True where every given constant matches the LUT, broadcasted together
+        """
+        valid = np.asarray(True)
+        for name, value in self.constants.items():
+            if name in coords:
+                valid = valid & np.isclose(np.asarray(coords[name], dtype=float), value, rtol=1e-6, atol=0.0)
+        return valid
+
+    def _linear_stencil(self, axis: np.ndarray, q: np.ndarray, extrapolate: bool) -> tuple:
+        i = np.clip(np.searchsorted(axis, q, side="right") - 1, 0, len(axis) - 2)
+        t = (q - axis[i]) / (axis[i+1] - axis[i])
+        if not extrapolate:
+            t = np.clip(t, 0.0, 1.0)
+        return (i, i+1), (1.0 - t, t)
+
+    def _cubic_stencil(self, axis: np.ndarray, q: np.ndarray, extrapolate: bool) -> tuple:
+        # cubic convolution (Catmull-Rom) weights on a possibly non-uniform axis,
+        # using the normalized position inside the bracketing interval
+        if len(axis) < 4:
+            return self._linear_stencil(axis, q, extrapolate)
+        n = len(axis)
+        i = np.clip(np.searchsorted(axis, q, side="right") - 1, 0, n - 2)
+        t = (q - axis[i]) / (axis[i+1] - axis[i])
+        if not extrapolate:
+            t = np.clip(t, 0.0, 1.0)
+        t2 = t*t
+        t3 = t2*t
+        w0 = 0.5*(-t3 + 2*t2 - t)
+        w1 = 0.5*(3*t3 - 5*t2 + 2)
+        w2 = 0.5*(-3*t3 + 4*t2 + t)
+        w3 = 0.5*(t3 - t2)
+        # the samples beyond the axis boundaries are linearly extrapolated
+        # from the two edge samples, f[-1] = 2f[0] - f[1] and f[n] = 2f[n-1] - f[n-2],
+        # and their weights are folded onto those edge samples
+        low = i == 0
+        w1 = np.where(low, w1 + 2*w0, w1)
+        w2 = np.where(low, w2 - w0, w2)
+        w0 = np.where(low, 0.0, w0)
+        high = i == n - 2
+        w2 = np.where(high, w2 + 2*w3, w2)
+        w1 = np.where(high, w1 - w3, w1)
+        w3 = np.where(high, 0.0, w3)
+        index = tuple(np.clip(i + k, 0, n - 1) for k in (-1, 0, 1, 2))
+        return index, (w0, w1, w2, w3)
+
+    @profiled
+    def interp(self, params, method: str = "linear", fill_value: float = np.nan, **coords):
+        """_summary_
+        Vectorized interpolation of one or more LUT parameters
+        at an arbitrary batch of query points
+        Args:
+            params      (str / list)        : parameter name or list of parameter names
+            method      (str, optional)     : "linear" (multilinear) or "cubic". Defaults to "linear".
+            fill_value  (float, optional)   : value returned for points outside the LUT axes.
+                                            If None, the values are extrapolated. Defaults to np.nan.
+            **coords    (float / np.ndarray): query coordinates for each LUT axis, broadcasted together.
+                                            Values may also be given for the LUT constants (e.g. l),
+                                            the points where they differ from the LUT are NaN.
+        Raises:
+            ValueError: unknown method, parameter or axis
+        Returns:
+            np.ndarray / dict: interpolated values, or a dict of parameter name -> values if a list was given
+        """
+        names = [params] if isinstance(params, str) else list(params)
+        unknown = [name for name in names if name not in self.params]
+        if len(unknown) > 0:
+            raise ValueError(f"{unknown} are not parameters of the LUT. LUT parameters are {list(self.params.keys())}")
+        if method == "linear":
+            stencil = self._linear_stencil
+        elif method == "cubic":
+            stencil = self._cubic_stencil
+        else:
+            raise ValueError(f"Unsupported interpolation method: {method}")
+        shape, points, valid = self._coords(coords)
+        extrapolate = fill_value is None
+        stencils = [stencil(axis, q, extrapolate) for axis, q in zip(self.axes.values(), points)]
+        strides = np.cumprod((self.shape + (1,))[:0:-1])[::-1]
+        size = valid.size
+        results = {name: np.zeros(size) for name in names}
+        flat_params = {name: self.params[name].ravel() for name in names}
+        # accumulate the weighted contribution of every corner of the stencil
+        for corner in itertools.product(*[range(len(index)) for index, _ in stencils]):
+            flat = np.zeros(size, dtype=np.intp)
+            weight = np.ones(size)
+            for axis, k in enumerate(corner):
+                index, weights = stencils[axis]
+                flat += index[k]*strides[axis]
+                weight *= weights[k]
+            for name in names:
+                results[name] += weight*flat_params[name][flat]
+        if not extrapolate:
+            outside = np.zeros(size, dtype=bool)
+            for axis, q in zip(self.axes.values(), points):
+                outside |= (q < axis[0]) | (q > axis[-1])
+            for name in names:
+                results[name][outside] = fill_value
+        # points off the characterized value of a LUT constant
+        for name in names:
+            results[name][~valid] = np.nan
+        results = {name: values.reshape(shape) for name, values in results.items()}
+        return results[params] if isinstance(params, str) else results
+
+    def __call__(self, params, method: str = "linear", fill_value: float = np.nan, **coords):
+        return self.interp(params, method=method, fill_value=fill_value, **coords)
+
+    def gate_axis(self) -> str:
+        """_summary_
+        Returns the name of the gate voltage axis of the LUT (vgs for NMOS, vsg for PMOS)
+        """
+        for axis in ["vgs", "vsg"]:
+            if axis in self.axes:
+                return axis
+        raise ValueError(f"The LUT has no gate voltage axis (vgs or vsg). LUT axes are {list(self.axes.keys())}")
+
+    def inverse_index(self, param: str = "gmoverid", path: str = None):
+        """_summary_
+        Returns the inverse index of a parameter against the gate voltage,
+        built on first use and kept with the LUT
+        Args:
+            param   (str, optional) : parameter to invert. Defaults to "gmoverid".
+            path    (str, optional) : file persisting the index (see inverse_index_path).
+                                    A valid index is loaded from it, otherwise the index
+                                    is built and saved to it. Only used for LUTs read
+                                    from a file (see Lut.source). Defaults to None.
+        Returns:
+            InverseIndex: the inverse index
+        """
+        index = self._indices.get(param)
+        if index is not None:
+            return index
+        path = path if self.source is not None else None
+        if bool(path) and os.path.exists(path):
+            try:
+                index = InverseIndex.load(path, lut=self)
+            except ValueError as e:
+                logger.warning(f"Rebuilding the inverse index {path}: {e}")
+        if index is None:
+            index = InverseIndex.from_lut(self, param)
+            if bool(path):
+                try:
+                    index.save(path, source=self.source)
+                except IOError as e:
+                    logger.warning(f"{e}: {e.__cause__}")
+        self._indices[param] = index
+        return index
+
+def inverse_index_path(path: str, param: str = "gmoverid") -> str:
+    """_summary_
+    Path of the persisted inverse index of a LUT file, next to the LUT
+    (e.g. vsb-0_..._sweep-vgs-vds.gmoverid.index)
+    """
+    return f"{os.path.splitext(path)[0]}.{param}.index"
+
+class InverseIndex:
+    """_summary_
+    Inverse index of a LUT parameter (e.g. gm/id) against the gate voltage.
+    For each slice of the remaining axes (l, vsb, vds, ...) the parameter curve
+    is checked for monotonicity, and the monotonic branch ending at the highest
+    gate voltage is stored, so that a batch of targets is solved with a binary
+    search over the gate voltage samples instead of a scan of the whole curve.
+    The results are those of scanning for the crossing at the highest gate voltage:
+    targets outside of the monotonic branch fall back to the scan.
+    Args:
+        param       (str)       : name of the inverted parameter
+        gate        (str)       : name of the gate voltage axis
+        axes        (dict)      : ordered remaining axis name -> axis values
+        gate_values (np.ndarray): gate voltage axis values
+        curves      (np.ndarray): parameter curves, of shape (slices, gate voltage samples)
+        direction   (np.ndarray, optional): direction of each curve. Defaults to None (computed from the curves).
+        start       (np.ndarray, optional): first sample of the monotonic branch of each curve. Defaults to None (computed).
+        keys        (np.ndarray, optional): search keys of each curve. Defaults to None (computed).
+    """
+    __slots__ = ["param", "gate", "axes", "gate_values", "curves", "start", "direction", "keys"]
+    def __init__(self, param: str, gate: str, axes: dict, gate_values: np.ndarray, curves: np.ndarray,
+                 direction: np.ndarray = None, start: np.ndarray = None, keys: np.ndarray = None):
+        self.param = param
+        self.gate = gate
+        self.axes = {name: np.asarray(values, dtype=float) for name, values in axes.items()}
+        self.gate_values = np.asarray(gate_values, dtype=float)
+        self.curves = np.ascontiguousarray(curves, dtype=float)
+        if self.curves.shape != (int(np.prod([len(v) for v in self.axes.values()])), len(self.gate_values)):
+            raise ValueError(f"The {param} curves have shape {self.curves.shape}, which does not match the index axes")
+        if direction is not None and start is not None and keys is not None:
+            # derived arrays of a saved index
+            self.direction = np.asarray(direction, dtype=np.int8)
+            self.start = np.asarray(start, dtype=np.intp)
+            self.keys = np.asarray(keys, dtype=float)
+            return
+        diff = np.diff(self.curves, axis=1)
+        # direction of each curve at the highest gate voltage (+1 increasing, -1 decreasing)
+        nonzero = diff != 0
+        last = diff.shape[1] - 1 - np.argmax(nonzero[:, ::-1], axis=1)
+        self.direction = np.where(np.take_along_axis(diff, last[:, None], axis=1)[:, 0] > 0, 1, -1).astype(np.int8)
+        # first sample of the monotonic branch ending at the highest gate voltage
+        broken = ~(self.direction[:, None]*diff >= 0)
+        self.start = np.where(
+            broken.any(axis=1),
+            diff.shape[1] - np.argmax(broken[:, ::-1], axis=1),
+            0
+        ).astype(np.intp)
+        # search keys: each curve oriented to increase along its branch,
+        # with -inf before the branch, so that every row is sorted
+        self.keys = self.direction[:, None]*self.curves
+        self.keys[np.arange(diff.shape[1] + 1)[None, :] < self.start[:, None]] = -np.inf
+
+    @property
+    def monotonic(self) -> np.ndarray:
+        """_summary_
+        Returns:
+            np.ndarray: whether each slice curve is monotonic over the whole gate voltage axis
+        """
+        return (self.start == 0).reshape(tuple(len(v) for v in self.axes.values()))
+
+    @classmethod
+    def from_lut(cls, lut: Lut, param: str = "gmoverid"):
+        if param not in lut:
+            raise ValueError(f"{param} is not a parameter of the LUT. LUT parameters are {list(lut.params.keys())}")
+        gate = lut.gate_axis()
+        names = list(lut.axes.keys())
+        g = names.index(gate)
+        curves = np.moveaxis(lut[param], g, -1).reshape(-1, len(lut.axes[gate]))
+        index = cls(param, gate, {name: lut.axes[name] for name in names if name != gate}, lut.axes[gate], curves)
+        broken = int(np.count_nonzero(index.start > 0))
+        if broken > 0:
+            logger.debug(f"{param} is not monotonic in {gate} in {broken}/{len(index.start)} LUT slices, only the branch at the highest {gate} is indexed")
+        return index
+
+    def save(self, path: str, source: str = None) -> str:
+        """_summary_
+        Saves the index, with its derived arrays, as a directory holding
+        one .npy file per array and a JSON header, laid out like a compiled LUT.
+        The directory is first written to a temporary location and then moved into place.
+        Args:
+            path    (str)           : path of the directory to write
+            source  (str, optional) : LUT file the index was built from, identified
+                                    by its path, size and modification time. Defaults to None.
+        Raises:
+            IOError: the index could not be written
+        Returns:
+            str: path of the written directory
+        """
+        head, tail = os.path.split(os.path.abspath(path))
+        tmp = tempfile.mkdtemp(prefix=f".{tail}.", dir=head)
+        try:
+            for name in __inverse_index_arrays__:
+                np.save(os.path.join(tmp, f"{name}.npy"), getattr(self, name))
+            header = {
+                "version": __inverse_index_version__,
+                "source": _file_key(source, content_hash=False) if bool(source) else None,
+                "param": self.param,
+                "gate": self.gate,
+                "axes": {name: values.tolist() for name, values in self.axes.items()},
+                "gate_values": self.gate_values.tolist(),
+            }
+            with open(os.path.join(tmp, "header.json"), 'w') as file:
+                json.dump(header, file, indent=1)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            os.rename(tmp, path)
+        except Exception as e:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise IOError(f"Inverse index {path} could not be written") from e
+        return path
+
+    @classmethod
+    def load(cls, path: str, lut: Lut = None, mmap_mode: str = "r"):
+        """_summary_
+        Loads an index saved with save. The derived arrays are read as they were saved,
+        memory mapped by default, so loading does not depend on the size of the LUT
+        Args:
+            path        (str)           : path of the index directory
+            lut         (Lut, optional) : LUT the index must have been built from, checked against
+                                        the key of its source file (see Lut.source). Defaults to None.
+            mmap_mode   (str, optional) : numpy memory mapping mode ("r", "c") or None. Defaults to "r".
+        Raises:
+            ValueError: the index can not be read or does not match the LUT
+        Returns:
+            InverseIndex: the loaded index
+        """
+        try:
+            with open(os.path.join(path, "header.json"), 'r') as file:
+                header = json.load(file)
+        except (OSError, ValueError) as e:
+            raise ValueError(f"The inverse index {path} could not be read") from e
+        if header.get("version") != __inverse_index_version__:
+            raise ValueError(f"The inverse index {path} was saved in another format")
+        if lut is not None:
+            gate = lut.gate_axis()
+            same = (
+                header["source"] is not None and lut.source is not None and os.path.exists(lut.source) and
+                header["source"] == _file_key(lut.source, content_hash=False) and
+                header["param"] in lut and header["gate"] == gate and
+                list(header["axes"].keys()) == [name for name in lut.axes.keys() if name != gate]
+            )
+            if not same:
+                raise ValueError(f"The inverse index {path} was not built from the LUT {lut.source}")
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in __inverse_index_arrays__}
+        return cls(header["param"], header["gate"], header["axes"], header["gate_values"], **arrays)
+
+    def _corners(self, coords: list) -> tuple:
+        """_summary_
+        Multilinear stencil of the query points over the slices of the index
+        Returns:
+            tuple: slice indices and weights (points x corners), points outside of the axes
+        """
+        size = coords[0].size if len(coords) > 0 else 1
+        stencils = []
+        outside = np.zeros(size, dtype=bool)
+        for axis, q in zip(self.axes.values(), coords):
+            i = np.clip(np.searchsorted(axis, q, side="right") - 1, 0, len(axis) - 2)
+            t = np.clip((q - axis[i]) / (axis[i+1] - axis[i]), 0.0, 1.0)
+            outside |= (q < axis[0]) | (q > axis[-1])
+            stencils.append(((i, i+1), (1.0 - t, t)))
+        strides = np.cumprod(([len(v) for v in self.axes.values()] + [1])[:0:-1])[::-1]
+        slices = []
+        weights = []
+        for corner in itertools.product(*[range(2)]*len(stencils)):
+            flat = np.zeros(size, dtype=np.intp)
+            weight = np.ones(size)
+            for axis, k in enumerate(corner):
+                index, w = stencils[axis]
+                flat += index[k]*strides[axis]
+                weight *= w[k]
+            slices.append(flat)
+            weights.append(weight)
+        return np.stack(slices, axis=1), np.stack(weights, axis=1), outside
+
+    def query(self, target, scan=None, **coords) -> np.ndarray:
+        """_summary_
+        Solves param(gate voltage, **coords) = target for the gate voltage,
+        for a whole batch of targets
+        Args:
+            target  (float / np.ndarray): target values of the parameter
+            scan    (callable, optional): solver of the targets outside of the monotonic
+                                        branches, called as scan(target, **coords) with flat arrays.
+                                        Defaults to None (NaN is returned for those targets).
+            **coords                    : values of the remaining axes, broadcasted with target
+        Raises:
+            ValueError: missing or unknown axes
+        Returns:
+            np.ndarray: gate voltage of each target, NaN where the target is not reachable
+        """
+        unknown = [name for name in coords.keys() if name not in self.axes]
+        if len(unknown) > 0:
+            raise ValueError(f"{unknown} are not axes of the index. Index axes are {list(self.axes.keys())}")
+        missing = [name for name in self.axes.keys() if name not in coords]
+        if len(missing) > 0:
+            raise ValueError(f"Missing values for the LUT axes {missing}")
+        arrays = np.broadcast_arrays(np.asarray(target, dtype=float), *[np.asarray(coords[name], dtype=float) for name in self.axes.keys()])
+        shape = arrays[0].shape
+        target = arrays[0].ravel()
+        points = [values.ravel() for values in arrays[1:]]
+        slices, weights, outside = self._corners(points)
+        n = len(self.gate_values)
+        direction = self.direction[slices[:, 0]]
+        key = direction*target
+        same = np.all(self.direction[slices] == direction[:, None], axis=1)
+        low = self.start[slices].max(axis=1)
+        a = np.zeros(len(target), dtype=np.intp)
+        f0 = np.full(len(target), np.nan)
+        f1 = np.full(len(target), np.nan)
+        indexed = np.zeros(len(target), dtype=bool)
+        # points on a slice of the grid: binary search of the slice keys
+        exact = ~outside & (weights.max(axis=1) == 1.0)
+        corner = slices[np.arange(len(target)), weights.argmax(axis=1)]
+        for cell in np.unique(corner[exact]):
+            rows = np.flatnonzero(exact & (corner == cell))
+            keys = self.keys[cell]
+            # the keys of the slice follow its own direction, not the one of corner 0
+            cell_key = self.direction[cell]*target[rows]
+            found = (keys[self.start[cell]] <= cell_key) & (cell_key <= keys[-1]) & (self.start[cell] < n - 1)
+            rows = rows[found]
+            i = np.minimum(np.searchsorted(keys, cell_key[found], side="right") - 1, n - 2)
+            a[rows] = i
+            f0[rows] = self.curves[cell, i]
+            f1[rows] = self.curves[cell, i + 1]
+            indexed[rows] = True
+        # points between slices: the curve interpolated between the slices is
+        # monotonic on their common branch, the crossing is found by counting
+        # the branch samples before the target
+        between = np.flatnonzero(~outside & ~exact & same & (low < n - 1))
+        if len(between) > 0:
+            curves = np.einsum("bc,bcn->bn", weights[between], self.curves[slices[between]])
+            keys = direction[between, None]*curves
+            branch = np.arange(n)[None, :] >= low[between, None]
+            first = np.take_along_axis(keys, low[between, None], axis=1)[:, 0]
+            with np.errstate(invalid="ignore"):
+                found = (first <= key[between]) & (key[between] <= keys[:, -1])
+                i = np.minimum(low[between] + np.count_nonzero(branch & (keys <= key[between, None]), axis=1) - 1, n - 2)
+            i = np.maximum(i, 0)
+            a[between[found]] = i[found]
+            f0[between[found]] = np.take_along_axis(curves, i[:, None], axis=1)[found, 0]
+            f1[between[found]] = np.take_along_axis(curves, i[:, None] + 1, axis=1)[found, 0]
+            indexed[between[found]] = True
+        d0 = f0 - target
+        d1 = f1 - target
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = np.where(d0 != d1, d0/(d0 - d1), 0.0)
+        result = self.gate_values[a] + t*(self.gate_values[a + 1] - self.gate_values[a])
+        result[~indexed] = np.nan
+        fallback = ~indexed & ~outside
+        if scan is not None and fallback.any():
+            result[fallback] = scan(target[fallback], **{name: q[fallback] for name, q in zip(self.axes.keys(), points)})
+        return result.reshape(shape)
@@ -0,0 +1,260 @@
+""" ***********************************
+* *[author] Diogo André (git-hub : das-dias)
+* *[date] 2022-05-05
+* *[filename] montecarlo.py
+* *[summary] Monte-Carlo variability analysis of the sized devices:
+*               the control variables of the cells are perturbed and every
+*               sample is solved against the LUT in vectorized batches,
+*               sharded over a pool of worker processes
+* ***********************************
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from loguru import logger
+import numpy as np
+import pandas as pd
+
+from .data import(
+    DeviceTable,
+    TomlControlType,
+)
+from .sizing import(
+    solve_cells,
+    _resolve_lut,
+    _gate_axis,
+    _mirror,
+    __cell_outputs__,
+)
+from .profiling import(
+    profiled,
+)
+
+# control variables of a cell that can be perturbed
+__mc_vars__ = ["gmoverid", "id", "l", "vds", "vsd", "vsb", "vbs"]
+
+class Normal:
+    """_summary_
+    Normal perturbation of a control variable around its nominal value
+    Args:
+        sigma       (float)         : standard deviation
+        relative    (bool, optional): sigma is relative to the nominal value. Defaults to False.
+    """
+    __slots__=["sigma", "relative"]
+    def __init__(self, sigma: float, relative: bool=False):
+        self.sigma = sigma
+        self.relative = relative
+
+    def __call__(self, rng: np.random.Generator, nominal: np.ndarray) -> np.ndarray:
+        scale = self.sigma*np.abs(nominal) if self.relative else self.sigma
+        return nominal + scale*rng.standard_normal(nominal.shape)
+
+class Uniform:
+    """_summary_
+    Uniform perturbation of a control variable in [nominal - delta, nominal + delta]
+    Args:
+        delta       (float)         : half width of the interval
+        relative    (bool, optional): delta is relative to the nominal value. Defaults to False.
+    """
+    __slots__=["delta", "relative"]
+    def __init__(self, delta: float, relative: bool=False):
+        self.delta = delta
+        self.relative = relative
+
+    def __call__(self, rng: np.random.Generator, nominal: np.ndarray) -> np.ndarray:
+        scale = self.delta*np.abs(nominal) if self.relative else self.delta
+        return nominal + scale*rng.uniform(-1.0, 1.0, nominal.shape)
+
+class LogNormal:
+    """_summary_
+    Log-normal perturbation of a control variable, nominal*exp(sigma*N(0,1)),
+    for variables that must keep their sign (e.g. id)
+    Args:
+        sigma (float): standard deviation of the logarithm
+    """
+    __slots__=["sigma"]
+    def __init__(self, sigma: float):
+        self.sigma = sigma
+
+    def __call__(self, rng: np.random.Generator, nominal: np.ndarray) -> np.ndarray:
+        return nominal*np.exp(self.sigma*rng.standard_normal(nominal.shape))
+
+class MonteCarloResult:
+    """_summary_
+    Columnar result of a Monte-Carlo analysis: each variable is
+    an array of shape (devices, samples)
+    Args:
+        names   (list)  : names of the devices, in the order of the rows
+        columns (dict)  : variable name -> np.ndarray of shape (devices, samples)
+    """
+    __slots__=["names", "columns"]
+    def __init__(self, names: list, columns: dict):
+        self.names = list(names)
+        self.columns = columns
+
+    @property
+    def samples(self) -> int:
+        return next(iter(self.columns.values())).shape[1] if len(self.columns) > 0 else 0
+
+    def __getitem__(self, var: str) -> np.ndarray:
+        return self.columns[var]
+
+    def __contains__(self, var: str) -> bool:
+        return var in self.columns
+
+    def hist(self, var: str, device: str=None):
+        """_summary_
+        Data of a variable ready for plot_hist, without the failed samples
+        Args:
+            var     (str)           : variable name
+            device  (str, optional) : device name. Defaults to None (every device).
+        Returns:
+            np.ndarray / list: samples of the device, or a list with the samples of each device
+        """
+        values = self.columns[var]
+        if bool(device):
+            row = values[self.names.index(device)]
+            return row[np.isfinite(row)]
+        return [row[np.isfinite(row)] for row in values]
+
+    def to_frame(self) -> pd.DataFrame:
+        """_summary_
+        Long format table, one row per device and sample
+        """
+        data = {
+            "name": pd.Categorical(np.repeat(self.names, self.samples), categories=self.names),
+            "sample": np.tile(np.arange(self.samples), len(self.names)),
+        }
+        data.update({var: values.ravel() for var, values in self.columns.items()})
+        return pd.DataFrame(data, copy=False)
+
+def _cell_groups(devices, lut) -> list:
+    """_summary_
+    Groups the cells by MOS type, with their LUT and nominal control variables
+    Returns:
+        list: (rows, LUT, nominal variable name -> np.ndarray) of each group
+    """
+    cells = list(devices.devices.values())
+    groups = []
+    for mos_type in [t.value for t in TomlControlType]:
+        rows = [i for i, cell in enumerate(cells) if cell.type == mos_type]
+        if len(rows) == 0:
+            continue
+        group_lut = _resolve_lut(lut, "cell", mos_type)
+        gate = _gate_axis(group_lut)
+        vars = ["gmoverid", "id"] + [axis for axis in group_lut.axes.keys() if axis != gate]
+        nominal = {var: np.array([getattr(cells[i], var) for i in rows], dtype=float) for var in vars}
+        groups.append((np.array(rows), group_lut, nominal))
+    return groups
+
+# state of the worker processes, set once by _init_worker
+__mc_state__ = {}
+
+def _init_worker(groups: list, distributions: dict, outputs: list, ndevices: int) -> None:
+    __mc_state__.update(groups=groups, distributions=distributions, outputs=outputs, ndevices=ndevices)
+
+def _run_shard(seed: np.random.SeedSequence, size: int) -> dict:
+    """_summary_
+    Draws and solves one shard of samples of every cell
+    Returns:
+        dict: variable name -> np.ndarray of shape (devices, size)
+    """
+    rng = np.random.default_rng(seed)
+    ndevices = __mc_state__["ndevices"]
+    columns = {}
+    for rows, group_lut, nominal in __mc_state__["groups"]:
+        values = {}
+        for var, center in nominal.items():
+            values[var] = np.repeat(center[:, None], size, axis=1)
+            distribution = __mc_state__["distributions"].get(var)
+            if distribution is None and _mirror(var) in __mc_state__["distributions"]:
+                # e.g. a vds perturbation applied to the vsd of PMOS devices
+                distribution = __mc_state__["distributions"][_mirror(var)]
+                values[var] = -distribution(rng, -values[var])
+            elif distribution is not None:
+                values[var] = distribution(rng, values[var])
+        solved = solve_cells(group_lut, **values)
+        for var in list(solved.keys()):
+            mirror = _mirror(var)
+            if mirror is not None and mirror not in solved:
+                solved[mirror] = -solved[var]
+        solved.update(values)
+        for var in list(values.keys()) + [var for var in __mc_state__["outputs"] if var not in values]:
+            if var not in solved:
+                continue
+            if var not in columns:
+                columns[var] = np.full((ndevices, size), np.nan)
+            columns[var][rows] = np.broadcast_to(solved[var], (len(rows), size))
+    return columns
+
+@profiled
+def monte_carlo(
+    devices,
+    lut,
+    distributions: dict,
+    samples: int=1000,
+    outputs: list=None,
+    batch_size: int=65536,
+    workers: int=1,
+    seed: int=None
+    ) -> MonteCarloResult:
+    """_summary_
+    Monte-Carlo analysis of the cells of the devices: the control variables
+    are drawn from the given distributions and every sample is solved against
+    the LUT (see sizing.solve_cells). Samples are solved in batches of
+    batch_size samples per device, sharded over a pool of worker processes.
+    Each batch draws from its own random stream, spawned from the seed,
+    so the result does not depend on the number of workers
+    Args:
+        devices         (Devices / DeviceTable) : parsed devices, only the cells are analysed
+        lut             (Lut / dict)            : gridded LUT, or a dictionary of LUTs (see sizing.size)
+        distributions   (dict)                  : control variable (gmoverid, id, l, vds, vsb) -> distribution
+                                                (Normal, Uniform, LogNormal or any callable (rng, nominal) -> samples).
+                                                vds and vsb perturbations also apply to the vsd and vbs of PMOS devices
+        samples         (int, optional)         : number of samples per device. Defaults to 1000.
+        outputs         (list, optional)        : output variables to keep. Defaults to the gate voltage,
+                                                w, gm, gds, ft, self_gain, vdsat and cgg.
+        batch_size      (int, optional)         : number of samples per device of each batch. Defaults to 65536.
+        workers         (int, optional)         : number of worker processes, None for the number of CPUs.
+                                                Defaults to 1 (solved in the calling process).
+        seed            (int, optional)         : seed of the random streams. Defaults to None.
+    Raises:
+        ValueError: unknown control variable or no cells to analyse
+    Returns:
+        MonteCarloResult: columnar samples of the perturbed control variables and of the outputs
+    """
+    unknown = [var for var in distributions.keys() if var not in __mc_vars__]
+    if len(unknown) > 0:
+        raise ValueError(f"{unknown} can not be perturbed, use one of {__mc_vars__}")
+    if isinstance(devices, DeviceTable):
+        devices = devices.to_devices()
+    if len(devices.devices) == 0:
+        raise ValueError("There are no cells to analyse")
+    outputs = list(outputs) if outputs is not None else list(__cell_outputs__)
+    groups = _cell_groups(devices, lut)
+    known = set()
+    for _, _, nominal in groups:
+        known |= set(nominal.keys()) | set([_mirror(var) for var in nominal.keys()])
+    ignored = [var for var in distributions.keys() if var not in known]
+    if len(ignored) > 0:
+        logger.warning(f"{ignored} are not axes of the LUT, their perturbations are ignored")
+    sizes = [min(batch_size, samples - start) for start in range(0, samples, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    state = (groups, distributions, outputs, len(devices.devices))
+    workers = workers if workers is not None else os.cpu_count()
+    workers = max(1, min(workers, len(sizes)))
+    if workers == 1:
+        _init_worker(*state)
+        try:
+            shards = [_run_shard(s, size) for s, size in zip(seeds, sizes)]
+        finally:
+            __mc_state__.clear()
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=state) as executor:
+            shards = list(executor.map(_run_shard, seeds, sizes))
+    columns = {var: np.concatenate([shard[var] for shard in shards], axis=1) for var in shards[0].keys()}
+    result = MonteCarloResult(list(devices.devices.keys()), columns)
+    if "w" in columns:
+        failed = np.count_nonzero(~np.isfinite(columns["w"]))
+        if failed > 0:
+            logger.info(f"{failed}/{columns['w'].size} Monte-Carlo samples are out of the LUT range")
+    return result
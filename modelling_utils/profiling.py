@@ -0,0 +1,253 @@
+""" ***********************************
+* *[author] Diogo André (git-hub : das-dias)
+* *[date] 2022-05-05
+* *[filename] profiling.py
+* *[summary] Lightweight hierarchical profiler: nested spans, per function
+*               call counts, totals and percentiles, optional memory deltas
+*               and Chrome trace export. Recording is switched on with the
+*               MODELLING_UTILS_PROFILE environment variable ("1", or "memory"
+*               to also trace memory allocations) or with enable_profiling()
+* ***********************************
+"""
+import functools
+import json
+import os
+import random
+import threading
+import time
+import tracemalloc
+
+__profile_env__ = "MODELLING_UTILS_PROFILE"
+
+class _SpanStats:
+    """_summary_
+    Streaming aggregates of the records of a span path: count, total, min and max
+    durations, plus a uniform sample of at most reservoir_size durations
+    (reservoir sampling) for the percentiles, so the memory used stays bounded
+    """
+    __slots__=["count", "total_ns", "min_ns", "max_ns", "reservoir", "memory"]
+    def __init__(self):
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = None
+        self.reservoir = []
+        self.memory = 0
+
+    def add(self, duration_ns: int, memory: int, reservoir_size: int, rng: random.Random) -> None:
+        self.count += 1
+        self.total_ns += duration_ns
+        self.min_ns = duration_ns if self.min_ns is None else min(self.min_ns, duration_ns)
+        self.max_ns = duration_ns if self.max_ns is None else max(self.max_ns, duration_ns)
+        self.memory += memory
+        if len(self.reservoir) < reservoir_size:
+            self.reservoir.append(duration_ns)
+        else:
+            i = rng.randrange(self.count)
+            if i < reservoir_size:
+                self.reservoir[i] = duration_ns
+
+class Profiler:
+    """_summary_
+    Collects the timing (and optionally memory) records of nested spans.
+    Records are aggregated by span path (e.g. "read_specs/Devices.parse_data")
+    Args:
+        enabled     (bool, optional): start recording right away. Defaults to False.
+        memory      (bool, optional): record memory deltas with tracemalloc. Defaults to False.
+        max_events  (int, optional) : maximum number of Chrome trace events kept. Defaults to 10^6.
+        reservoir_size (int, optional): maximum number of durations kept per span path to estimate
+                                    the percentiles, which are exact up to that many calls. Defaults to 1024.
+    """
+    __slots__=["enabled", "memory", "max_events", "reservoir_size", "_stats", "_events", "_lock", "_local", "_origin_ns", "_random", "_started_tracing"]
+    def __init__(self, enabled: bool=False, memory: bool=False, max_events: int=1000000, reservoir_size: int=1024):
+        self.enabled = False
+        self.memory = False
+        self.max_events = max_events
+        self.reservoir_size = reservoir_size
+        self._random = random.Random()
+        # whether tracemalloc was started by this profiler (and must be stopped by it)
+        self._started_tracing = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+        if enabled:
+            self.enable(memory=memory)
+
+    def enable(self, memory: bool=False) -> None:
+        self.memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+        if self._started_tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._started_tracing = False
+        self.memory = False
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats = {}
+            self._events = []
+            self._origin_ns = time.perf_counter_ns()
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _record(self, path: str, name: str, start_ns: int, duration_ns: int, memory: int) -> None:
+        with self._lock:
+            stats = self._stats.get(path)
+            if stats is None:
+                stats = self._stats[path] = _SpanStats()
+            stats.add(duration_ns, memory, self.reservoir_size, self._random)
+            if len(self._events) < self.max_events:
+                self._events.append((name, start_ns - self._origin_ns, duration_ns, threading.get_ident()))
+
+    def summary(self):
+        """_summary_
+        Aggregated records, one row per span path, ordered as a call tree
+        Returns:
+            pandas DataFrame: path, calls, total / mean / min / p50 / p90 / p99 / max times [ms],
+                            share of the root span time and memory delta [bytes].
+                            The percentiles are estimated from a sample of reservoir_size calls.
+        """
+        import numpy as np
+        import pandas as pd
+        with self._lock:
+            items = [
+                (path, stats.count, stats.total_ns, stats.min_ns, stats.max_ns, np.asarray(stats.reservoir), stats.memory)
+                for path, stats in self._stats.items()
+            ]
+        roots_ns = sum([item[2] for item in items if "/" not in item[0]])
+        rows = []
+        for path, count, total, min_ns, max_ns, durations, memory in sorted(items, key=lambda item: item[0]):
+            p50, p90, p99 = np.percentile(durations, [50, 90, 99])*1e-6
+            rows.append({
+                "span": "  "*path.count("/") + path.split("/")[-1],
+                "path": path,
+                "calls": count,
+                "total[ms]": total*1e-6,
+                "mean[ms]": total*1e-6/count,
+                "min[ms]": min_ns*1e-6,
+                "p50[ms]": p50,
+                "p90[ms]": p90,
+                "p99[ms]": p99,
+                "max[ms]": max_ns*1e-6,
+                "share": total/roots_ns if roots_ns > 0 else np.nan,
+                "memory[B]": memory if self.memory else np.nan,
+            })
+        return pd.DataFrame(rows, columns=["span", "path", "calls", "total[ms]", "mean[ms]", "min[ms]", "p50[ms]", "p90[ms]", "p99[ms]", "max[ms]", "share", "memory[B]"])
+
+    def chrome_trace(self, path: str) -> str:
+        """_summary_
+        Writes the recorded spans in the Chrome trace event format,
+        to be opened in chrome://tracing or https://ui.perfetto.dev
+        Args:
+            path (str): path of the JSON file to write
+        Returns:
+            str: path of the written file
+        """
+        with self._lock:
+            events = list(self._events)
+        pid = os.getpid()
+        trace = {
+            "traceEvents": [
+                {"name": name, "ph": "X", "ts": start*1e-3, "dur": duration*1e-3, "pid": pid, "tid": tid}
+                for name, start, duration, tid in events
+            ],
+            "displayTimeUnit": "ms",
+        }
+        with open(path, 'w') as file:
+            json.dump(trace, file)
+        return path
+
+class _Span:
+    __slots__=["profiler", "name", "path", "start_ns", "memory"]
+    def __init__(self, profiler: Profiler, name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        stack = self.profiler._stack()
+        self.path = stack[-1] + "/" + self.name if len(stack) > 0 else self.name
+        stack.append(self.path)
+        self.memory = tracemalloc.get_traced_memory()[0] if self.profiler.memory else 0
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        duration = time.perf_counter_ns() - self.start_ns
+        memory = tracemalloc.get_traced_memory()[0] - self.memory if self.profiler.memory else 0
+        self.profiler._stack().pop()
+        self.profiler._record(self.path, self.name, self.start_ns, duration, memory)
+        return False
+
+class _NoSpan:
+    __slots__=[]
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+
+__no_span__ = _NoSpan()
+
+def _profiler_from_env() -> Profiler:
+    setting = os.environ.get(__profile_env__, "").strip().lower()
+    enabled = setting not in ["", "0", "false", "off", "no"]
+    return Profiler(enabled=enabled, memory=setting == "memory")
+
+# process wide profiler
+__profiler__ = _profiler_from_env()
+
+def span(name: str):
+    """_summary_
+    Context manager timing the enclosed block as a (possibly nested) span.
+    Does nothing when profiling is disabled
+    """
+    return _Span(__profiler__, name) if __profiler__.enabled else __no_span__
+
+def profiled(func=None, name: str=None):
+    """_summary_
+    Decorator recording every call of the function as a span,
+    usable as @profiled or @profiled(name="..."). When profiling is
+    disabled the only overhead is checking a flag
+    """
+    if isinstance(func, str):
+        # @profiled("name")
+        func, name = None, func
+    def decorator(func):
+        label = name if bool(name) else func.__qualname__
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not __profiler__.enabled:
+                return func(*args, **kwargs)
+            with _Span(__profiler__, label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator(func) if callable(func) else decorator
+
+def enable_profiling(memory: bool=False) -> None:
+    __profiler__.enable(memory=memory)
+
+def disable_profiling() -> None:
+    __profiler__.disable()
+
+def reset_profiling() -> None:
+    __profiler__.reset()
+
+def profiling_summary():
+    """_summary_
+    Aggregated records of the process wide profiler (see Profiler.summary)
+    """
+    return __profiler__.summary()
+
+def export_chrome_trace(path: str) -> str:
+    """_summary_
+    Writes the spans of the process wide profiler as a Chrome trace (see Profiler.chrome_trace)
+    """
+    return __profiler__.chrome_trace(path)
@@ -2,54 +2,218 @@ from collections import defaultdict
 from itertools import cycle
 from loguru import logger
 import os
+import shutil
+import hashlib
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import toml
 import json
+try:
+    # python >= 3.11
+    import tomllib as _tomllib
+except ImportError:
+    try:
+        import tomli as _tomllib
+    except ImportError:
+        _tomllib = None
+try:
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
 import csv
+import numpy as np
 import pandas as pd
 from copy import copy
 
 from .utils import(
     Scale,
-    stof
+    stof,
+    __scale_factors__,
 )
 from .data import(
     Devices,
 )
+from .profiling import(
+    profiled,
+    span,
+)
+
+def _load_toml(path: str) -> dict:
+    if _tomllib is not None:
+        with open(path, 'rb') as file:
+            return _tomllib.load(file)
+    with open(path, 'r') as file:
+        return toml.load(file)
+
+def _load_json(path: str) -> dict:
+    if _orjson is not None:
+        with open(path, 'rb') as file:
+            return _orjson.loads(file.read())
+    with open(path, 'r') as file:
+        return json.load(file)
 
-def read_specs(path:str) -> Devices:
+# specification file extension -> parser, using the fastest
+# available backend (tomllib / tomli and orjson, or toml and json)
+__spec_loaders__ = {
+    ".toml": _load_toml,
+    ".json": _load_json,
+}
+
+def _load_specs(path: str) -> dict:
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"File {path} not found")
+    head,tail = os.path.split(path)
+    name, extension = os.path.splitext(tail)
+    if extension not in __spec_loaders__:
+        raise ValueError(f"File {path} is not a valid specification file. Only .toml and .json are accepted")
+    try:
+        return __spec_loaders__[extension](path)
+    except (OSError, ValueError, TypeError, toml.TomlDecodeError) as err:
+        # tomllib, tomli and orjson decoding errors are ValueErrors
+        raise IOError(f"File {path} could not be read: {err}") from err
+
+@profiled
+def read_specs(path:str, previous: Devices=None) -> Devices:
     """_summary_
-    Reads the contents of YAML and JSON files and returns a dictionary
-    containing the labelled information from within the files
+    Reads the contents of TOML and JSON files and returns the
+    devices described in the files. TOML files are parsed with tomllib
+    (tomli) and JSON files with orjson when available.
+    When the devices of a previous read are given, only the devices whose
+    [control] entries changed are rebuilt (see Devices.parse_data and SpecWatcher)
     Args:
-        path (str): path to read the file from
+        path        (str)               : path to read the file from
+        previous    (Devices, optional) : devices of a previous read of the file. Defaults to None.
 
     Raises:
-        FileNotFoundError: _description_
-        ValueError: _description_
-        IOError: _description_
+        FileNotFoundError: the file does not exist
+        ValueError: the file is not a .toml or .json file, or its contents are invalid
+        IOError: the file could not be read or decoded
 
     Returns:
-        dict: data structure containing the extracted information from the YAML / JSON file
+        Devices: the parsed devices, None if the file is empty
+    """
+    struct = _load_specs(path)
+    devices = Devices()
+    devices.parse_data(struct, previous=previous)
+    return devices if bool(struct) else None
+
+def _try_read_specs(path: str) -> tuple:
+    try:
+        return read_specs(path), None
+    except Exception as err:
+        return None, err
+
+def _merge_devices(parsed: list) -> Devices:
+    merged = Devices()
+    for devices in parsed:
+        if devices is None:
+            continue
+        merged.add_many(devices.devices.values(), dev_type="cell")
+        merged.add_many(devices.varactors.values(), dev_type="varactor")
+        merged.add_many(devices.switches.values(), dev_type="switch")
+        for var, names in devices.spits.items():
+            merged.spits[var].extend(names)
+        merged.plot = merged.plot or devices.plot
+        if merged.output_dir is None:
+            merged.output_dir = devices.output_dir
+    return merged
+
+@profiled
+def read_specs_many(paths: list, workers: int=None, merge: bool=True, errors: str="raise"):
+    """_summary_
+    Reads a batch of specification files, in parallel over a pool of worker processes
+    Args:
+        paths   (list)          : paths of the TOML / JSON files
+        workers (int, optional) : number of worker processes. Defaults to the number of CPUs,
+                                1 reads the files in the calling process.
+        merge   (bool, optional): merge the devices of every file into a single Devices object.
+                                Defaults to True, otherwise one Devices object per file is returned.
+        errors  (str, optional) : "raise" to raise an error listing every file that could not be read,
+                                "skip" to log them and ignore them (None in the returned list). Defaults to "raise".
+    Raises:
+        ValueError: unknown errors mode
+        IOError: some files could not be read (errors="raise")
+        KeyError: the same device name is used in several files (merge=True)
+    Returns:
+        Devices / list: the merged devices, or the devices of each file in the order of the paths
+    """
+    if errors not in ["raise", "skip"]:
+        raise ValueError(f"Unknown errors mode: {errors}, use \"raise\" or \"skip\"")
+    paths = list(paths)
+    workers = workers if bool(workers) else os.cpu_count()
+    workers = max(1, min(workers, len(paths)))
+    start = time.perf_counter_ns()
+    if workers == 1:
+        results = [_try_read_specs(path) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # files are small, send them in chunks to amortize the inter-process overhead
+            results = list(executor.map(_try_read_specs, paths, chunksize=max(1, len(paths)//(4*workers))))
+    parsed = [devices for devices, _ in results]
+    failed = [(path, err) for path, (_, err) in zip(paths, results) if err is not None]
+    if len(failed) > 0:
+        report = "\n".join([f"  {path}: {type(err).__name__}: {err}" for path, err in failed])
+        if errors == "raise":
+            raise IOError(f"{len(failed)}/{len(paths)} specification files could not be read:\n{report}") from failed[0][1]
+        logger.warning(f"{len(failed)}/{len(paths)} specification files could not be read and were skipped:\n{report}")
+    logger.info(f"Read {len(paths) - len(failed)} specification files in {(time.perf_counter_ns() - start)*1e-9:.3f} s with {workers} worker(s)")
+    return _merge_devices(parsed) if merge else parsed
+
+class SpecWatcher:
+    """_summary_
+    Incremental reader of a specification file edited between reads.
+    The file is only parsed again when its modification time or size
+    changed, and only the devices whose [control] entries changed are
+    rebuilt: the other ones are the same objects as before, with their
+    computed outputs (w, gm, ft, ...)
+    Args:
+        path (str): path of the TOML / JSON specification file
     """
+    __slots__=["path", "devices", "_stat"]
+    def __init__(self, path: str):
+        self.path = path
+        self.devices = None
+        self._stat = None
+
+    def _file_stat(self) -> tuple:
+        stat = os.stat(self.path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def changed(self) -> bool:
+        return self.devices is None or self._file_stat() != self._stat
+
+    def reload(self, force: bool=False) -> list:
+        """_summary_
+        Reads the file again if it changed since the last read
+        Args:
+            force (bool, optional): parse the file even if it did not change. Defaults to False.
+        Returns:
+            list: names of the rebuilt (changed or new) devices, empty if nothing changed.
+                The removed devices are listed in devices.removed
+        """
+        if not force and not self.changed():
+            return []
+        stat = self._file_stat()
+        devices = read_specs(self.path, previous=self.devices)
+        self.devices, self._stat = devices, stat
+        if devices is None:
+            return []
+        if len(devices.dirty) > 0 or len(devices.removed) > 0:
+            logger.info(f"{self.path}: {len(devices.dirty)} device(s) changed, {len(devices.removed)} removed")
+        return list(devices.dirty)
+
+def _check_csv_path(path: str) -> None:
     if not os.path.exists(path):
         raise FileNotFoundError(f"File {path} not found")
     head,tail = os.path.split(path)
     name, extension = os.path.splitext(tail)
-    if extension not in [ ".toml", ".json"]:
-        raise ValueError(f"File {path} is not a valid specification file. Only .toml and .json are accepted")
-    struct = {}
-    try:
-        with open(path, 'r') as file:
-            if extension == ".toml":
-                struct = toml.load(file)
-            elif extension == ".json":
-                struct = json.load(file)
-    except:
-        raise IOError(f"File {path} could not be read")
-    devices = Devices()
-    devices.parse_data(struct)
-    return devices if bool(struct) else None
+    if extension !=  ".csv":
+        raise ValueError(f"File {path} is not a valid specification file. Only .csv files are accepted")
 
+@profiled
 def read_data(path: str) -> pd.DataFrame:
     """_summary_
     Reads a CSV data file and returns a pandas dataframe
@@ -64,12 +228,7 @@ def read_data(path: str) -> pd.DataFrame:
     Returns:
         pandas DataFrame: dataframe containing the extracted information from the CSV file
     """
-    if not os.path.exists(path):
-        raise FileNotFoundError(f"File {path} not found")
-    head,tail = os.path.split(path)
-    name, extension = os.path.splitext(tail)
-    if extension !=  ".csv":
-        raise ValueError(f"File {path} is not a valid specification file. Only .csv files are accepted")
+    _check_csv_path(path)
     df = None
     try:
         with open(path, 'r') as file:
@@ -78,27 +237,19 @@ def read_data(path: str) -> pd.DataFrame:
         raise IOError(f"File {path} could not be read")
     return df
 
-def read_lut(path: str) -> pd.DataFrame:
+def _parse_lut_name(name: str) -> dict:
     """_summary_
-    Reads a Cadence Look Up Table exported to CSV
-    and unfolds it to return a Pandas DataFrame that only
-    includes raw axis
+    Decodes the constant variables encoded in a LUT file name,
+    e.g. "vsb-0_w-2-3-u_l-30-n_sweep-vgs-vds" -> {"vsb": 0.0, "w": 2.3e-6, "l": 3e-8}
     Args:
-        path (str): path to read the file from
+        name (str): file name of the LUT, without extension
 
     Raises:
-        FileNotFoundError: _description_
-        ValueError: _description_
-        IOError: _description_
+        ValueError: wrong naming format or unrecognized scaling token
 
     Returns:
-        pandas DataFrame: dataframe containing the extracted information from the CSV file
+        dict: detected variable names and their values
     """
-    lut = read_data(path)
-    original_lut_size = len(lut)
-    # detect variables present in lut name
-    head,tail = os.path.split(path)
-    name, extension = os.path.splitext(tail)
     attrs = name.split('_')
     detected_vars={}
     for attr in attrs:
@@ -123,47 +274,660 @@ def read_lut(path: str) -> pd.DataFrame:
             raise ValueError(f"Wrong LUT naming format: {name}.")
         scaling_factor = 1.0
         if scale != None:
-            scaling_letters = [s.value[0] for s in Scale]
-            if scale not in scaling_letters:
+            if scale not in __scale_factors__:
                 raise ValueError(f"Unrecognized unit scaling token: {scale}")
-            scaling_factor = [s.value[1] for s in Scale if s.value[0] == scale][0]
+            scaling_factor = __scale_factors__[scale]
         var = var*scaling_factor
         # add the var and var_name to the detected_vars dict
         detected_vars[var_name] = var
-# detect the variable sweeps present in the name of each column
-    data=defaultdict(list)
-    sweep_axis_value_space = defaultdict(list)
-    for column in lut.columns[1:]:
+    return detected_vars
+
+def _parse_lut_headers(columns) -> tuple:
+    """_summary_
+    Parses all the Cadence column headers of a LUT in a single pass.
+    A header has the format "<instance>:<param> [<sweep var> <sweep value>] [(<unit>)]"
+    Args:
+        columns (Iterable[str]): data column headers (the x-axis column excluded)
+
+    Returns:
+        tuple: (params, sweeps) where params maps each parameter name to the
+            list of its column positions (in order of appearance), and sweeps
+            maps each sweep variable name to its unique values (in order of appearance)
+    """
+    params = defaultdict(list)
+    sweeps = defaultdict(dict)
+    for i, column in enumerate(columns):
         tokens = column.split(' ')
-        var_name = tokens[0].split(':')[1]
-        [data[var_name].append(val) for val in lut[column].values]
+        params[tokens[0].split(':')[1]].append(i)
         if len(tokens)>2:
-            var_name = tokens[1]
-            var_value = float(tokens[2])
-            if bool(sweep_axis_value_space.get(var_name)):
-                if var_value not in sweep_axis_value_space.get(var_name):
-                    sweep_axis_value_space[var_name].append(var_value)
-            else:
-                sweep_axis_value_space[var_name].append(var_value)
-    max_col_len = 0
-    # get the maximum true length of the entire expanded lut table
-    for col in data.keys():
-        if len(data[col]) > max_col_len:
-            max_col_len = len(data[col])
+            # dict keys keep the order of appearance and discard repeated values
+            sweeps[tokens[1]][float(tokens[2])] = None
+    return params, {var_name: list(values) for var_name, values in sweeps.items()}
+
+def _unfold_lut(lut: pd.DataFrame, detected_vars: dict) -> pd.DataFrame:
+    """_summary_
+    Unfolds a Cadence LUT data frame (one column per parameter and sweep value)
+    into a long format data frame with one column per parameter and axis
+    Args:
+        lut (pd.DataFrame): LUT as read from the CSV file
+        detected_vars (dict): constant variables decoded from the LUT file name
+
+    Returns:
+        pd.DataFrame: unfolded LUT
+    """
+    return pd.DataFrame(_unfold_lut_arrays(lut, detected_vars))
+
+def _unfold_lut_arrays(lut: pd.DataFrame, detected_vars: dict) -> dict:
+    """_summary_
+    Same as _unfold_lut, returning the unfolded columns as a dictionary of arrays
+    """
+    original_lut_size = len(lut)
+    params, sweeps = _parse_lut_headers(lut.columns[1:])
+    dtypes = lut.dtypes.to_numpy()[1:]
+    # a single (rows x columns) block, transposed so that each column is contiguous
+    block = lut.to_numpy().T[1:]
+    data = {}
+    # stack the columns of each parameter one after the other
+    for var_name, positions in params.items():
+        dtype = np.result_type(*dtypes[positions])
+        data[var_name] = block[positions].astype(dtype, copy=False).ravel()
+    max_col_len = max([len(col) for col in data.values()], default=0)
     # adjoint the constant axis
-    for var_name in detected_vars.keys():
-        data[var_name] = [detected_vars[var_name]]*max_col_len
+    for var_name, var in detected_vars.items():
+        data[var_name] = np.full(max_col_len, var)
     # adjoint the secondary sweeping variable - vds or vsd
     # and expand the short axis (x-axis) until it reaches the required length
     # adjoining the primary sweeping axis onto the data frame
     x_axis = lut.columns[0].split(' ')[0]
-    x_axis = x_axis.replace(' ','')
-    if len(sweep_axis_value_space)>0:
-        for var_name in sweep_axis_value_space.keys():
-            for var_value in sweep_axis_value_space[var_name]:
-                [data[var_name].append(val) for val in [var_value]*original_lut_size]
-                [data[x_axis].append(val) for val in lut[lut.columns[0]].values]
+    x_values = lut[lut.columns[0]].to_numpy()
+    if len(sweeps)>0:
+        for var_name, var_values in sweeps.items():
+            data[var_name] = np.repeat(np.asarray(var_values, dtype=float), original_lut_size)
+        data[x_axis] = np.tile(x_values, sum([len(v) for v in sweeps.values()]))
     else:
         # simply append the x_axis to the data frame
-        [data[x_axis].append(val) for val in lut[lut.columns[0]].values]
-    return pd.DataFrame(data)
\ No newline at end of file
+        data[x_axis] = x_values.copy()
+    return data
+
+# axes of the LUT sweeps, kept at full precision by _compact_lut
+__lut_axes__ = ["l", "vsb", "vbs", "vds", "vsd", "vgs", "vsg", "w"]
+
+def _compact_lut(df: pd.DataFrame, constants: dict) -> pd.DataFrame:
+    """_summary_
+    Compact representation of an unfolded LUT: float32 parameters, an integer region
+    and the constant variables decoded from the file name as categoricals,
+    which are also kept in df.attrs["constants"]. Axis values are kept exactly
+    Args:
+        df          (pd.DataFrame)  : unfolded LUT
+        constants   (dict)          : variables decoded from the LUT file name
+    Returns:
+        pd.DataFrame: the compact LUT
+    """
+    data = {}
+    for name in df.columns:
+        values = df[name]
+        if name in constants:
+            data[name] = pd.Categorical(values.to_numpy(dtype=float))
+        elif name in __lut_axes__:
+            data[name] = values.to_numpy(dtype=float)
+        elif name == "region":
+            region = values.to_numpy(dtype=float)
+            integral = np.isfinite(region).all() and np.array_equal(region, np.round(region)) and np.abs(region).max(initial=0) <= np.iinfo(np.int8).max
+            data[name] = region.astype(np.int8) if integral else region.astype(np.float32)
+        else:
+            data[name] = values.to_numpy(dtype=np.float32)
+    compact = pd.DataFrame(data, copy=False)
+    compact.attrs["constants"] = {name: float(value) for name, value in constants.items() if name in df.columns}
+    return compact
+
+# version of the compiled LUT format
+__compiled_lut_version__ = 1
+__compiled_lut_extension__ = ".lut"
+
+def _file_hash(path: str, chunk_size: int=1 << 20) -> str:
+    """_summary_
+    Computes the SHA-256 digest of the contents of a file
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _file_key(path: str, content_hash: bool=True) -> dict:
+    """_summary_
+    Identifies the state of a source file by its path, size, modification time and contents
+    """
+    stat = os.stat(path)
+    key = {
+        "path": os.path.abspath(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+    if content_hash:
+        key["sha256"] = _file_hash(path)
+    return key
+
+def compiled_lut_path(path: str) -> str:
+    """_summary_
+    Default location of the compiled (binary) version of a CSV LUT,
+    next to the CSV file: <name>.csv -> <name>.lut
+    """
+    head, tail = os.path.split(path)
+    name, extension = os.path.splitext(tail)
+    return os.path.join(head, name + __compiled_lut_extension__)
+
+def _read_compiled_header(compiled: str) -> dict:
+    try:
+        with open(os.path.join(compiled, "header.json"), 'r') as file:
+            header = json.load(file)
+    except (OSError, ValueError):
+        return None
+    return header if header.get("version") == __compiled_lut_version__ else None
+
+def is_compiled_lut_valid(path: str, compiled: str=None) -> bool:
+    """_summary_
+    Checks if the compiled LUT is up to date with its CSV source: it must have been
+    built from the same file (same path, size and modification time). When the CSV
+    was modified after being compiled, the content hash decides, and the modification
+    time of an unchanged CSV is then updated in the compiled LUT header.
+    Args:
+        path        (str)           : path of the CSV LUT
+        compiled    (str, optional) : path of the compiled LUT. Defaults to compiled_lut_path(path).
+    Returns:
+        bool: True if the compiled LUT can be used in place of the CSV
+    """
+    compiled = compiled if bool(compiled) else compiled_lut_path(path)
+    if not os.path.isdir(compiled) or not os.path.exists(path):
+        return False
+    header = _read_compiled_header(compiled)
+    if header is None:
+        return False
+    source = header["source"]
+    key = _file_key(path, content_hash=False)
+    if key["path"] != source["path"] or key["size"] != source["size"]:
+        return False
+    if key["mtime_ns"] == source["mtime_ns"]:
+        return True
+    # the CSV was touched (or rewritten) after being compiled
+    if _file_hash(path) != source["sha256"]:
+        return False
+    # same contents: record the new modification time, so that
+    # the next checks do not hash the CSV again
+    source["mtime_ns"] = key["mtime_ns"]
+    target = os.path.join(compiled, "header.json")
+    tmp = None
+    try:
+        fd, tmp = tempfile.mkstemp(prefix=".header.", dir=compiled)
+        with os.fdopen(fd, 'w') as file:
+            json.dump(header, file, indent=1)
+        os.chmod(tmp, os.stat(target).st_mode & 0o777)
+        os.replace(tmp, target)
+    except OSError as e:
+        if tmp is not None and os.path.exists(tmp):
+            os.remove(tmp)
+        logger.debug(f"Could not update the header of the compiled LUT {compiled}: {e}")
+    return True
+
+def _write_compiled_lut(compiled: str, source: dict, write_columns) -> str:
+    """_summary_
+    Writes a compiled LUT directory, holding one .npy file per unfolded column
+    and a JSON header. The directory is first written to a temporary location
+    and then moved into place. If another writer installs a valid compiled LUT
+    of the same source first, its compiled LUT is kept.
+    Args:
+        compiled        (str)       : path of the compiled LUT
+        source          (dict)      : key of the CSV source file (see _file_key)
+        write_columns   (callable)  : writes the .npy files into the given directory
+                                    and returns the list of {"name", "file"} columns and the number of rows
+    """
+    head, tail = os.path.split(os.path.abspath(compiled))
+    tmp = tempfile.mkdtemp(prefix=f".{tail}.", dir=head)
+    stale = tmp + ".stale"
+    try:
+        columns, rows = write_columns(tmp)
+        header = {
+            "version": __compiled_lut_version__,
+            "source": source,
+            "rows": rows,
+            "columns": columns,
+        }
+        with open(os.path.join(tmp, "header.json"), 'w') as file:
+            json.dump(header, file, indent=1)
+        # move the previous compiled LUT out of the way, then rename
+        # the new one into place: readers never see a partial directory
+        try:
+            os.rename(compiled, stale)
+        except FileNotFoundError:
+            pass
+        try:
+            os.rename(tmp, compiled)
+        except OSError:
+            # another writer installed its compiled LUT in between
+            if not is_compiled_lut_valid(source["path"], compiled):
+                raise
+            shutil.rmtree(tmp, ignore_errors=True)
+    except Exception as e:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise IOError(f"Compiled LUT {compiled} could not be written") from e
+    finally:
+        shutil.rmtree(stale, ignore_errors=True)
+    return compiled
+
+def _frame_writer(df: pd.DataFrame):
+    """_summary_
+    Compiled LUT column writer of an unfolded LUT already in memory
+    """
+    def write_columns(folder: str) -> tuple:
+        columns = []
+        for i, column in enumerate(df.columns):
+            filename = f"{i}.npy"
+            np.save(os.path.join(folder, filename), np.ascontiguousarray(df[column].to_numpy()))
+            columns.append({"name": column, "file": filename})
+        return columns, len(df)
+    return write_columns
+
+def _stream_writer(path: str, chunksize: int):
+    """_summary_
+    Compiled LUT column writer that unfolds the CSV LUT block by block
+    straight into memory mapped .npy files, so that the whole LUT never
+    has to fit in memory. The columns are laid out as in read_lut,
+    with every column stored as float64.
+    """
+    def write_columns(folder: str) -> tuple:
+        header = pd.read_csv(path, nrows=0).columns
+        params, sweeps = _parse_lut_headers(header[1:])
+        x_values = pd.read_csv(path, usecols=[0]).iloc[:, 0].to_numpy()
+        n_rows = len(x_values)
+        n_sweeps = max(sum([len(v) for v in sweeps.values()]), 1)
+        lengths = {var_name: len(positions)*n_rows for var_name, positions in params.items()}
+        max_col_len = max(lengths.values(), default=0)
+        head,tail = os.path.split(path)
+        name, extension = os.path.splitext(tail)
+        for var_name in _parse_lut_name(name).keys():
+            lengths[var_name] = max_col_len
+        for var_name, var_values in sweeps.items():
+            lengths[var_name] = len(var_values)*n_rows
+        x_axis = header[0].split(' ')[0]
+        lengths[x_axis] = n_sweeps*n_rows
+        columns = []
+        maps = {}
+        for i, (var_name, length) in enumerate(lengths.items()):
+            filename = f"{i}.npy"
+            dtype = x_values.dtype if var_name == x_axis else np.float64
+            maps[var_name] = np.lib.format.open_memmap(os.path.join(folder, filename), mode="w+", dtype=dtype, shape=(length,))
+            columns.append({"name": var_name, "file": filename})
+        for var_name, var in _parse_lut_name(name).items():
+            maps[var_name][:] = var
+        for var_name, var_values in sweeps.items():
+            maps[var_name].reshape(len(var_values), n_rows)[:] = np.asarray(var_values, dtype=float)[:, None]
+        maps[x_axis].reshape(n_sweeps, n_rows)[:] = x_values
+        # (sweep value x row) layout of each parameter, filled one block of rows at a time
+        start = 0
+        for block in pd.read_csv(path, chunksize=chunksize):
+            values = block.to_numpy(dtype=float)[:, 1:]
+            stop = start + len(block)
+            for var_name, positions in params.items():
+                maps[var_name].reshape(len(positions), n_rows)[:, start:stop] = values[:, positions].T
+            start = stop
+        for mm in maps.values():
+            mm.flush()
+        del maps
+        return columns, n_sweeps*n_rows
+    return write_columns
+
+@profiled
+def compile_lut(path: str, output: str=None, chunksize: int=None) -> str:
+    """_summary_
+    Converts a Cadence LUT exported to CSV into a compiled (binary) LUT,
+    that can be memory mapped by load_lut instead of parsing the CSV again
+    Args:
+        path        (str)           : path of the CSV LUT
+        output      (str, optional) : path of the compiled LUT. Defaults to compiled_lut_path(path).
+        chunksize   (int, optional) : if given, the CSV is streamed into the compiled LUT
+                                    in blocks of chunksize rows instead of being read at once
+                                    (all the columns are then stored as float64). Defaults to None.
+    Returns:
+        str: path of the compiled LUT
+    """
+    output = output if bool(output) else compiled_lut_path(path)
+    source = _file_key(path)
+    if bool(chunksize):
+        _check_csv_path(path)
+        return _write_compiled_lut(output, source, _stream_writer(path, chunksize))
+    df = read_lut(path, compiled=False)
+    return _write_compiled_lut(output, source, _frame_writer(df))
+
+@profiled
+def load_lut(compiled: str, mmap_mode: str="r") -> pd.DataFrame:
+    """_summary_
+    Loads a compiled LUT, memory mapping its columns so that
+    the processes reading the same LUT share the same pages in memory
+    Args:
+        compiled    (str)           : path of the compiled LUT
+        mmap_mode   (str, optional) : numpy memory mapping mode ("r", "c", "r+") or None
+                                    to read the columns into memory. Defaults to "r".
+    Raises:
+        FileNotFoundError: _description_
+        IOError: _description_
+    Returns:
+        pandas DataFrame: the unfolded LUT
+    """
+    if not os.path.isdir(compiled):
+        raise FileNotFoundError(f"Compiled LUT {compiled} not found")
+    header = _read_compiled_header(compiled)
+    if header is None:
+        raise IOError(f"Compiled LUT {compiled} could not be read")
+    data = {}
+    for column in header["columns"]:
+        data[column["name"]] = np.load(os.path.join(compiled, column["file"]), mmap_mode=mmap_mode)
+    return pd.DataFrame(data, copy=False)
+
+@profiled
+def read_lut(path: str, compiled: bool=True, compact: bool=False, cache: bool=False) -> pd.DataFrame:
+    """_summary_
+    Reads a Cadence Look Up Table exported to CSV
+    and unfolds it to return a Pandas DataFrame that only
+    includes raw axis
+    Args:
+        path        (str)           : path to read the file from
+        compiled    (bool, optional): use the compiled version of the LUT (see compile_lut)
+                                    when it is up to date with the CSV. Defaults to True.
+        compact     (bool, optional): return float32 parameters, an int8 region and the
+                                    constant variables of the file name (e.g. vsb, w, l) as
+                                    categoricals, also listed in df.attrs["constants"].
+                                    Axis values are not altered. Defaults to False.
+        cache       (bool, optional): go through the process wide LUT cache (see LutCache).
+                                    Defaults to False.
+
+    Raises:
+        FileNotFoundError: _description_
+        ValueError: _description_
+        IOError: _description_
+
+    Returns:
+        pandas DataFrame: dataframe containing the extracted information from the CSV file
+    """
+    if cache:
+        return __lut_cache__.get(path, compiled=compiled, compact=compact)
+    # detect variables present in lut name
+    head,tail = os.path.split(path)
+    name, extension = os.path.splitext(tail)
+    detected_vars = _parse_lut_name(name)
+    if compiled and is_compiled_lut_valid(path):
+        # copy-on-write mapping: pages are shared with other processes until written to
+        df = load_lut(compiled_lut_path(path), mmap_mode="c")
+    else:
+        lut = read_data(path)
+        with span("unfold"):
+            df = _unfold_lut(lut, detected_vars)
+    return _compact_lut(df, detected_vars) if compact else df
+
+def _copy_on_write() -> bool:
+    """_summary_
+    Whether pandas copy-on-write is active (always from pandas 3, opt-in on pandas 2),
+    i.e. whether a shallow copy of a data frame is isolated from the original
+    """
+    if int(pd.__version__.split(".")[0]) >= 3:
+        return True
+    try:
+        return pd.get_option("mode.copy_on_write") is True
+    except (KeyError, pd.errors.OptionError):
+        return False
+
+def _cache_copy(df: pd.DataFrame) -> pd.DataFrame:
+    # without copy-on-write, in place writes on a shallow copy (out.loc[...] = ...)
+    # would write through to the cached blocks
+    return df.copy(deep=not _copy_on_write())
+
+class LutCache:
+    """_summary_
+    Thread safe cache of LUTs read with read_lut, keyed on the resolved path and
+    the modification time of the file, with LRU eviction under a memory budget.
+    Concurrent requests of the same LUT wait for a single read of the file.
+    Args:
+        budget (int, optional): memory budget in bytes. Defaults to 1 GiB, or the
+                                MODELLING_UTILS_LUT_CACHE_MB environment variable.
+    """
+    __slots__=["budget", "hits", "misses", "evictions", "nbytes", "_entries", "_pending", "_lock"]
+    def __init__(self, budget: int=None):
+        self.budget = budget if budget is not None else int(float(os.environ.get("MODELLING_UTILS_LUT_CACHE_MB", 1024))*(1 << 20))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        # key -> (data frame, size in bytes), in least to most recently used order
+        self._entries = OrderedDict()
+        # key -> event set when the pending read of the key is done
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _key(self, path: str, compiled: bool, compact: bool) -> tuple:
+        path = os.path.realpath(path)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"File {path} not found")
+        stat = os.stat(path)
+        return (path, stat.st_mtime_ns, stat.st_size, compiled, compact)
+
+    def get(self, path: str, compiled: bool=True, compact: bool=False) -> pd.DataFrame:
+        """_summary_
+        Returns the cached LUT, reading it with read_lut on a miss
+        Returns:
+            pandas DataFrame: a copy of the cached LUT that can be modified without
+                            altering the cache. The copy is shallow (free) under pandas
+                            copy-on-write, and deep on older pandas versions
+        """
+        key = self._key(path, compiled, compact)
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return _cache_copy(entry[0])
+                pending = self._pending.get(key)
+                if pending is None:
+                    self.misses += 1
+                    self._pending[key] = threading.Event()
+                    break
+            # another thread is reading the LUT
+            pending.wait()
+        try:
+            df = read_lut(path, compiled=compiled, compact=compact, cache=False)
+            nbytes = int(df.memory_usage(deep=True).sum())
+            with self._lock:
+                # entries of previous versions of the file are stale
+                for stale in [k for k in self._entries.keys() if k[0] == key[0] and k[1:3] != key[1:3]]:
+                    self._remove(stale)
+                if nbytes <= self.budget:
+                    self._entries[key] = (df, nbytes)
+                    self.nbytes += nbytes
+                    self._evict()
+        finally:
+            with self._lock:
+                self._pending.pop(key).set()
+        return _cache_copy(df)
+
+    def _remove(self, key: tuple) -> None:
+        df, nbytes = self._entries.pop(key)
+        self.nbytes -= nbytes
+
+    def _evict(self) -> None:
+        while self.nbytes > self.budget and len(self._entries) > 0:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, path: str=None) -> int:
+        """_summary_
+        Drops the cached versions of a LUT file, or the whole cache
+        Args:
+            path (str, optional): path of the LUT file. Defaults to None (every LUT).
+        Returns:
+            int: number of dropped entries
+        """
+        path = os.path.realpath(path) if bool(path) else None
+        with self._lock:
+            keys = [key for key in self._entries.keys() if path is None or key[0] == path]
+            for key in keys:
+                self._remove(key)
+        return len(keys)
+
+    def resize(self, budget: int) -> None:
+        with self._lock:
+            self.budget = budget
+            self._evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.nbytes,
+                "budget": self.budget,
+            }
+
+# process wide LUT cache, used by read_lut(path, cache=True)
+__lut_cache__ = LutCache()
+
+def lut_cache() -> LutCache:
+    """_summary_
+    Returns the process wide LUT cache used by read_lut(path, cache=True)
+    """
+    return __lut_cache__
+
+def iter_lut(path: str, chunksize: int=65536, as_frame: bool=True):
+    """_summary_
+    Reads a Cadence Look Up Table exported to CSV in blocks of rows,
+    yielding each block already unfolded, so that LUTs larger than
+    the available memory can be processed (see also compile_lut(chunksize=...)).
+    Each chunk holds, for every sweep value, the block of rows of the x-axis.
+    Concatenating the chunks gives the rows of read_lut in a different order.
+    Args:
+        path        (str)           : path to read the file from
+        chunksize   (int, optional) : number of CSV rows per chunk. Defaults to 65536.
+        as_frame    (bool, optional): yield pandas DataFrames, or dictionaries of
+                                    column name -> np.ndarray. Defaults to True.
+    Raises:
+        FileNotFoundError: _description_
+        ValueError: _description_
+        IOError: _description_
+    Yields:
+        pandas DataFrame / dict: unfolded chunk of the LUT
+    """
+    _check_csv_path(path)
+    head,tail = os.path.split(path)
+    name, extension = os.path.splitext(tail)
+    detected_vars = _parse_lut_name(name)
+    try:
+        reader = pd.read_csv(path, chunksize=chunksize)
+    except:
+        raise IOError(f"File {path} could not be read")
+    with reader:
+        for block in reader:
+            data = _unfold_lut_arrays(block, detected_vars)
+            yield pd.DataFrame(data) if as_frame else data
+
+def find_luts(root: str, device: str=None) -> list:
+    """_summary_
+    Discovers the LUT files of a simulations directory, i.e. the CSV files
+    whose names encode the LUT variables (e.g. "vsb-0_w-2-3-u_l-30-n_sweep-vgs-vds.csv")
+    Args:
+        root    (str)           : simulations directory
+        device  (str, optional) : device subdirectory (e.g. "ncell", "pcell"). Defaults to None.
+    Raises:
+        FileNotFoundError: _description_
+    Returns:
+        list: sorted paths of the LUT files
+    """
+    folder = os.path.join(root, device) if bool(device) else root
+    if not os.path.isdir(folder):
+        raise FileNotFoundError(f"Directory {folder} not found")
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(folder):
+        # compiled LUTs are directories of .npy files, do not descend into them
+        dirnames[:] = [d for d in dirnames if not d.endswith(__compiled_lut_extension__)]
+        for filename in filenames:
+            name, extension = os.path.splitext(filename)
+            if extension != ".csv" or "sweep" not in [attr.split('-')[0] for attr in name.split('_')]:
+                continue
+            try:
+                _parse_lut_name(name)
+            except ValueError:
+                logger.warning(f"Skipping {filename}: not a valid LUT name")
+                continue
+            paths.append(os.path.join(dirpath, filename))
+    return sorted(paths)
+
+def _timed_read_lut(path: str, compact: bool=False) -> tuple:
+    start = time.perf_counter_ns()
+    df = read_lut(path, compact=compact)
+    return df, time.perf_counter_ns() - start
+
+def _concat_compact(frames: list) -> pd.DataFrame:
+    """_summary_
+    Concatenates compact LUTs, merging the categories of their
+    categorical columns so that they stay categorical
+    """
+    from pandas.api.types import union_categoricals
+    categorical = [name for name in frames[0].columns if isinstance(frames[0][name].dtype, pd.CategoricalDtype)]
+    for name in categorical:
+        categories = union_categoricals([df[name] for df in frames], sort_categories=True).categories
+        for df in frames:
+            df[name] = df[name].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+@profiled
+def read_lut_dir(root: str, device: str=None, workers: int=None, grid: bool=False, compact: bool=False):
+    """_summary_
+    Reads every LUT of a simulations directory (one CSV per corner) concurrently
+    and merges them into a single multi-corner LUT
+    Args:
+        root    (str)           : simulations directory
+        device  (str, optional) : device subdirectory (e.g. "ncell", "pcell"). Defaults to None.
+        workers (int, optional) : number of worker processes. Defaults to the number of CPUs,
+                                1 reads the files in the calling process.
+        grid    (bool, optional): return a gridded Lut (l x vsb x vds x vgs) instead
+                                of the long format table. Defaults to False.
+        compact (bool, optional): read the LUTs with compact dtypes (see read_lut). Defaults to False.
+    Raises:
+        FileNotFoundError: no LUT files were found
+    Returns:
+        pandas DataFrame / Lut: the merged LUT
+    """
+    paths = find_luts(root, device)
+    if len(paths) == 0:
+        raise FileNotFoundError(f"No LUT files found in {os.path.join(root, device) if bool(device) else root}")
+    workers = workers if bool(workers) else os.cpu_count()
+    workers = max(1, min(workers, len(paths)))
+    start = time.perf_counter_ns()
+    frames = [None]*len(paths)
+    parse_ns = 0
+    step = max(1, len(paths)//10)
+    if workers == 1:
+        results = ((i, _timed_read_lut(path, compact)) for i, path in enumerate(paths))
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        futures = {executor.submit(_timed_read_lut, path, compact): i for i, path in enumerate(paths)}
+        results = ((futures[future], future.result()) for future in as_completed(futures))
+    try:
+        for done, (i, (df, delta)) in enumerate(results, start=1):
+            frames[i] = df
+            parse_ns += delta
+            if done % step == 0 or done == len(paths):
+                logger.info(f"Read {done}/{len(paths)} LUT files ({(time.perf_counter_ns() - start)*1e-9:.2f} s)")
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    df = _concat_compact(frames) if compact else pd.concat(frames, ignore_index=True)
+    elapsed = (time.perf_counter_ns() - start)*1e-9
+    logger.info(
+        f"Read {len(paths)} LUT files ({len(df)} rows) in {elapsed:.3f} s "
+        f"with {workers} worker(s), {parse_ns*1e-9:.3f} s of parsing time"
+    )
+    if grid:
+        from .lut import Lut
+        return Lut.from_frame(df)
+    return df
@@ -0,0 +1,322 @@
+""" ***********************************
+* *[author] Diogo André (git-hub : das-dias)
+* *[date] 2022-05-05
+* *[filename] sizing.py
+* *[summary] Batch gm/id sizing engine, filling the output variables
+*               of the parsed devices from gridded Look Up Tables
+* ***********************************
+"""
+from collections import defaultdict
+from loguru import logger
+import numpy as np
+
+from .data import(
+    MosCell,
+    Devices,
+    DeviceTable,
+    TomlControlType,
+)
+from .lut import(
+    Lut,
+)
+from .profiling import(
+    profiled,
+)
+
+# parameters that scale linearly with the device width
+__extensive_params__ = ["id", "gm", "gmbs", "gds", "cgs", "cgd", "cgb", "csb", "cdb", "cds", "cgg", "cdep", "cvar"]
+# parameters that do not depend on the device width
+__intensive_params__ = ["ft", "fosc", "self_gain", "vdsat", "region"]
+# main output variables of a sized cell
+__cell_outputs__ = ["vgs", "vsg", "w", "gm", "gds", "ft", "self_gain", "vdsat", "cgg"]
+
+def _gate_axis(lut: Lut) -> str:
+    """_summary_
+    Returns the name of the gate voltage axis of the LUT (vgs for NMOS, vsg for PMOS)
+    """
+    return lut.gate_axis()
+
+def _lut_width(lut: Lut) -> float:
+    if "w" not in lut.constants:
+        raise ValueError("The LUT must be characterized for a single device width (w)")
+    return lut.constants["w"]
+
+def _coords(lut: Lut, gate: str, coords: dict) -> dict:
+    """_summary_
+    Selects the query coordinates of the LUT axes other than the gate voltage,
+    and of the LUT constants which are given (checked by Lut.interp)
+    """
+    missing = [axis for axis in lut.axes.keys() if axis != gate and axis not in coords]
+    if len(missing) > 0:
+        raise ValueError(f"Missing values for the LUT axes {missing}")
+    names = [axis for axis in lut.axes.keys() if axis != gate] + [name for name in lut.constants.keys() if name in coords]
+    return {name: np.asarray(coords[name], dtype=float) for name in names}
+
+def invert(lut: Lut, param: str, target, **coords) -> np.ndarray:
+    """_summary_
+    Solves param(gate voltage, **coords) = target for the gate voltage,
+    for a whole batch of targets at once. The crossing with the target
+    at the highest gate voltage is linearly interpolated. The inverse index
+    of the LUT (see Lut.inverse_index) is used, falling back to a scan of
+    the parameter curves outside of their monotonic branch.
+    Args:
+        lut     (Lut)               : gridded LUT
+        param   (str)               : name of the parameter to invert (e.g. "gmoverid")
+        target  (float / np.ndarray): target values of the parameter
+        **coords                    : values of the remaining LUT axes, broadcasted with target
+    Returns:
+        np.ndarray: gate voltage of each target, NaN where the target is not reachable
+    """
+    gate = _gate_axis(lut)
+    coords = _coords(lut, gate, coords)
+    axes = {name: values for name, values in coords.items() if name in lut.axes}
+    scan = lambda target, **coords: _invert_scan(lut, param, target, **coords)
+    result = lut.inverse_index(param).query(target, scan=scan, **axes)
+    return np.where(lut.characterized(**coords), result, np.nan)
+
+def _invert_scan(lut: Lut, param: str, target, **coords) -> np.ndarray:
+    """_summary_
+    Solves param(gate voltage, **coords) = target for the gate voltage,
+    for a whole batch of targets at once. The parameter is sampled along
+    the gate voltage axis of the LUT and the crossing with the target
+    at the highest gate voltage is linearly interpolated.
+    Args:
+        lut     (Lut)               : gridded LUT
+        param   (str)               : name of the parameter to invert (e.g. "gmoverid")
+        target  (float / np.ndarray): target values of the parameter
+        **coords                    : values of the remaining LUT axes, broadcasted with target
+    Returns:
+        np.ndarray: gate voltage of each target, NaN where the target is not reachable
+    """
+    gate = _gate_axis(lut)
+    coords = _coords(lut, gate, coords)
+    arrays = np.broadcast_arrays(np.asarray(target, dtype=float), *coords.values())
+    shape = arrays[0].shape
+    target = arrays[0].ravel()
+    coords = {axis: values.ravel()[:, None] for axis, values in zip(coords.keys(), arrays[1:])}
+    gate_values = lut.axes[gate]
+    # (targets x gate voltage) curves of the parameter
+    curves = lut.interp(param, **coords, **{gate: gate_values[None, :]})
+    delta = curves - target[:, None]
+    crossing = (delta[:, :-1]*delta[:, 1:] <= 0)
+    found = crossing.any(axis=1)
+    # index of the last crossing segment of each curve
+    segment = crossing.shape[1] - 1 - np.argmax(crossing[:, ::-1], axis=1)
+    rows = np.arange(len(target))
+    d0 = delta[rows, segment]
+    d1 = delta[rows, segment+1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(d0 != d1, d0/(d0 - d1), 0.0)
+    result = gate_values[segment] + t*(gate_values[segment+1] - gate_values[segment])
+    result[~found] = np.nan
+    return result.reshape(shape)
+
+def _outputs(lut: Lut, gate: str, gate_values: np.ndarray, scale: np.ndarray, coords: dict) -> dict:
+    """_summary_
+    Interpolates every LUT parameter known to MosCell at the solved bias point
+    and scales the width dependent ones by the width ratio to the LUT device
+    """
+    params = [p for p in __extensive_params__ + __intensive_params__ if p in lut]
+    values = lut.interp(params, **coords, **{gate: gate_values})
+    outputs = {}
+    for param in params:
+        if param in __extensive_params__:
+            outputs[param] = values[param]*scale
+        elif param == "region":
+            outputs[param] = np.round(values[param])
+        else:
+            outputs[param] = values[param]
+    if "cgg" not in outputs and all([c in outputs for c in ["cgs", "cgd", "cgb"]]):
+        outputs["cgg"] = outputs["cgs"] + outputs["cgd"] + outputs["cgb"]
+    outputs["w"] = _lut_width(lut)*scale
+    outputs[gate] = gate_values
+    return outputs
+
+def solve_cells(lut: Lut, gmoverid, id, **coords) -> dict:
+    """_summary_
+    Sizes a batch of transistors from their gm/id and drive current:
+    gm/id is inverted to find the gate voltage and the width is obtained
+    by scaling the LUT device width by the ratio of drive currents
+    Args:
+        lut         (Lut)               : gridded LUT
+        gmoverid    (float / np.ndarray): target gm/id of each device
+        id          (float / np.ndarray): drive current of each device
+        **coords                        : values of the remaining LUT axes (l, vds, vsb, ...)
+    Returns:
+        dict: MosCell variable name -> np.ndarray of the solved values
+    """
+    gate = _gate_axis(lut)
+    coords = _coords(lut, gate, coords)
+    arrays = np.broadcast_arrays(np.asarray(gmoverid, dtype=float), np.asarray(id, dtype=float), *coords.values())
+    coords = dict(zip(coords.keys(), arrays[2:]))
+    gate_values = invert(lut, "gmoverid", arrays[0], **coords)
+    lut_id = lut.interp("id", **coords, **{gate: gate_values})
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = np.abs(arrays[1]/lut_id)
+    outputs = _outputs(lut, gate, gate_values, scale, coords)
+    outputs["id"] = arrays[1]
+    return outputs
+
+def solve_varactors(lut: Lut, cvar, **coords) -> dict:
+    """_summary_
+    Sizes a batch of MOS varactors for a target capacitance at the given bias
+    Args:
+        lut     (Lut)               : gridded LUT
+        cvar    (float / np.ndarray): target varactor capacitance of each device
+        **coords                    : values of all the LUT axes, including the gate voltage
+    Returns:
+        dict: MosCell variable name -> np.ndarray of the solved values
+    """
+    gate = _gate_axis(lut)
+    if gate not in coords:
+        raise ValueError(f"The varactor gate voltage ({gate}) must be specified")
+    gate_values = np.asarray(coords[gate], dtype=float)
+    coords = _coords(lut, gate, coords)
+    arrays = np.broadcast_arrays(np.asarray(cvar, dtype=float), gate_values, *coords.values())
+    coords = dict(zip(coords.keys(), arrays[2:]))
+    if "cgg" in lut:
+        lut_cvar = lut.interp("cgg", **coords, **{gate: arrays[1]})
+    else:
+        caps = lut.interp(["cgs", "cgd", "cgb"], **coords, **{gate: arrays[1]})
+        lut_cvar = caps["cgs"] + caps["cgd"] + caps["cgb"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = np.abs(arrays[0]/lut_cvar)
+    outputs = _outputs(lut, gate, arrays[1], scale, coords)
+    outputs["cvar"] = arrays[0]
+    return outputs
+
+def solve_switches(lut: Lut, rds, **coords) -> dict:
+    """_summary_
+    Sizes a batch of MOS switches for a target on resistance at the given bias
+    Args:
+        lut     (Lut)               : gridded LUT
+        rds     (float / np.ndarray): target on resistance of each device
+        **coords                    : values of all the LUT axes, including the gate voltage
+    Returns:
+        dict: MosCell variable name -> np.ndarray of the solved values
+    """
+    gate = _gate_axis(lut)
+    if gate not in coords:
+        raise ValueError(f"The switch gate voltage ({gate}) must be specified")
+    gate_values = np.asarray(coords[gate], dtype=float)
+    coords = _coords(lut, gate, coords)
+    arrays = np.broadcast_arrays(np.asarray(rds, dtype=float), gate_values, *coords.values())
+    coords = dict(zip(coords.keys(), arrays[2:]))
+    lut_gds = lut.interp("gds", **coords, **{gate: arrays[1]})
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = np.abs(1/(arrays[0]*lut_gds))
+    outputs = _outputs(lut, gate, arrays[1], scale, coords)
+    outputs["rds"] = arrays[0]
+    return outputs
+
+def _resolve_lut(lut, dev_type: str, mos_type: str) -> Lut:
+    """_summary_
+    Selects the LUT to use for a device. The lut argument may be a single Lut,
+    or a dictionary keyed by device type ("cell", "varactor", "switch")
+    and/or by MOS type ("nch", "pch")
+    """
+    if isinstance(lut, Lut):
+        return lut
+    if isinstance(lut, dict):
+        if dev_type in lut:
+            return _resolve_lut(lut[dev_type], dev_type, mos_type)
+        if mos_type in lut:
+            return _resolve_lut(lut[mos_type], dev_type, mos_type)
+        raise KeyError(f"No LUT found for {mos_type} {dev_type} devices")
+    raise TypeError("lut must be a Lut or a dictionary of Lut")
+
+__solvers__ = {
+    "cell": (solve_cells, ["gmoverid", "id"]),
+    "varactor": (solve_varactors, ["cvar"]),
+    "switch": (solve_switches, ["rds"]),
+}
+
+def _mirror(name: str) -> str:
+    # vgs <-> vsg, vds <-> vsd, vsb <-> vbs
+    mirrors = {"vgs": "vsg", "vsg": "vgs", "vds": "vsd", "vsd": "vds", "vsb": "vbs", "vbs": "vsb"}
+    return mirrors.get(name)
+
+def _size_group(lut, dev_type: str, mos_type: str, names: list, column) -> dict:
+    """_summary_
+    Solves a group of devices of the same kind and MOS type
+    Args:
+        lut         (Lut / dict): LUT(s) to use
+        dev_type    (str)       : "cell", "varactor" or "switch"
+        mos_type    (str)       : "nch" or "pch"
+        names       (list)      : names of the devices of the group
+        column      (callable)  : MosCell variable name -> np.ndarray of the group values
+    Returns:
+        dict: MosCell variable name -> np.ndarray of the solved values, NaN for the failed devices
+    """
+    group_lut = _resolve_lut(lut, dev_type, mos_type)
+    solver, targets = __solvers__[dev_type]
+    gate = _gate_axis(group_lut)
+    axes = [axis for axis in group_lut.axes.keys() if axis != gate]
+    if dev_type != "cell":
+        axes.append(gate)
+    # the LUT single valued axes (other than the width) must match the devices control variables,
+    # the devices which differ are not sized
+    constants = [var for var in group_lut.constants.keys() if var != "w" and var in MosCell.__slots__]
+    args = {var: column(var) for var in targets + axes + constants}
+    for var in constants:
+        value = group_lut.constants[var]
+        mismatch = ~np.isclose(args[var], value, rtol=1e-6, atol=0.0)
+        if mismatch.any():
+            logger.warning(f"The LUT is characterized for {var}={value:g}, which differs from the {var} of the devices {list(np.asarray(names, dtype=object)[mismatch])}")
+    outputs = solver(group_lut, **args)
+    outputs = {var: values for var, values in outputs.items() if var in MosCell.__slots__}
+    for var in list(outputs.keys()):
+        mirror = _mirror(var)
+        if mirror is not None:
+            outputs[mirror] = -outputs[var]
+    failed = ~np.isfinite(outputs["w"])
+    if failed.any():
+        logger.warning(f"Could not size the {mos_type} {dev_type} devices {list(np.asarray(names, dtype=object)[failed])}: targets out of the LUT range")
+    return outputs
+
+@profiled
+def size(devices, lut, names: list=None):
+    """_summary_
+    Sizes every cell, varactor and switch of the devices container at once,
+    filling their output variables (w, vgs, gm, gds, caps, ft, ...) in place.
+    Devices are grouped by kind and MOS type and each group is solved
+    with a single vectorized LUT interpolation.
+    Args:
+        devices (Devices / DeviceTable) : parsed devices
+        lut     (Lut / dict)            : gridded LUT, or a dictionary of LUTs keyed by
+                                        device type ("cell", "varactor", "switch") and/or MOS type ("nch", "pch")
+        names   (list, optional)        : only size these devices, e.g. the dirty devices
+                                        of an incremental read (see SpecWatcher). Defaults to None (every device).
+    Returns:
+        Devices / DeviceTable: the same devices object, with the output variables filled
+    """
+    if isinstance(devices, DeviceTable):
+        selected = np.isin(devices.column("name"), list(names)) if names is not None else None
+        for dev_type in DeviceTable.__KINDS__:
+            for mos_type in [t.value for t in TomlControlType]:
+                mask = devices.mask(dev_type=dev_type, mos_type=mos_type)
+                if selected is not None:
+                    mask &= selected
+                rows = np.flatnonzero(mask)
+                if len(rows) == 0:
+                    continue
+                group_names = devices.column("name")[rows]
+                outputs = _size_group(lut, dev_type, mos_type, group_names, lambda var: devices.column(var)[rows])
+                solved = rows[np.isfinite(outputs["w"])]
+                for var, values in outputs.items():
+                    devices.column(var)[solved] = values[np.isfinite(outputs["w"])]
+        return devices
+    groups = defaultdict(list)
+    for dev_type, container in [("cell", devices.devices), ("varactor", devices.varactors), ("switch", devices.switches)]:
+        selected = container.values() if names is None else [container[name] for name in names if name in container]
+        for device in selected:
+            groups[(dev_type, device.type)].append(device)
+    for (dev_type, mos_type), cells in groups.items():
+        column = lambda var: np.array([getattr(cell, var) for cell in cells], dtype=float)
+        outputs = _size_group(lut, dev_type, mos_type, [cell.name for cell in cells], column)
+        for i, cell in enumerate(cells):
+            if not np.isfinite(outputs["w"][i]):
+                continue
+            for var, values in outputs.items():
+                setattr(cell, var, float(values[i]))
+    return devices
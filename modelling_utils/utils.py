@@ -5,17 +5,35 @@
 * *[summary] Essential utilities for data processing and representation and other stuff
 * ***********************************
 """
-import pandas as pd
 import itertools
-from cycler import cycler
+import functools
+import importlib
 from enum import Enum
 import numpy as np
-from mpl_toolkits import mplot3d
-import matplotlib as mpl
-import matplotlib.pyplot as plt
 import os
-import seaborn as sns
+from .profiling import(
+    profiled,
+    span,
+)
 __figs_path__ = os.path.join(os.getcwd(),"figs")
+# set by the render_batch workers, which apply the plotting style only once
+__keep_style__ = False
+# plotting modules, only imported when first used (PEP 562),
+# so that headless code does not pay for importing matplotlib and seaborn
+__lazy_modules__ = {
+    "plt": "matplotlib.pyplot",
+    "mpl": "matplotlib",
+    "sns": "seaborn",
+    "mplot3d": "mpl_toolkits.mplot3d",
+}
+
+def __getattr__(name: str):
+    if name in __lazy_modules__:
+        module = importlib.import_module(__lazy_modules__[name])
+        globals()[name] = module
+        return module
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 class Units(Enum):
     """_summary_
     Units enumerator
@@ -49,34 +67,93 @@ class Scale(Enum):
     FEMTO=('f', pow(10,-15))
     ATTO=('a', pow(10,-18))
 
+# scale letter -> multiplier
+__scale_factors__ = {scale.value[0]: scale.value[1] for scale in Scale}
+# multiplier of each scale letter indexed by its unicode code point (0 if not a scale letter)
+__scale_table__ = np.zeros(128)
+for __letter__, __factor__ in __scale_factors__.items():
+    __scale_table__[ord(__letter__)] = __factor__
+
+@functools.lru_cache(maxsize=4096)
 def stof(val: str)->float:
     """_summary_
-    Get a value from a string
+    Get a value from a string. Results are memoized,
+    as the same quantities are converted over and over
     Args:
-        val (str): String value in the format of "<value> <scale letter>"
+        val (str): String value in the format of "<value> <scale letter>" or "<value><scale letter>"
     Raises:
         ValueError: invalid scaling factor
     Returns:
         float: the extracted floating point value
     """
-    float_separators = [".", ","]
     scaling_factor = 1.0
-    tokens = val.split(" ")
     res = 0.0
-    for token in tokens:
-        if token.isnumeric():
+    for token in val.split(" "):
+        if token in __scale_factors__:
+            scaling_factor = __scale_factors__[token]
+            continue
+        try:
             res = float(token)
-        else:
-            if any([sep in token for sep in float_separators]):
-                res = float(token)
-            else:
-                scale_letters = [scale.value[0] for scale in Scale]
-                if token not in scale_letters:
-                    raise ValueError(f"Invalid scaling factor: {token}")
-                scaling_factor = [scale.value[1] for scale in Scale if scale.value[0] == token][0]
+        except ValueError:
+            # scale letter appended to the value, e.g. "500m"
+            if token[-1:] not in __scale_factors__:
+                raise ValueError(f"Invalid scaling factor: {token}")
+            res = float(token[:-1])
+            scaling_factor = __scale_factors__[token[-1]]
     res *= scaling_factor
     return res
 
+def stof_array(vals)->np.ndarray:
+    """_summary_
+    Vectorized version of stof, converting a whole array of SPICE-like
+    quantities ("30 n", "1.2 u", "500m", "0.6", ...) in a single pass
+    Args:
+        vals (np.ndarray / list / pd.Series): strings (or numbers) to convert
+    Raises:
+        ValueError: invalid quantity
+    Returns:
+        np.ndarray: the extracted floating point values, with the shape of vals
+    """
+    arr = np.asarray(vals)
+    if arr.dtype.kind in "biuf":
+        return arr.astype(float)
+    arr = np.char.strip(arr.astype(str))
+    if arr.size == 0 or arr.dtype.itemsize == 0:
+        return np.zeros(arr.shape)
+    n = arr.dtype.itemsize // 4
+    # one row of unicode code points per string, zero padded on the right
+    codes = np.ascontiguousarray(arr).reshape(-1).view(np.uint32).reshape(-1, n).copy()
+    rows = np.arange(len(codes))
+    length = np.count_nonzero(codes, axis=1)
+    if np.any(length == 0):
+        raise ValueError("Invalid quantity: empty string")
+    last_pos = np.maximum(length - 1, 0)
+    last = codes[rows, last_pos]
+    factor = __scale_table__[np.where(last < 128, last, 0)]
+    scaled = factor > 0
+    # "nan" and "inf" end in scale letters, but are not scaled quantities
+    candidates = np.flatnonzero(scaled & (length <= 4) & np.isin(last, [ord("n"), ord("N"), ord("f"), ord("F")]))
+    if len(candidates) > 0:
+        special = np.isin(np.char.lower(arr.reshape(-1)[candidates]), ["nan", "+nan", "-nan", "inf", "+inf", "-inf"])
+        scaled[candidates[special]] = False
+    codes[rows[scaled], last_pos[scaled]] = 0
+    # parse all the values at once from a single space separated string
+    # (every row is padded with at least one trailing space)
+    padded = np.full((len(codes), n+1), ord(" "), dtype=np.uint32)
+    padded[:, :n] = np.where(codes == 0, ord(" "), codes)
+    res = None
+    try:
+        res = np.fromstring(padded.reshape(-1).view(f"<U{padded.size}")[0], sep=" ")
+    except ValueError:
+        pass
+    if res is None or len(res) != len(codes):
+        # slow path, pointing out the invalid quantities
+        try:
+            res = codes.view(f"<U{n}").reshape(-1).astype(float)
+        except ValueError as e:
+            raise ValueError(f"Invalid quantity: {e}")
+    return np.where(scaled, res*factor, res).reshape(arr.shape)
+
 def timer(func):
     """_summary_
     Decorator to time a function
@@ -84,12 +161,16 @@ def timer(func):
         func (function): function to be timed
     Returns:
         function: the same function, but with a "runtime_ns" (time in nanoseconds) attribute
+    Note:
+        the call is also recorded by the profiler when profiling is enabled.
+        For aggregated statistics without logging each call, use profiling.profiled
     """
     import time
     from loguru import logger
     def wrapper(*args, **kwargs):
         start = time.time_ns()
-        result = func(*args, **kwargs)
+        with span(func.__qualname__):
+            result = func(*args, **kwargs)
         end = time.time_ns()
         delta = end - start
         func.runtime_ns = delta
@@ -99,7 +180,89 @@ def timer(func):
         return result
     return wrapper
 
+def _minmax_decimate(y: np.ndarray, max_points: int) -> np.ndarray:
+    # indices of the minimum and maximum of each bucket of consecutive points,
+    # plus the end points: the envelope of the curve is preserved
+    n = len(y)
+    if max_points < 4:
+        # room for a single extreme between the end points: the one furthest from them
+        ends = y[[0, n-1]]
+        reference = ends[~np.isnan(ends)].mean() if not np.all(np.isnan(ends)) else 0.0
+        deviation = np.abs(y - reference)
+        deviation[np.isnan(deviation)] = -1.0
+        return np.unique([0, int(np.argmax(deviation)), n-1])
+    buckets = (max_points - 2)//2
+    k = -(-n//buckets)
+    buckets = -(-n//k)
+    nan = np.isnan(y)
+    low = np.full(buckets*k, np.inf)
+    high = np.full(buckets*k, -np.inf)
+    low[:n] = np.where(nan, np.inf, y)
+    high[:n] = np.where(nan, -np.inf, y)
+    offsets = np.arange(buckets)*k
+    mins = offsets + low.reshape(buckets, k).argmin(axis=1)
+    maxs = offsets + high.reshape(buckets, k).argmax(axis=1)
+    return np.unique(np.concatenate([[0, n-1], np.minimum(mins, n-1), np.minimum(maxs, n-1)]))
+
+def _lttb_decimate(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    # largest triangle three buckets: keeps, in each bucket, the point forming the
+    # largest triangle with the previously kept point and the average of the next bucket
+    n = len(y)
+    edges = np.linspace(1, n-1, max(1, max_points-2) + 1).astype(int)
+    indices = np.empty(len(edges) + 1, dtype=int)
+    indices[0], indices[-1] = 0, n-1
+    last = 0
+    for i in range(len(edges) - 1):
+        start, stop = edges[i], max(edges[i+1], edges[i]+1)
+        next_start, next_stop = edges[i+1], edges[i+2] if i+2 < len(edges) else n
+        next_x = np.mean(x[next_start:next_stop]) if next_stop > next_start else x[n-1]
+        next_y = np.mean(y[next_start:next_stop]) if next_stop > next_start else y[n-1]
+        area = np.abs(
+            (x[last] - next_x)*(y[start:stop] - y[last]) -
+            (x[last] - x[start:stop])*(next_y - y[last])
+        )
+        last = start + int(np.nanargmax(area)) if not np.all(np.isnan(area)) else start
+        indices[i+1] = last
+    return np.unique(indices[:len(edges)].tolist() + [n-1])
+
+__decimators__ = ["minmax", "lttb"]
+
+def decimate(x: np.ndarray, y: np.ndarray, max_points: int, method: str="minmax") -> tuple:
+    """_summary_
+    Downsamples a curve to at most max_points points, preserving its shape
+    Args:
+        x           (np.ndarray)    : x values, sorted
+        y           (np.ndarray)    : y values
+        max_points  (int)           : maximum number of points, e.g. twice the width of the figure in pixels
+        method      (str, optional) : "minmax" (minimum and maximum of each bucket of points)
+                                    or "lttb" (largest triangle three buckets). Defaults to "minmax".
+    Raises:
+        ValueError: unsupported method, max_points lower than 3 or x and y of different lengths
+    Returns:
+        tuple: the decimated x and y values
+    """
+    if method not in __decimators__:
+        raise ValueError(f"Unsupported decimation method: {method}, use one of {__decimators__}")
+    if max_points < 3:
+        raise ValueError("max_points should be at least 3")
+    x, y = np.asarray(x), np.asarray(y)
+    if len(x) != len(y):
+        raise ValueError("x and y should have the same length")
+    if len(y) <= max_points:
+        return x, y
+    if method == "minmax":
+        indices = _minmax_decimate(y.astype(float, copy=False), max_points)
+    else:
+        indices = _lttb_decimate(x.astype(float, copy=False), y.astype(float, copy=False), max_points)
+    return x[indices], y[indices]
+
 def _set_2D_style():
+    if __keep_style__:
+        return
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from cycler import cycler
     sns.set_style('whitegrid') # darkgrid, white grid, dark, white and ticks
     custom_cycler = (
         cycler(color=['r', 'b', 'g', 'k', 'm']) +
@@ -117,6 +280,7 @@ def _set_2D_style():
     #define font family to use for all text
     mpl.rcParams['font.family'] = 'serif'
 
+@profiled
 def _plot_graph_2D(
     x, 
     y, 
@@ -132,6 +296,7 @@ def _plot_graph_2D(
     xlim: tuple=None,
     ylim: tuple=None
     ):
+    import matplotlib.pyplot as plt
     if not bool(axis):
         axis = plt.axes()
     if not hold_off:
@@ -161,6 +326,7 @@ def _plot_graph_2D(
         axis.plot(x, y, label=label)
     return axis
     
+@profiled
 def _plot_graph_3D(
     x, 
     y, 
@@ -173,6 +339,8 @@ def _plot_graph_3D(
     type: str=None,
     show: bool=False
     ):
+    import matplotlib.pyplot as plt
+    from mpl_toolkits import mplot3d # registers the 3d projection
     # pretty plot
     fig = plt.figure()
     ax = plt.axes(projection='3d')
@@ -206,6 +374,20 @@ def _plot_graph_3D(
     plt.close()
 
 
+def _decimate_curves(x, y, max_points: int, method: str) -> tuple:
+    # decimates each curve of plot_function, a shared x becomes one x per curve
+    if isinstance(y, np.ndarray) and isinstance(x, np.ndarray):
+        return decimate(x, y, max_points, method)
+    if not isinstance(y, list) or not all([isinstance(i, np.ndarray) for i in y]):
+        return x, y
+    if isinstance(x, np.ndarray):
+        x = [x]*len(y)
+    elif not isinstance(x, list) or not all([isinstance(i, np.ndarray) for i in x]):
+        return x, y
+    curves = [decimate(x_vec, y_vec, max_points, method) for x_vec, y_vec in zip(x, y)]
+    return [x_vec for x_vec, _ in curves], [y_vec for _, y_vec in curves]
+
+@profiled
 def plot_function(
     x, 
     y,
@@ -219,7 +401,9 @@ def plot_function(
     type: str=None,
     show: bool=False,
     xlim: tuple=None,
-    ylim: tuple=None
+    ylim: tuple=None,
+    max_points: int=None,
+    decimate: str="minmax"
     ):
     """_summary_
     Plots a function in 2D (curve) or 3D space (surface) depending on the parsing of the z variable
@@ -235,10 +419,15 @@ def plot_function(
         filename    (str)               : name of the file to save the plot
         type        (str)               : type of 3D plot to be made. Options : "line", "scatter", "surface", "wireframe" 
         line_style  (str)               : line style to be used for the 2D plot
+        max_points  (int)               : maximum number of points per 2D curve, longer curves are
+                                        downsampled before plotting. Defaults to None (no downsampling).
+        decimate    (str)               : downsampling method, "minmax" or "lttb" (see decimate)
     """
     _set_2D_style()
     if not all([isinstance(label, str) for label in labels]):
         raise TypeError("Labels should be strings")
+    if bool(max_points) and not isinstance(z, np.ndarray):
+        x, y = _decimate_curves(x, y, max_points, decimate)
     if not isinstance(z, np.ndarray):
         if isinstance(y, np.ndarray):
             _plot_graph_2D(
@@ -338,7 +527,24 @@ def plot_function(
         )
 
 
-def plot_hist(data, labels: list=[], xlabel: str=None, title: str=None, filename: str=None, show:bool=False, stat: str="probability"):
+def _prebin(data: list, binwidth: float) -> tuple:
+    # histogram of the full data sets over common bins: the bin centres,
+    # weighted by their counts, are plotted in place of the samples
+    # so the tails and outliers are kept and the plotting cost only depends on the bins
+    values = [v.reshape(-1)[np.isfinite(v.reshape(-1))] for v in data]
+    low = min([v.min() for v in values if v.size > 0], default=0.0)
+    high = max([v.max() for v in values if v.size > 0], default=0.0)
+    # the bins seaborn uses for the raw samples with this binwidth
+    edges = np.arange(low, high + binwidth, binwidth)
+    if edges.max() < high or len(edges) < 2:
+        edges = np.append(edges, edges.max() + binwidth)
+    counts = [np.histogram(v, bins=len(edges) - 1, range=(edges.min(), edges.max())) for v in values]
+    edges = counts[0][1]
+    centres = 0.5*(edges[:-1] + edges[1:])
+    return (low, high), centres, [count for count, _ in counts]
+
+@profiled
+def plot_hist(data, labels: list=[], xlabel: str=None, title: str=None, filename: str=None, show:bool=False, stat: str="probability", max_points: int=None):
     """_summary_
     Plots a histogram of the data
     Args:
@@ -346,21 +552,31 @@ def plot_hist(data, labels: list=[], xlabel: str=None, title: str=None, filename
         labels      (list, optional)    : Data labels. Defaults to [].
         title       (str, optional)     : Title of the histogram plot. Defaults to None.
         filename    (str, optional)     : Name of the figure to save the histogram. Defaults to None.
+        max_points  (int, optional)     : maximum number of samples per data set, larger data sets are
+                                        binned before plotting, which gives the same histogram. Defaults to None.
     Raises:
         TypeError: _description_
         ValueError: _description_
         ValueError: _description_
         TypeError: _description_
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     _set_2D_style()
     if not all([isinstance(label, str) for label in labels]):
         raise TypeError("Labels should be strings")
-    
+    binwidth = 0.05
+    sets = [data] if isinstance(data, np.ndarray) else data
+    binned = bool(max_points) and isinstance(data, (np.ndarray, list)) and \
+        all([isinstance(v, np.ndarray) for v in sets]) and any([v.size > max_points for v in sets])
+    if binned:
+        binrange, centres, counts = _prebin(sets, binwidth)
     if isinstance(data, np.ndarray):
+        samples = dict(x=centres, weights=counts[0], binrange=binrange) if binned else dict(data=data)
         sns.histplot(
-            data=data,
+            **samples,
             kde=True,
-            binwidth = 0.05,
+            binwidth=binwidth,
             stat=stat,
         ).set_xlabel(xlabel)
     elif isinstance(data, list):
@@ -372,6 +588,13 @@ def plot_hist(data, labels: list=[], xlabel: str=None, title: str=None, filename
         dt = data
         if len(labels) != 0:
             dt = {label: v for label, v in zip(labels, data)}
+        keys = labels if len(labels) != 0 else list(range(len(data)))
+        samples = dict(
+            x=np.tile(centres, len(data)),
+            weights=np.concatenate(counts),
+            hue=np.repeat(np.asarray(keys, dtype=object), len(centres)),
+            binrange=binrange,
+        ) if binned else dict(data=dt)
         colours = [
             "#000000",
             "#D84242",
@@ -380,12 +603,12 @@ def plot_hist(data, labels: list=[], xlabel: str=None, title: str=None, filename
             "#D80AD0"
         ]
         sns.histplot( 
-            data=dt, 
+            **samples,
             kde=True, 
-            binwidth=0.05,
+            binwidth=binwidth,
             legend=True, 
             stat=stat,
-            palette=[c for c,_ in zip(itertools.cycle(colours), dt.keys())]
+            palette=[c for c,_ in zip(itertools.cycle(colours), keys)]
         ).set_xlabel(xlabel)
     else:
         raise TypeError("data must be a numpy.ndarray or a list of numpy.ndarray")
@@ -399,4 +622,57 @@ def plot_hist(data, labels: list=[], xlabel: str=None, title: str=None, filename
         plt.show()
     plt.close()
     
-    
\ No newline at end of file
+    
+
+__plotters__ = {
+    "function": plot_function,
+    "hist": plot_hist,
+}
+
+def _init_render_worker() -> None:
+    global __keep_style__
+    import matplotlib
+    matplotlib.use("Agg")
+    __keep_style__ = False
+    _set_2D_style()
+    __keep_style__ = True
+
+def _render(spec: dict) -> str:
+    spec = dict(spec)
+    __plotters__[spec.pop("kind", "function")](**spec)
+    return os.path.join(__figs_path__, spec["filename"])
+
+@profiled
+def render_batch(specs: list, workers: int=None) -> list:
+    """_summary_
+    Renders a batch of figures in a pool of worker processes with the Agg backend.
+    Each worker applies the plotting style once, instead of once per figure
+    Args:
+        specs   (list)          : plot descriptions, dictionaries with the keyword arguments
+                                of plot_function (or of plot_hist, with "kind": "hist").
+                                "filename" is mandatory and "show" is not supported
+        workers (int, optional) : number of worker processes. Defaults to the number of CPUs,
+                                1 renders the figures in the calling process.
+    Raises:
+        ValueError: a plot description has no filename, asks to show the figure
+                    or has an unsupported kind
+    Returns:
+        list: paths of the written figures, in the order of specs
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    for i, spec in enumerate(specs):
+        if not bool(spec.get("filename")):
+            raise ValueError(f"Plot description {i} has no filename")
+        if spec.get("show", False):
+            raise ValueError(f"Plot description {i}: figures can not be shown in batch rendering")
+        if spec.get("kind", "function") not in __plotters__:
+            raise ValueError(f"Plot description {i}: unsupported kind {spec['kind']}, use one of {list(__plotters__.keys())}")
+    if len(specs) == 0:
+        return []
+    os.makedirs(__figs_path__, exist_ok=True)
+    workers = workers if bool(workers) else os.cpu_count()
+    workers = max(1, min(workers, len(specs)))
+    if workers == 1:
+        return [_render(spec) for spec in specs]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker) as executor:
+        return list(executor.map(_render, specs, chunksize=max(1, len(specs)//(4*workers))))
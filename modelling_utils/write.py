@@ -1,66 +1,370 @@
-from http.client import UnimplementedFileMode
+from contextlib import contextmanager
 from loguru import logger
 import os
+import tempfile
+import time
 import yaml
 import json
 import toml
 import csv
+import numpy as np
 import pandas as pd
+try:
+    import pyarrow as _pyarrow
+except ImportError:
+    _pyarrow = None
+
+from .profiling import(
+    profiled,
+)
+
+class WriteReport:
+    """_summary_
+    Summary of a written file
+    Args:
+        path    (str)   : path of the written file
+        format  (str)   : file format
+        rows    (int)   : number of written rows
+        nbytes  (int)   : size of the written file [B]
+        seconds (float) : writing time [s]
+    """
+    __slots__=["path", "format", "rows", "nbytes", "seconds"]
+    def __init__(self, path: str, format: str, rows: int, nbytes: int, seconds: float):
+        self.path = path
+        self.format = format
+        self.rows = rows
+        self.nbytes = nbytes
+        self.seconds = seconds
+
+    @property
+    def throughput(self) -> float:
+        """_summary_
+        Writing throughput [B/s]
+        """
+        return self.nbytes/self.seconds if self.seconds > 0 else float("inf")
+
+    def __str__(self) -> str:
+        return f"{self.path}: {self.rows} rows, {self.nbytes*1e-6:.3f} MB in {self.seconds:.3f} s ({self.throughput*1e-6:.1f} MB/s)"
+
+    def __repr__(self) -> str:
+        return f"WriteReport({self})"
+
+def _check_dir(path: str) -> None:
+    head = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(head):
+        raise FileNotFoundError(f"Directory {head} not found")
+
+def _read_umask() -> int:
+    # os.umask can only be read by setting it, done once at import
+    # since changing it is not thread safe
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+__umask__ = _read_umask()
+
+@contextmanager
+def _atomic(path: str):
+    """_summary_
+    Yields a temporary path in the directory of path, renamed to path
+    once the block succeeds (and removed if it fails), so that readers
+    never see a partially written file
+    """
+    head, tail = os.path.split(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=f".{tail}.", suffix=".tmp", dir=head)
+    os.close(fd)
+    try:
+        yield tmp
+        # mkstemp creates the file owner-only (0600): give it the mode of the file
+        # it replaces, or the mode of a newly created file
+        if os.path.exists(path):
+            mode = os.stat(path).st_mode & 0o7777
+        else:
+            mode = 0o666 & ~__umask__
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
 def write(info: dict, path:str) -> None:
     """_summary_
-    Writes the contents of a dictionary to a YAML or JSON file
-    containing the labelled information from within the dictionary
+    Writes the contents of a dictionary to a YAML, JSON or TOML file
+    containing the labelled information from within the dictionary.
+    The file is written atomically (temporary file and rename)
     Args:
-        path (str): path to read the file from
+        info (dict): information to write
+        path (str) : path of the file to write
     Raises:
-        FileNotFoundError: _description_
-        ValueError: _description_
-        IOError: _description_
+        FileNotFoundError: the directory of the file does not exist
+        ValueError: the file is not a .yaml, .yml, .json or .toml file
+        IOError: the file could not be written
     """
-    raise NotImplementedError(f"write function not implemented")
-    if not os.path.exists(path):
-        raise FileNotFoundError(f"File {path} not found")
+    _check_dir(path)
     head,tail = os.path.split(path)
     name, extension = os.path.splitext(tail)
-    possible_formats = [ ".yaml", ".yml", ".json", "toml"]
+    possible_formats = [ ".yaml", ".yml", ".json", ".toml"]
+    if extension not in possible_formats:
+        raise ValueError(f"File {path} is not a valid specification file. Only {possible_formats} are accepted")
     try:
-        with open(path, 'w') as file:
-            if extension in [".yaml", ".yml"]:
-                yaml.dump(info, file)
-            elif extension == ".json":
-                json.dump(info, file)
-            elif extension == ".toml":
-                toml.dump(info, file)
-            else:
-                raise ValueError(f"File {path} is not a valid specification file. Only {possible_formats} are accepted")
-    except:
-        raise IOError(f"File {path} could not be opened")
-
-def write_data(data: pd.DataFrame, path: str):
+        with _atomic(path) as tmp:
+            with open(tmp, 'w') as file:
+                if extension in [".yaml", ".yml"]:
+                    yaml.dump(info, file)
+                elif extension == ".json":
+                    json.dump(info, file)
+                else:
+                    toml.dump(info, file)
+    except (OSError, TypeError, ValueError, yaml.YAMLError) as err:
+        raise IOError(f"File {path} could not be written: {err}") from err
+
+def _to_frame(data) -> pd.DataFrame:
+    if isinstance(data, pd.DataFrame):
+        return data
+    if hasattr(data, "to_frame"):
+        # DeviceTable, MonteCarloResult
+        return data.to_frame()
+    from .data import Devices, DeviceTable
+    if isinstance(data, Devices):
+        return DeviceTable.from_devices(data).to_frame()
+    raise TypeError(f"{type(data).__name__} can not be written as a table")
+
+def _require_pyarrow(extension: str) -> None:
+    if _pyarrow is None:
+        raise ImportError(f"pyarrow is required to write {extension} files")
+
+def _chunks(df: pd.DataFrame, chunk_size: int):
+    for start in range(0, max(len(df), 1), chunk_size):
+        yield df.iloc[start:start + chunk_size]
+
+def _arrow_chunks(df: pd.DataFrame, chunk_size: int, index: bool):
+    schema = _pyarrow.Schema.from_pandas(df, preserve_index=index)
+    tables = (_pyarrow.Table.from_pandas(chunk, schema=schema, preserve_index=index) for chunk in _chunks(df, chunk_size))
+    return schema, tables
+
+def _write_parquet(df: pd.DataFrame, path: str, chunk_size: int, compression: str, index: bool) -> None:
+    import pyarrow.parquet as pq
+    schema, tables = _arrow_chunks(df, chunk_size, index)
+    with pq.ParquetWriter(path, schema, compression=compression if bool(compression) else "none") as writer:
+        for table in tables:
+            writer.write_table(table, row_group_size=chunk_size)
+
+def _write_feather(df: pd.DataFrame, path: str, chunk_size: int, compression: str, index: bool) -> None:
+    # feather v2 is the Arrow IPC file format
+    import pyarrow.ipc
+    schema, tables = _arrow_chunks(df, chunk_size, index)
+    options = _pyarrow.ipc.IpcWriteOptions(compression=compression if bool(compression) else None)
+    with _pyarrow.ipc.new_file(path, schema, options=options) as writer:
+        for table in tables:
+            writer.write_table(table, max_chunksize=chunk_size)
+
+def _write_csv(df: pd.DataFrame, path: str, chunk_size: int, compression: str, index: bool) -> None:
+    if bool(compression):
+        raise ValueError("CSV files are written uncompressed")
+    with open(path, 'w', newline="") as file:
+        for i, chunk in enumerate(_chunks(df, chunk_size)):
+            chunk.to_csv(file, header=i == 0, index=index)
+
+def _write_npz(df: pd.DataFrame, path: str, chunk_size: int, compression: str, index: bool) -> None:
+    arrays = {}
+    if index:
+        arrays["index"] = df.index.to_numpy()
+    for var, column in df.items():
+        if isinstance(column.dtype, pd.CategoricalDtype) or column.dtype == object or pd.api.types.is_string_dtype(column.dtype):
+            arrays[str(var)] = column.astype(str).to_numpy(dtype=str)
+        else:
+            arrays[str(var)] = column.to_numpy()
+    with open(path, 'wb') as file:
+        if compression is False:
+            np.savez(file, **arrays)
+        else:
+            np.savez_compressed(file, **arrays)
+
+# table file extension -> (format, writer)
+__data_writers__ = {
+    ".csv": ("csv", _write_csv),
+    ".parquet": ("parquet", _write_parquet),
+    ".pq": ("parquet", _write_parquet),
+    ".feather": ("feather", _write_feather),
+    ".arrow": ("feather", _write_feather),
+    ".npz": ("npz", _write_npz),
+}
+# default compression of each format
+__data_compression__ = {"csv": None, "parquet": "zstd", "feather": "lz4", "npz": True}
+
+@profiled
+def write_data(data, path: str, chunk_size: int=1000000, compression=None, index: bool=False) -> WriteReport:
     """_summary_
-    Writes a CSV data file from a pandas dataframe
+    Writes a table to a CSV, Parquet, Feather (Arrow IPC) or compressed NPZ
+    file, chosen from the extension of the path. Parquet and Feather files
+    are written with pyarrow (optional "arrow" extra).
+    Large tables are streamed in chunks of rows, and the file is written
+    atomically (temporary file and rename)
     Args:
-        data (pd.DataFrame) : dataframe to write to the file
-        path (str)          : path to read the file from
-
+        data        (pd.DataFrame / DeviceTable / Devices)  : table to write
+        path        (str)                   : path of the file to write
+        chunk_size  (int, optional)         : number of rows written at once (Parquet row group size). Defaults to 10^6.
+        compression (str / bool, optional)  : Parquet ("zstd", "snappy", ...) or Feather ("lz4", "zstd") codec,
+                                            False for an uncompressed NPZ file. Defaults to zstd for Parquet,
+                                            lz4 for Feather and compressed NPZ files.
+        index       (bool, optional)        : also write the index of the table. Defaults to False.
     Raises:
-        FileNotFoundError: _description_
-        ValueError: _description_
-        IOError: _description_
-
+        FileNotFoundError: the directory of the file does not exist
+        ValueError: unsupported file extension
+        ImportError: pyarrow is required for Parquet and Feather files
+        IOError: the file could not be written
     Returns:
-        pandas DataFrame: dataframe containing the extracted information from the CSV file
+        WriteReport: path, number of rows, bytes written and writing time
     """
-    raise NotImplementedError(f"write_data function not implemented")
-    if not os.path.exists(path):
-        raise FileNotFoundError(f"File {path} not found")
+    _check_dir(path)
     head,tail = os.path.split(path)
     name, extension = os.path.splitext(tail)
-    if extension !=  ".csv":
-        raise ValueError(f"File {path} is not a valid specification file. Only .csv files are accepted")
-    df = None
+    if extension not in __data_writers__:
+        raise ValueError(f"File {path} is not a valid data file. Only {list(__data_writers__.keys())} files are accepted")
+    format, writer = __data_writers__[extension]
+    if format in ["parquet", "feather"]:
+        _require_pyarrow(extension)
+    if compression is None:
+        compression = __data_compression__[format]
+    chunk_size = max(1, int(chunk_size))
+    df = _to_frame(data)
+    start = time.perf_counter()
     try:
-        data.to_csv(path)
-    except:
-        raise IOError(f"File {path} could not be opened")
-    return df
\ No newline at end of file
+        with _atomic(path) as tmp:
+            writer(df, tmp, chunk_size, compression, index)
+    except OSError as err:
+        raise IOError(f"File {path} could not be written: {err}") from err
+    report = WriteReport(path, format, len(df), os.path.getsize(path), time.perf_counter() - start)
+    logger.info(f"Wrote {report}")
+    return report
+
+def _spit_columns(devices) -> tuple:
+    """_summary_
+    Columnar selection of the [spit] variables of the devices: one row per
+    device with spit variables (every device if none has), one column per
+    variable requested by any of them, NaN where a device did not request it
+    Returns:
+        tuple: (identity columns name -> np.ndarray, variable name -> np.ndarray, device name -> requested variables)
+    """
+    from .data import DeviceTable, __spit_vars__
+    table = DeviceTable.from_devices(devices)
+    names = table.column("name")
+    spits = {name: [var for var in spit if var in __spit_vars__] for name, spit in devices.spits.items() if name in devices.index}
+    spits = {name: spit for name, spit in spits.items() if len(spit) > 0}
+    if len(spits) == 0:
+        spits = {name: list(__spit_vars__) for name in names}
+    selected = set(spits.keys())
+    rows = np.array([row for row, name in enumerate(names) if name in selected], dtype=np.int64)
+    # position of each exported device in the selection
+    position = {name: i for i, name in enumerate(names[rows])}
+    requested = {}
+    for name, spit in spits.items():
+        for var in spit:
+            requested.setdefault(var, []).append(position[name])
+    identity = {var: table.column(var)[rows] for var in ["name", "type", "kind"]}
+    columns = {}
+    for var in [var for var in __spit_vars__ if var in requested]:
+        values = table.column(var)[rows]
+        if len(requested[var]) < len(rows):
+            mask = np.zeros(len(rows), dtype=bool)
+            mask[requested[var]] = True
+            values = np.where(mask, values, np.nan)
+        columns[var] = values
+    return identity, columns, spits
+
+def _spit_header(var: str) -> str:
+    from .data import MosCell
+    unit = MosCell.__UNITS__.get(var, "")
+    return f"{var}[{unit}]"
+
+def _write_device_csv(path: str, header: list, record: list) -> WriteReport:
+    start = time.perf_counter()
+    with _atomic(path) as tmp:
+        with open(tmp, 'w', newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(header)
+            writer.writerow(record)
+    return WriteReport(path, "csv", 1, os.path.getsize(path), time.perf_counter() - start)
+
+def _plot_spits(identity: dict, columns: dict, output_dir: str) -> list:
+    """_summary_
+    One figure per exported variable with the value of each device,
+    reusing a single figure for every variable
+    """
+    from .figures import LinePlot
+    plot = LinePlot(xlabel="device")
+    paths = []
+    for var, values in columns.items():
+        valid = np.isfinite(values)
+        if not np.any(valid):
+            continue
+        plot.update(np.flatnonzero(valid).astype(float), values[valid], xlim=(-0.5, len(values) - 0.5))
+        plot.axis.set_ylabel(_spit_header(var))
+        plot.set_title(var)
+        paths.append(plot.save(os.path.join(os.path.abspath(output_dir), f"{var}.png")))
+    return paths
+
+@profiled
+def export_spits(devices, output_dir: str=None, format: str="csv", per_device: bool=False, workers: int=None, plot: bool=None) -> list:
+    """_summary_
+    Writes the [spit] variables of the (sized) devices to the output directory.
+    Every device is gathered into a single columnar table and the variables
+    requested by each device are selected column by column, without building
+    a DataFrame per device. Either one consolidated file (spits.<format>, NaN where a
+    device did not request a variable) or one file per device (<name>.<format>,
+    written concurrently) is written
+    Args:
+        devices     (Devices)           : parsed and sized devices
+        output_dir  (str, optional)     : output directory. Defaults to the [spit] outputdir of the devices.
+        format      (str, optional)     : "csv", "parquet", "feather" or "npz" (see write_data). Defaults to "csv".
+        per_device  (bool, optional)    : write one file per device. Defaults to False.
+        workers     (int, optional)     : number of writer threads of the per device files. Defaults to the number of CPUs.
+        plot        (bool, optional)    : also plot each exported variable. Defaults to the [spit] plot flag of the devices.
+    Raises:
+        ValueError: no output directory, unsupported format or no devices to export
+    Returns:
+        list: WriteReport of each written file
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    output_dir = output_dir if bool(output_dir) else devices.output_dir
+    if not bool(output_dir):
+        raise ValueError("No output directory was given or parsed from the [spit] section")
+    extension = f".{format}"
+    if extension not in __data_writers__:
+        raise ValueError(f"Unsupported format: {format}, use one of {[ext[1:] for ext in __data_writers__.keys()]}")
+    if len(devices) == 0:
+        raise ValueError("There are no devices to export")
+    os.makedirs(output_dir, exist_ok=True)
+    identity, columns, spits = _spit_columns(devices)
+    if not per_device:
+        data = {var: identity[var] for var in identity.keys()}
+        data.update({_spit_header(var): values for var, values in columns.items()})
+        reports = [write_data(pd.DataFrame(data, copy=False), os.path.join(output_dir, f"spits{extension}"))]
+    else:
+        positions = {var: i for i, var in enumerate(columns.keys())}
+        matrix = np.column_stack(list(columns.values())) if len(columns) > 0 else np.empty((len(identity["name"]), 0))
+        def write_device(row: int) -> WriteReport:
+            name = identity["name"][row]
+            spit = [var for var in columns.keys() if var in spits[name]]
+            path = os.path.join(output_dir, f"{name}{extension}")
+            values = matrix[row, [positions[var] for var in spit]]
+            if format == "csv":
+                header = ["name", "type", "kind"] + [_spit_header(var) for var in spit]
+                record = [name, identity["type"][row], identity["kind"][row]] + ["" if np.isnan(val) else repr(float(val)) for val in values]
+                return _write_device_csv(path, header, record)
+            data = {var: identity[var][row:row + 1] for var in identity.keys()}
+            data.update({_spit_header(var): values[i:i + 1] for i, var in enumerate(spit)})
+            return write_data(pd.DataFrame(data, copy=False), path)
+        workers = workers if bool(workers) else os.cpu_count()
+        workers = max(1, min(workers, len(identity["name"])))
+        if workers == 1:
+            reports = [write_device(row) for row in range(len(identity["name"]))]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                reports = list(executor.map(write_device, range(len(identity["name"]))))
+    logger.info(f"Exported {len(identity['name'])} devices to {len(reports)} file(s) in {output_dir}")
+    if plot if plot is not None else devices.plot:
+        figures = _plot_spits(identity, columns, output_dir)
+        logger.info(f"Plotted {len(figures)} variables in {output_dir}")
+    return reports
@@ -1,15 +1,62 @@
-from modelling_utils.read import read_specs
+from modelling_utils.read import read_specs, read_specs_many, SpecWatcher
+import os
+import sys
+import json
+import subprocess
+import shutil
+import tempfile
 import numpy as np
 import pandas as pd
 from modelling_utils import(
     plot_function,
     plot_hist,
     timer,
+    stof,
+    stof_array,
     read_data,
-    read_lut
+    read_lut,
+    compile_lut,
+    load_lut,
+    is_compiled_lut_valid,
+    read_lut_dir,
+    iter_lut,
+    LutCache,
+    lut_cache,
+    Lut,
+    InverseIndex,
+    inverse_index_path,
+    MosCell,
+    Devices,
+    DeviceTable,
+    size,
+    solve_cells,
+    invert,
+    monte_carlo,
+    sweep,
+    pareto_front,
+    Normal,
+    LogNormal,
+    span,
+    enable_profiling,
+    disable_profiling,
+    reset_profiling,
+    profiling_summary,
+    export_chrome_trace,
+    Profiler,
+    render_batch,
+    decimate,
+    LinePlot,
+    Plot3D,
+    write,
+    write_data,
+    export_spits,
 )
 from modelling_utils import __version__
 import unittest
+from unittest import mock
+__resources__ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "resources")
+__ncell_lut__ = os.path.join(__resources__, "simulations_28nm_cmos", "simulations", "ncell", "vsb-0_w-2-3-u_l-30-n_sweep-vgs-vds.csv")
+
 class TestModellingFramework(unittest.TestCase):
 
     def test_version(self):
@@ -133,5 +180,683 @@ class TestModellingFramework(unittest.TestCase):
         self.assertIsNotNone(devices2)
         print(devices2)
         
+    def test_read_lut_unfold(self):
+        df_lut = read_lut(__ncell_lut__)
+        self.assertEqual(df_lut.shape, (25*13, 21))
+        self.assertEqual(list(df_lut.columns[-5:]), ["vsb", "w", "l", "vds", "vgs"])
+        self.assertTrue(np.allclose(df_lut["w"], 2.3e-6))
+        self.assertTrue(np.allclose(df_lut["l"], 30e-9))
+        self.assertTrue(np.allclose(df_lut["vds"].unique(), np.round(np.arange(0, 1.25, 0.1), 1)))
+        self.assertTrue(np.allclose(df_lut["vgs"].to_numpy()[25:50], df_lut["vgs"].to_numpy()[:25]))
+
+    def test_read_lut_synthetic(self):
+        vgs = np.array([0.0, 0.5, 1.0])
+        columns = {"vgs ": vgs}
+        for param in ["id", "gm"]:
+            for vds in [0, 0.6]:
+                columns[f"M0:{param} vds {vds} "] = vgs*(vds+1) + (param == "gm")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "vsb-0-1_l-60-n_sweep-vgs-vds.csv")
+            pd.DataFrame(columns).to_csv(path, index=False)
+            df_lut = read_lut(path)
+        self.assertEqual(list(df_lut.columns), ["id", "gm", "vsb", "l", "vds", "vgs"])
+        self.assertTrue(np.allclose(df_lut["vds"], [0, 0, 0, 0.6, 0.6, 0.6]))
+        self.assertTrue(np.allclose(df_lut["vgs"], np.tile(vgs, 2)))
+        self.assertTrue(np.allclose(df_lut["id"], np.concatenate([vgs, vgs*1.6])))
+        self.assertTrue(np.allclose(df_lut["gm"], np.concatenate([vgs, vgs*1.6]) + 1))
+        self.assertTrue(np.allclose(df_lut["vsb"], 0.1))
+        self.assertTrue(np.allclose(df_lut["l"], 60e-9))
+
+    def test_lut_grid(self):
+        df_lut = read_lut(__ncell_lut__)
+        lut = Lut.from_frame(df_lut)
+        self.assertEqual(list(lut.axes.keys()), ["vds", "vgs"])
+        self.assertEqual(lut.shape, (13, 25))
+        self.assertAlmostEqual(lut.constants["w"], 2.3e-6)
+        points = df_lut.sample(50, random_state=0)
+        for method in ["linear", "cubic"]:
+            gm = lut.interp("gm", vds=points["vds"].to_numpy(), vgs=points["vgs"].to_numpy(), method=method)
+            self.assertTrue(np.allclose(gm, points["gm"].to_numpy()))
+
+    def test_lut_interp(self):
+        x = np.linspace(0, 1, 11)
+        y = np.linspace(-1, 2, 7)
+        z = np.array([0.0, 0.3, 1.0])
+        xx, yy, zz = np.meshgrid(x, y, z, indexing="ij")
+        lut = Lut({"l": x, "vds": y, "vgs": z}, {"f": 2*xx - 3*yy + zz + xx*yy, "g": xx**2})
+        rng = np.random.default_rng(0)
+        qx, qy, qz = rng.uniform(0, 1, 1000), rng.uniform(-1, 2, 1000), rng.uniform(0, 1, 1000)
+        res = lut.interp(["f", "g"], l=qx, vds=qy, vgs=qz)
+        self.assertTrue(np.allclose(res["f"], 2*qx - 3*qy + qz + qx*qy))
+        self.assertTrue(np.all(res["g"] >= qx**2 - 1e-12))
+        self.assertTrue(np.isnan(lut.interp("f", l=2.0, vds=0.0, vgs=0.0)))
+        self.assertAlmostEqual(float(lut.interp("f", l=2.0, vds=0.0, vgs=0.0, fill_value=None)), 4.0)
+        self.assertEqual(lut.interp("f", l=[[0.5]], vds=0.0, vgs=[0.0, 1.0]).shape, (1, 2))
+        with self.assertRaises(ValueError):
+            lut.interp("f", l=0.5, vds=0.0)
+
+    def test_size_devices(self):
+        lut = Lut.from_csv(__ncell_lut__)
+        devices = Devices()
+        devices.add(MosCell(name="m0", vds=0.6, gmoverid=15, id=100e-6))
+        devices.add(MosCell(name="m1", vds=0.6, gmoverid=100, id=100e-6))
+        devices.add(MosCell(name="v0", vgs=0.6, cvar=1e-13), dev_type="varactor")
+        devices.add(MosCell(name="s0", vgs=1.0, rds=100), dev_type="switch")
+        devices.add(MosCell(name="m2", vds=0.6, gmoverid=15, id=100e-6, l=60e-9))
+        size(devices, lut)
+        m0 = devices.devices["m0"]
+        self.assertTrue(0.0 < m0.vgs < 1.2)
+        self.assertAlmostEqual(m0.vsg, -m0.vgs)
+        self.assertAlmostEqual(m0.gm/m0.id, 15, delta=1.0)
+        self.assertAlmostEqual(float(lut.interp("id", vds=0.6, vgs=m0.vgs))*m0.w/2.3e-6, 100e-6)
+        self.assertIsNone(devices.devices["m1"].w)
+        self.assertAlmostEqual(devices.varactors["v0"].cgs + devices.varactors["v0"].cgd + devices.varactors["v0"].cgb, 1e-13)
+        self.assertAlmostEqual(1/devices.switches["s0"].gds, 100)
+        # the batch solver matches the per device solution
+        outputs = solve_cells(lut, gmoverid=np.array([15.0, 10.0]), id=100e-6, vds=0.6)
+        self.assertAlmostEqual(outputs["w"][0], m0.w)
+        # the LUT is only characterized for l=30n
+        self.assertIsNone(devices.devices["m2"].w)
+        self.assertTrue(np.isnan(lut.interp("id", vds=0.6, vgs=m0.vgs, l=60e-9)))
+        self.assertAlmostEqual(float(lut.interp("id", vds=0.6, vgs=m0.vgs, l=30e-9)), float(lut.interp("id", vds=0.6, vgs=m0.vgs)))
+        outputs = solve_cells(lut, gmoverid=15.0, id=100e-6, vds=0.6, l=np.array([30e-9, 60e-9]))
+        self.assertAlmostEqual(outputs["w"][0], m0.w)
+        self.assertTrue(np.isnan(outputs["w"][1]) and np.isnan(outputs["vgs"][1]))
+
+    def test_device_table(self):
+        table = DeviceTable(capacity=2)
+        table.append(MosCell(name="m0", vds=0.6, gmoverid=15, id=100e-6))
+        rows = table.extend(name=[f"c{i}" for i in range(100)], vds=0.6, gmoverid=np.linspace(5, 20, 100), id=100e-6)
+        table.append(name="v0", vgs=0.6, cvar=1e-13, dev_type="varactor")
+        self.assertEqual(len(table), 102)
+        self.assertEqual(rows, slice(1, 101))
+        self.assertTrue(np.allclose(table.column("vsd")[:101], -0.6))
+        view = table[0]
+        self.assertEqual(view.name, "m0")
+        self.assertIsNone(view.w)
+        view.l = 60e-9
+        self.assertEqual(table.column("l")[0], 60e-9)
+        self.assertEqual(table[-1].kind, "varactor")
+        self.assertEqual(int(table.mask(dev_type="cell").sum()), 101)
+        df = table.to_frame()
+        self.assertEqual(len(df), 102)
+        self.assertEqual(str(df["type"].dtype), "category")
+        devices = table.to_devices()
+        self.assertEqual(len(devices.devices), 101)
+        self.assertEqual(len(devices.varactors), 1)
+        self.assertEqual(len(DeviceTable.from_devices(devices)), 102)
+        size(table, Lut.from_csv(__ncell_lut__))
+        self.assertAlmostEqual(table[0].w, size(devices, Lut.from_csv(__ncell_lut__)).devices["m0"].w)
+
+    def test_compiled_lut(self):
+        from modelling_utils.read import _write_compiled_lut
+        with tempfile.TemporaryDirectory() as tmp:
+            path = shutil.copy(__ncell_lut__, tmp)
+            compiled = compile_lut(path)
+            self.assertTrue(is_compiled_lut_valid(path))
+            df_lut = load_lut(compiled)
+            # read only memory mapped columns
+            self.assertFalse(df_lut["gm"].to_numpy().flags.writeable)
+            pd.testing.assert_frame_equal(df_lut, read_lut(path, compiled=False))
+            pd.testing.assert_frame_equal(read_lut(path), read_lut(path, compiled=False))
+            # touching the CSV keeps the compiled LUT valid, changing its contents does not
+            os.utime(path)
+            self.assertTrue(is_compiled_lut_valid(path))
+            # the new modification time is recorded, the CSV is only hashed once
+            with open(os.path.join(compiled, "header.json")) as file:
+                self.assertEqual(json.load(file)["source"]["mtime_ns"], os.stat(path).st_mtime_ns)
+            with mock.patch("modelling_utils.read._file_hash") as file_hash:
+                self.assertTrue(is_compiled_lut_valid(path))
+                file_hash.assert_not_called()
+            with open(path, "a") as file:
+                file.write("\n")
+            self.assertFalse(is_compiled_lut_valid(path))
+            # another writer installing the same compiled LUT first is not an error
+            compile_lut(path)
+            other = shutil.copytree(compiled, os.path.join(tmp, "other.lut"))
+            rename = os.rename
+            def concurrent_rename(src, dst):
+                if dst == compiled and os.path.basename(src).startswith(".") and not src.endswith(".stale"):
+                    rename(other, compiled)
+                rename(src, dst)
+            with mock.patch("modelling_utils.read.os.rename", side_effect=concurrent_rename):
+                self.assertEqual(compile_lut(path), compiled)
+            self.assertTrue(is_compiled_lut_valid(path))
+            self.assertEqual([name for name in os.listdir(tmp) if name.startswith(".")], [])
+            def failing_writer(folder):
+                raise KeyError("column")
+            with self.assertRaises(IOError) as error:
+                _write_compiled_lut(compiled, {"path": path}, failing_writer)
+            self.assertIsInstance(error.exception.__cause__, KeyError)
+
+    def test_read_lut_dir(self):
+        df = pd.read_csv(__ncell_lut__)
+        with tempfile.TemporaryDirectory() as tmp:
+            os.mkdir(os.path.join(tmp, "ncell"))
+            for l in [30, 60]:
+                for vsb in ["0", "0-2"]:
+                    df.to_csv(os.path.join(tmp, "ncell", f"vsb-{vsb}_w-2-3-u_l-{l}-n_sweep-vgs-vds.csv"), index=False)
+            # not a LUT file
+            df.to_csv(os.path.join(tmp, "ncell", "ncell_parametric_sim.csv"), index=False)
+            df_luts = read_lut_dir(tmp, device="ncell", workers=2)
+            lut = read_lut_dir(tmp, device="ncell", workers=1, grid=True)
+        self.assertEqual(len(df_luts), 4*25*13)
+        self.assertEqual(list(lut.axes.keys()), ["l", "vsb", "vds", "vgs"])
+        self.assertEqual(lut.shape, (2, 2, 13, 25))
+
+    def test_stof(self):
+        self.assertAlmostEqual(stof("30 n"), 30e-9)
+        self.assertAlmostEqual(stof("150 m"), 0.15)
+        self.assertAlmostEqual(stof("500m"), 0.5)
+        self.assertAlmostEqual(stof("0.6"), 0.6)
+        with self.assertRaises(ValueError):
+            stof("3 x")
+        vals = ["30 n", "1.2 u", "500m", "0.6", "-2 k", "20", "nan", "1e-3"]
+        res = stof_array(vals)
+        self.assertTrue(np.allclose(res[:6], [30e-9, 1.2e-6, 0.5, 0.6, -2e3, 20]))
+        self.assertTrue(np.isnan(res[6]))
+        self.assertAlmostEqual(res[7], 1e-3)
+        self.assertTrue(np.allclose(stof_array(vals[:6]), [stof(v) for v in vals[:6]]))
+        self.assertEqual(stof_array(np.array([["1 m"], ["2 u"]])).shape, (2, 1))
+        for bad in [["3 x"], ["1 2"], [""]]:
+            with self.assertRaises(ValueError):
+                stof_array(bad)
+
+    def test_lazy_plotting_imports(self):
+        code = "import sys, modelling_utils; print(any(m in sys.modules for m in ['matplotlib', 'seaborn']))"
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        self.assertEqual(out.stdout.strip(), "False")
+        import modelling_utils
+        self.assertEqual(modelling_utils.plt.__name__, "matplotlib.pyplot")
+
+    def test_iter_lut(self):
+        df_lut = read_lut(__ncell_lut__, compiled=False)
+        chunks = list(iter_lut(__ncell_lut__, chunksize=10))
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(list(chunks[0].columns), list(df_lut.columns))
+        streamed = pd.concat(chunks, ignore_index=True).sort_values(["vds", "vgs"], ignore_index=True)
+        pd.testing.assert_frame_equal(streamed, df_lut.sort_values(["vds", "vgs"], ignore_index=True))
+        arrays = next(iter_lut(__ncell_lut__, chunksize=10, as_frame=False))
+        self.assertEqual(len(arrays["gm"]), 10*13)
+        with tempfile.TemporaryDirectory() as tmp:
+            compiled = compile_lut(__ncell_lut__, output=os.path.join(tmp, "ncell.lut"), chunksize=7)
+            pd.testing.assert_frame_equal(load_lut(compiled), df_lut)
+
+    def test_profiling(self):
+        reset_profiling()
+        enable_profiling(memory=True)
+        try:
+            with span("run"):
+                read_lut(__ncell_lut__, compiled=False)
+                read_lut(__ncell_lut__, compiled=False)
+            summary = profiling_summary().set_index("path")
+            self.assertEqual(summary.loc["run/read_lut", "calls"], 2)
+            self.assertIn("run/read_lut/read_data", summary.index)
+            self.assertAlmostEqual(summary.loc["run", "share"], 1.0)
+            self.assertFalse(np.isnan(summary.loc["run", "memory[B]"]))
+            with tempfile.TemporaryDirectory() as tmp:
+                with open(export_chrome_trace(os.path.join(tmp, "trace.json"))) as file:
+                    events = json.load(file)["traceEvents"]
+            self.assertEqual(sum(event["name"] == "read_lut" for event in events), 2)
+        finally:
+            disable_profiling()
+            reset_profiling()
+        read_lut(__ncell_lut__, compiled=False)
+        self.assertEqual(len(profiling_summary()), 0)
+        # a trace started by the caller is left running
+        import tracemalloc
+        tracemalloc.start()
+        try:
+            enable_profiling(memory=True)
+            disable_profiling()
+            self.assertTrue(tracemalloc.is_tracing())
+        finally:
+            tracemalloc.stop()
+        enable_profiling(memory=True)
+        disable_profiling()
+        self.assertFalse(tracemalloc.is_tracing())
+        # only a bounded sample of the durations is kept per span
+        profiler = Profiler(enabled=True, reservoir_size=100)
+        durations = np.random.default_rng(0).permutation(np.arange(1, 10001))*1000
+        for i, duration in enumerate(durations):
+            profiler._record("loop", "loop", i, int(duration), 0)
+        self.assertEqual(len(profiler._stats["loop"].reservoir), 100)
+        row = profiler.summary().set_index("path").loc["loop"]
+        self.assertEqual(row["calls"], 10000)
+        self.assertAlmostEqual(row["total[ms]"], durations.sum()*1e-6)
+        self.assertAlmostEqual(row["min[ms]"], 1e-3)
+        self.assertAlmostEqual(row["max[ms]"], 10.0)
+        self.assertAlmostEqual(row["p50[ms]"], 5.0, delta=2.5)
+
+    def test_render_batch(self):
+        x = np.linspace(0, 2*np.pi, 50)
+        specs = [
+            {"x": x, "y": [np.cos(x), np.sin(x)], "labels": ["cosine", "sine"], "title": "Batch Plot", "filename": "test_batch1.png"},
+            {"kind": "hist", "data": np.random.default_rng(0).normal(size=100), "xlabel": "value", "filename": "test_batch2.png"},
+        ]
+        paths = render_batch(specs, workers=2)
+        self.assertEqual([os.path.basename(path) for path in paths], ["test_batch1.png", "test_batch2.png"])
+        for path in paths:
+            self.assertTrue(os.path.exists(path))
+            os.remove(path)
+        with self.assertRaises(ValueError):
+            render_batch([{"x": x, "y": np.cos(x)}])
+
+    def test_line_plot_reuse(self):
+        from concurrent.futures import ThreadPoolExecutor
+        x = np.linspace(0, 2*np.pi, 50)
+        plot = LinePlot(xlabel="domain", ylabel="func", title="Reused Plot")
+        plot.update(x, [np.cos(x), np.sin(x)], labels=["cosine", "sine"])
+        lines = list(plot.lines)
+        plot.update(x, [2*np.cos(x), 2*np.sin(x)], labels=["cosine", "sine"])
+        self.assertEqual(plot.lines, lines)
+        np.testing.assert_array_equal(plot.lines[0].get_ydata(), 2*np.cos(x))
+        self.assertAlmostEqual(plot.axis.get_ylim()[1], 2, delta=0.2)
+        plot.update(x, np.cos(x))
+        self.assertEqual(len(plot.lines), 1)
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertTrue(os.path.exists(plot.save(os.path.join(tmp, "reused.png"))))
+        def render(i):
+            return LinePlot(title=f"thread {i}").update(x, np.cos(i*x)).render().shape
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            shapes = list(executor.map(render, range(8)))
+        self.assertEqual(len(set(shapes)), 1)
+        surface = Plot3D(type="surface")
+        xx, yy = np.meshgrid(x, x)
+        surface.update(xx, yy, xx*yy).update(xx, yy, xx+yy)
+        self.assertEqual(len(surface.axis.collections), 1)
+
+    def test_decimate(self):
+        x = np.linspace(0, 20*np.pi, 100000)
+        y = np.sin(x) + np.random.default_rng(0).normal(scale=0.1, size=x.size)
+        for method in ["minmax", "lttb"]:
+            xd, yd = decimate(x, y, 1000, method=method)
+            self.assertLessEqual(len(xd), 1000)
+            self.assertEqual((xd[0], xd[-1]), (x[0], x[-1]))
+            self.assertTrue(np.all(np.diff(xd) > 0))
+        xd, yd = decimate(x, y, 1000)
+        self.assertEqual((yd.min(), yd.max()), (y.min(), y.max()))
+        np.testing.assert_array_equal(decimate(x[:10], y[:10], 1000)[1], y[:10])
+        # the output never exceeds max_points
+        for n in [4, 5, 10, 101, 1000]:
+            for max_points in range(3, 40):
+                for method in ["minmax", "lttb"]:
+                    xd, yd = decimate(x[:n], y[:n], max_points, method=method)
+                    self.assertLessEqual(len(xd), max_points)
+                    self.assertEqual((xd[0], xd[-1]), (x[0], x[n-1]))
+        self.assertEqual(decimate([0, 1, 2, 3], [0, 5, -1, 0], 3)[1].tolist(), [0, 5, 0])
+        with self.assertRaises(ValueError):
+            decimate(x, y, 1000, method="nearest")
+        plot_function(x=x, y=[y, np.cos(x)], labels=["noisy sine", "cosine"], max_points=2000, filename="test_decimate.png")
+        plot_hist(y, xlabel="value", max_points=10000, filename="test_decimate_hist.png")
+        # large histograms are binned over the whole data, outliers included
+        from modelling_utils.utils import _prebin
+        z = np.concatenate([y, [5.0]])
+        binrange, centres, counts = _prebin([z, y[:100]], 0.05)
+        self.assertEqual(binrange, (z.min(), 5.0))
+        self.assertEqual([c.sum() for c in counts], [z.size, 100])
+        self.assertEqual(counts[0][-1], 1)
+        self.assertTrue(np.all(np.abs(np.diff(centres) - 0.05) < 1e-9))
+        for filename in ["test_decimate.png", "test_decimate_hist.png"]:
+            os.remove(os.path.join("figs", filename))
+
+    def test_inverse_index(self):
+        from modelling_utils.sizing import _invert_scan
+        lut = Lut.from_csv(__ncell_lut__)
+        index = lut.inverse_index("gmoverid")
+        self.assertIs(lut.inverse_index("gmoverid"), index)
+        self.assertEqual(index.monotonic.shape, (len(lut.axes["vds"]),))
+        rng = np.random.default_rng(0)
+        target = rng.uniform(0, 30, 2000)
+        vds = np.concatenate([rng.choice(lut.axes["vds"], 1000), rng.uniform(-0.1, 1.3, 1000)])
+        expected = _invert_scan(lut, "gmoverid", target, vds=vds)
+        np.testing.assert_allclose(invert(lut, "gmoverid", target, vds=vds), expected, rtol=1e-12)
+        # without the scan fallback, only the monotonic branches are solved
+        indexed = index.query(target, vds=vds)
+        solved = np.isfinite(indexed)
+        self.assertTrue(solved.any())
+        np.testing.assert_allclose(indexed[solved], expected[solved], rtol=1e-12)
+        with tempfile.TemporaryDirectory() as tmp:
+            source = shutil.copy(__ncell_lut__, tmp)
+            path = inverse_index_path(source)
+            self.assertTrue(path.endswith("_sweep-vgs-vds.gmoverid.index"))
+            lut = Lut.from_csv(source)
+            lut.inverse_index(path=path)
+            self.assertTrue(os.path.exists(path))
+            loaded = InverseIndex.load(path, lut=lut)
+            for name in ["curves", "direction", "start", "keys"]:
+                np.testing.assert_array_equal(getattr(loaded, name), getattr(index, name))
+            np.testing.assert_array_equal(loaded.query(target, vds=vds), indexed)
+            other = Lut(lut.axes, {"gmoverid": 2*lut["gmoverid"]}, lut.constants)
+            with self.assertRaises(ValueError):
+                InverseIndex.load(path, lut=other)
+            self.assertIsNot(other.inverse_index(path=path), loaded)
+            # the index is tied to the state of the LUT file
+            os.utime(source, ns=(0, 0))
+            with self.assertRaises(ValueError):
+                InverseIndex.load(path, lut=lut)
+        # slices running in opposite directions
+        lut = Lut({"vds": np.array([0.0, 1.0]), "vgs": np.linspace(0, 1, 5)}, {"p": np.array([[0, 1, 2, 3, 4], [4, 3, 2, 1, 0]], dtype=float)})
+        target = np.linspace(-1, 5, 25)
+        for vds in [0.0, 1.0, 0.5]:
+            np.testing.assert_allclose(invert(lut, "p", target, vds=vds), _invert_scan(lut, "p", target, vds=vds), rtol=1e-12)
+
+    def test_read_lut_compact(self):
+        df_lut = read_lut(__ncell_lut__, compiled=False)
+        compact = read_lut(__ncell_lut__, compiled=False, compact=True)
+        self.assertEqual(list(compact.columns), list(df_lut.columns))
+        self.assertEqual(compact.attrs["constants"], {"vsb": 0.0, "w": df_lut["w"][0], "l": df_lut["l"][0]})
+        for name in ["vsb", "w", "l"]:
+            self.assertIsInstance(compact[name].dtype, pd.CategoricalDtype)
+            np.testing.assert_array_equal(compact[name].to_numpy(dtype=float), df_lut[name].to_numpy())
+        for name in ["vgs", "vds"]:
+            np.testing.assert_array_equal(compact[name].to_numpy(), df_lut[name].to_numpy())
+        self.assertEqual(compact["region"].dtype, np.int8)
+        np.testing.assert_array_equal(compact["region"], df_lut["region"])
+        self.assertEqual(compact["gm"].dtype, np.float32)
+        np.testing.assert_allclose(compact["gm"], df_lut["gm"], rtol=1e-6)
+        self.assertLess(compact.memory_usage(deep=True).sum(), 0.5*df_lut.memory_usage(deep=True).sum())
+        self.assertEqual(Lut.from_frame(compact).shape, Lut.from_frame(df_lut).shape)
+
+    def test_lut_cache(self):
+        from concurrent.futures import ThreadPoolExecutor
+        cache = lut_cache()
+        cache.invalidate()
+        before = cache.stats()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = shutil.copy(__ncell_lut__, tmp)
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                frames = list(executor.map(lambda _: read_lut(path, compiled=False, cache=True), range(8)))
+            stats = cache.stats()
+            self.assertEqual(stats["misses"] - before["misses"], 1)
+            self.assertEqual(stats["hits"] - before["hits"], 7)
+            pd.testing.assert_frame_equal(frames[0], read_lut(path, compiled=False))
+            frames[0]["gm"] = 0.0
+            self.assertFalse((read_lut(path, compiled=False, cache=True)["gm"] == 0).all())
+            frames[1].loc[frames[1].index[:10], "gds"] = -1.0
+            self.assertFalse((read_lut(path, compiled=False, cache=True)["gds"] == -1.0).any())
+            # a modified file is read again
+            os.utime(path, ns=(0, 0))
+            read_lut(path, compiled=False, cache=True)
+            self.assertEqual(cache.stats()["misses"] - before["misses"], 2)
+            self.assertEqual(cache.stats()["entries"], 1)
+            self.assertEqual(cache.invalidate(path), 1)
+            small = LutCache(budget=int(1.5*frames[1].memory_usage(deep=True).sum()))
+            small.get(path, compiled=False)
+            small.get(path, compiled=False, compact=True)
+            small.get(__ncell_lut__, compiled=False)
+            self.assertGreaterEqual(small.stats()["evictions"], 1)
+            self.assertLessEqual(small.stats()["bytes"], small.budget)
+
+    def test_monte_carlo(self):
+        lut = Lut.from_csv(__ncell_lut__)
+        devices = Devices()
+        devices.parse_data({
+            "control": {
+                "devices": ["m0", "m1"],
+                "m0": {"type": "nch", "gmoverid": 15, "l": "30 n", "vds": "600 m", "id": "100 u", "vsb": 0},
+                "m1": {"type": "nch", "gmoverid": 10, "l": "30 n", "vds": "300 m", "id": "1 m", "vsb": 0},
+            },
+        })
+        distributions = {"gmoverid": Normal(0.5), "vds": Normal(0.01), "id": LogNormal(0.05)}
+        result = monte_carlo(devices, lut, distributions, samples=2000, batch_size=300, seed=7)
+        self.assertEqual(result.names, ["m0", "m1"])
+        self.assertEqual(result["w"].shape, (2, 2000))
+        self.assertAlmostEqual(np.mean(result["gmoverid"][0]), 15, delta=0.1)
+        self.assertAlmostEqual(np.std(result["gmoverid"][1]), 0.5, delta=0.05)
+        self.assertTrue(np.isfinite(result["ft"]).all())
+        nominal = solve_cells(lut, gmoverid=[15, 10], id=[100e-6, 1e-3], vds=[0.6, 0.3])
+        np.testing.assert_allclose(np.median(result["w"], axis=1), nominal["w"], rtol=0.05)
+        # the random streams do not depend on the number of workers
+        parallel = monte_carlo(devices, lut, distributions, samples=2000, batch_size=300, seed=7, workers=2)
+        for var in result.columns.keys():
+            np.testing.assert_array_equal(parallel[var], result[var])
+        self.assertEqual(len(result.hist("ft")), 2)
+        self.assertEqual(len(result.to_frame()), 4000)
+        with self.assertRaises(ValueError):
+            monte_carlo(devices, lut, {"w": Normal(1e-6)})
+
+    def test_sweep(self):
+        lut = Lut.from_csv(__ncell_lut__)
+        template = MosCell(type="nch", gmoverid=20, vds=0.15, id=1e-3)
+        gmoverid = np.linspace(5, 20, 7)
+        vds = np.linspace(0.1, 1.1, 5)
+        ids = [10e-6, 100e-6, 1e-3]
+        df = sweep(template, lut, chunk_size=17, gmoverid=gmoverid, vds=vds, id=ids)
+        self.assertEqual(len(df), 7*5*3)
+        self.assertEqual(list(df.columns[:3]), ["gmoverid", "vds", "id"])
+        point = df.iloc[5*3 + 2*3 + 1]
+        self.assertEqual((point["gmoverid"], point["vds"], point["id"]), (gmoverid[1], vds[2], ids[1]))
+        solved = solve_cells(lut, gmoverid=point["gmoverid"], id=point["id"], vds=point["vds"])
+        self.assertAlmostEqual(point["w"], float(solved["w"]), delta=1e-12*point["w"])
+        # swept LUT constants are only valid at the characterized value
+        df_l = sweep(template, lut, gmoverid=gmoverid, l=[30e-9, 60e-9])
+        self.assertTrue(df_l.loc[df_l["l"] > 40e-9, "w"].isna().all())
+        self.assertTrue(df_l.loc[df_l["l"] < 40e-9, "w"].notna().all())
+        front = sweep(template, lut, chunk_size=17, pareto=True, gmoverid=gmoverid, vds=vds, id=ids)
+        expected = df.iloc[pareto_front(df)]
+        pd.testing.assert_frame_equal(
+            front.sort_values(["gmoverid", "vds", "id"], ignore_index=True),
+            expected.sort_values(["gmoverid", "vds", "id"], ignore_index=True),
+        )
+        with self.assertRaises(ValueError):
+            sweep(template, lut, w=[1e-6])
+
+    def test_devices_index(self):
+        devices = Devices()
+        devices.add_many([MosCell(name=f"m{i}") for i in range(100)])
+        devices.add(MosCell(name="c0"), dev_type="varactor")
+        devices.add_many([MosCell(name="s0"), MosCell(name="s1")], dev_type="switch")
+        self.assertEqual(len(devices), 103)
+        self.assertEqual(devices.lookup("c0")[0], "varactor")
+        self.assertIs(devices.lookup("m42")[1], devices.devices["m42"])
+        with self.assertRaises(KeyError):
+            devices.add(MosCell(name="s1"))
+        # a failing batch adds no device
+        with self.assertRaises(KeyError):
+            devices.add_many([MosCell(name="new"), MosCell(name="m0")])
+        self.assertNotIn("new", devices)
+        with self.assertRaises(KeyError):
+            devices.add_many([MosCell(name="new"), MosCell(name="new")])
+        self.assertNotIn("new", devices)
+        del devices.switches["s0"]
+        devices.varactors.pop("c0")
+        devices.devices["x"] = MosCell(name="x")
+        self.assertEqual(set(devices.index.keys()), set(devices.devices.keys()) | {"s1"})
+        with self.assertRaises(KeyError):
+            devices.lookup("s0")
+
+    def test_devices_str(self):
+        devices = read_specs(os.path.join(__resources__, "specs.toml"))
+        text = str(devices)
+        self.assertIn("m3", text)
+        self.assertNotIn("from_dict", text)
+        self.assertEqual(list(devices.__data_frame__().columns[:4]), ["name[]", "type[]", "vds[V]", "vsb[V]"])
+        self.assertNotIn("bound method", str(MosCell()))
+
+    def test_control_records(self):
+        records = [
+            {"type": "nch", "vds": "100 m", "gmoverid": 15, "l": "60 n", "id": 1e-4},
+            {"device": "mp", "type": "pch", "vsd": 0.2, "vbs": "-50 m", "vsg": 0.4, "l": 1e-7, "id": "10 u"},
+        ]
+        table = MosCell.from_records(records, names=["mn", "x"])
+        for view, record, name in zip(table, records, ["mn", None]):
+            cell = MosCell.from_dict(record, name=name)
+            for var in MosCell.__slots__:
+                self.assertEqual(getattr(view, var), getattr(cell, var))
+        self.assertEqual(list(table.column("name")), ["mn", "mp"])
+        self.assertAlmostEqual(table[1].vsb, 0.05)
+        with self.assertRaisesRegex(ValueError, "VSD value to be specified is only valid for PMOS devices"):
+            MosCell.from_records([{"vds": 0.1}, {"vsd": 0.1}])
+        with self.assertRaisesRegex(ValueError, "Drive Current \\(Id\\) value must parsed as a float or string"):
+            MosCell.from_dict({"id": 1})
+        with self.assertRaisesRegex(ValueError, "w is not a valid control variable for a CMOS device"):
+            MosCell.from_records([{"w": 1e-6}])
+        with self.assertRaisesRegex(ValueError, "Invalid scaling factor"):
+            MosCell.from_records([{"l": "30 n"}, {"l": "30 q"}])
+        for rds in [0, 0.0, "0 m"]:
+            with self.assertRaisesRegex(ZeroDivisionError, "RDS must not be zero"):
+                MosCell.from_dict({"rds": rds})
+            with self.assertRaisesRegex(ZeroDivisionError, "RDS must not be zero"):
+                MosCell.from_records([{"rds": 100}, {"rds": rds}])
+        self.assertEqual(MosCell.from_records([{"rds": 100}, {}])[1].gds, None)
+
+    def test_read_specs_many(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = []
+            for i in range(4):
+                path = os.path.join(tmp, f"m{i}.toml")
+                with open(path, "w") as file:
+                    file.write(f"[control]\ndevice=\"m{i}\"\ntype=\"nch\"\nvds=0.{i+1}\ngmoverid=15\nl=\"60 n\"\n")
+                paths.append(path)
+            path = os.path.join(tmp, "p0.json")
+            with open(path, "w") as file:
+                json.dump({"control": {"device": "p0", "type": "pch", "vsd": 0.2, "l": "60 n"}}, file)
+            paths.append(path)
+            devices = read_specs_many(paths, workers=2)
+            self.assertEqual(sorted(devices.devices.keys()), ["m0", "m1", "m2", "m3", "p0"])
+            self.assertAlmostEqual(devices.devices["m2"].vds, 0.3)
+            parsed = read_specs_many(paths, workers=1, merge=False)
+            self.assertEqual([list(d.devices.keys()) for d in parsed], [["m0"], ["m1"], ["m2"], ["m3"], ["p0"]])
+            broken = os.path.join(tmp, "broken.toml")
+            with open(broken, "w") as file:
+                file.write("[control\ndevice=")
+            with self.assertRaisesRegex(IOError, "1/6 specification files could not be read:\n.*broken.toml"):
+                read_specs_many(paths + [broken], workers=1)
+            with self.assertRaisesRegex(IOError, "could not be read"):
+                read_specs(broken)
+            parsed = read_specs_many([broken] + paths, workers=1, merge=False, errors="skip")
+            self.assertIsNone(parsed[0])
+            self.assertEqual(len(read_specs_many([broken] + paths, workers=1, errors="skip")), 5)
+
+    def test_size_table_kinds(self):
+        lut = Lut.from_csv(__ncell_lut__)
+        devices = Devices()
+        devices.add(MosCell(name="m0", type="nch", gmoverid=15, vds=0.15, id=1e-4))
+        devices.add(MosCell(name="c0", type="nch", vds=0.15, vgs=0.5, cvar=1e-15), dev_type="varactor")
+        table = DeviceTable.from_devices(devices)
+        selected = DeviceTable.from_devices(devices)
+        expected = size(devices, lut)
+        size(table, lut)
+        for view in table:
+            self.assertAlmostEqual(view.w, expected.lookup(view.name)[1].w, delta=1e-9*view.w)
+        table = size(selected, lut, names=["c0"])
+        self.assertIsNone(table[0].w)
+        self.assertAlmostEqual(table[1].w, expected.varactors["c0"].w, delta=1e-9*table[1].w)
+
+    def test_spec_watcher(self):
+        lut = Lut.from_csv(__ncell_lut__)
+        spec = "[control]\ndevices=[\"m0\",\"m1\"]\nm0={{type=\"nch\", gmoverid={}, l=\"30 n\", vds=\"150 m\", id=\"1 m\", vsb=0}}\n{}"
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "specs.toml")
+            with open(path, "w") as file:
+                file.write(spec.format(20, "m1={type=\"nch\", gmoverid=15, l=\"30 n\", vds=\"150 m\", id=\"1 m\", vsb=0}\n"))
+            watcher = SpecWatcher(path)
+            self.assertEqual(watcher.reload(), ["m0", "m1"])
+            size(watcher.devices, lut)
+            self.assertEqual(watcher.reload(), [])
+            m1 = watcher.devices.devices["m1"]
+            w1 = m1.w
+            with open(path, "w") as file:
+                file.write(spec.format(10, "m1={type=\"nch\", gmoverid=15, l=\"30 n\", vds=\"150 m\", id=\"1 m\", vsb=0}\n"))
+            self.assertEqual(watcher.reload(force=True), ["m0"])
+            self.assertIs(watcher.devices.devices["m1"], m1)
+            self.assertIsNone(watcher.devices.devices["m0"].w)
+            size(watcher.devices, lut, names=watcher.devices.dirty)
+            self.assertIsNotNone(watcher.devices.devices["m0"].w)
+            self.assertEqual(watcher.devices.devices["m1"].w, w1)
+            previous = watcher.devices
+            with open(path, "w") as file:
+                file.write(spec.format(10, "").replace("\"m0\",\"m1\"", "\"m0\""))
+            devices = read_specs(path, previous=previous)
+            self.assertEqual((devices.dirty, devices.removed), ([], ["m1"]))
+            self.assertIs(devices.devices["m0"], previous.devices["m0"])
+
+    def test_write_data(self):
+        df = pd.DataFrame({
+            "name": pd.Categorical(["m0", "m1", "m2"]*5),
+            "w": np.linspace(1e-6, 2e-6, 15),
+            "region": np.arange(15),
+        })
+        with tempfile.TemporaryDirectory() as tmp:
+            report = write_data(df, os.path.join(tmp, "table.csv"), chunk_size=4)
+            self.assertEqual((report.format, report.rows), ("csv", 15))
+            self.assertEqual(report.nbytes, os.path.getsize(report.path))
+            back = pd.read_csv(report.path)
+            np.testing.assert_allclose(back["w"], df["w"], rtol=1e-12)
+            self.assertEqual(list(back["name"]), list(df["name"]))
+            report = write_data(df, os.path.join(tmp, "table.npz"))
+            with np.load(report.path) as npz:
+                np.testing.assert_array_equal(npz["w"], df["w"])
+                self.assertEqual(list(npz["name"]), list(df["name"]))
+            devices = Devices()
+            devices.add_many([MosCell(name=f"m{i}") for i in range(3)])
+            self.assertEqual(write_data(devices, os.path.join(tmp, "devices.csv")).rows, 3)
+            import importlib.util
+            if importlib.util.find_spec("pyarrow") is None:
+                with self.assertRaises(ImportError):
+                    write_data(df, os.path.join(tmp, "table.parquet"))
+            with self.assertRaises(ValueError):
+                write_data(df, os.path.join(tmp, "table.xlsx"))
+            write({"control": {"device": "m0", "type": "nch"}}, os.path.join(tmp, "m0.json"))
+            self.assertEqual(read_specs(os.path.join(tmp, "m0.json")).devices["m0"].type, "nch")
+            # same permissions as a file created with open()
+            with open(os.path.join(tmp, "plain.txt"), "w"):
+                pass
+            self.assertEqual(os.stat(report.path).st_mode & 0o777, os.stat(os.path.join(tmp, "plain.txt")).st_mode & 0o777)
+            os.chmod(report.path, 0o640)
+            self.assertEqual(os.stat(write_data(df, report.path).path).st_mode & 0o777, 0o640)
+            os.remove(os.path.join(tmp, "plain.txt"))
+            # no temporary files are left behind
+            self.assertEqual(sorted(os.listdir(tmp)), ["devices.csv", "m0.json", "table.csv", "table.npz"])
+        with self.assertRaises(FileNotFoundError):
+            write_data(df, "/nonexistent/dir/table.csv")
+
+    def test_write_data_arrow(self):
+        import pytest
+        pytest.importorskip("pyarrow")
+        df = pd.DataFrame({
+            "name": pd.Categorical(["m0", "m1", "m2"]*5),
+            "w": np.linspace(1e-6, 2e-6, 15),
+            "region": np.arange(15),
+        })
+        with tempfile.TemporaryDirectory() as tmp:
+            for filename, compression in [("table.parquet", None), ("raw.parquet", False), ("table.feather", None), ("raw.arrow", False)]:
+                report = write_data(df, os.path.join(tmp, filename), chunk_size=4, compression=compression)
+                self.assertEqual(report.rows, 15)
+                back = pd.read_parquet(report.path) if report.format == "parquet" else pd.read_feather(report.path)
+                pd.testing.assert_frame_equal(back, df)
+            import pyarrow.parquet as pq
+            self.assertEqual(pq.ParquetFile(os.path.join(tmp, "table.parquet")).num_row_groups, 4)
+            # the CSV output does not depend on pyarrow
+            write_data(df, os.path.join(tmp, "table.csv"))
+            with open(os.path.join(tmp, "table.csv")) as file:
+                self.assertEqual(file.read(), df.to_csv(index=False))
+
+    def test_export_spits(self):
+        lut = Lut.from_csv(__ncell_lut__)
+        devices = Devices()
+        devices.add_many([MosCell(name=f"m{i}", type="nch", gmoverid=10 + i, vds=0.15, id=1e-4) for i in range(4)])
+        devices.spits["m0"] = ["w", "gm"]
+        devices.spits["m2"] = ["ft", "w"]
+        size(devices, lut)
+        with tempfile.TemporaryDirectory() as tmp:
+            reports = export_spits(devices, output_dir=tmp)
+            df = pd.read_csv(reports[0].path)
+            self.assertEqual(list(df["name"]), ["m0", "m2"])
+            self.assertEqual(list(df.columns), ["name", "type", "kind", "w[m]", "gm[S]", "ft[Hz]"])
+            self.assertAlmostEqual(df["w[m]"][1], devices.devices["m2"].w, delta=1e-9*devices.devices["m2"].w)
+            self.assertTrue(np.isnan(df["ft[Hz]"][0]))
+            reports = export_spits(devices, output_dir=os.path.join(tmp, "per_device"), per_device=True, workers=2, plot=True)
+            self.assertEqual([os.path.basename(r.path) for r in reports], ["m0.csv", "m2.csv"])
+            df = pd.read_csv(reports[0].path)
+            self.assertEqual(list(df.columns), ["name", "type", "kind", "w[m]", "gm[S]"])
+            self.assertAlmostEqual(df["gm[S]"][0], devices.devices["m0"].gm, delta=1e-9*devices.devices["m0"].gm)
+            self.assertTrue(os.path.exists(os.path.join(tmp, "per_device", "ft.png")))
+            devices.spits.clear()
+            with np.load(export_spits(devices, output_dir=tmp, format="npz")[0].path) as npz:
+                self.assertEqual(list(npz["name"]), ["m0", "m1", "m2", "m3"])
+                self.assertIn("vdsat[V]", npz.files)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file